@@ -1,9 +1,21 @@
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
+from controller.admin_controller import router as admin_router
 from controller.echo_controller import router as echo_router
 from controller.health_controller import router as health_router
+from controller.metrics_controller import router as metrics_router
 from controller.wecom_callback_controller import router as wecom_router
+from core.bots import get_bots
+from core.llm.providers import parse_endpoints
+from core.stream_manager import drain_streams, restore_streams, snapshot_streams, stream_executor
+from core.wecom.media import image_downloader
+from service.wecom_callback_service import get_bot_service, get_wecom_service
 from utils import register_exception_handlers
 from utils.config import settings
 from utils.logging import get_logger, init_logging
@@ -11,7 +23,36 @@ from utils.logging import get_logger, init_logging
 API_PREFIX = "/api"
 ENABLE_DOCS = settings.APP_ENV != "prod"
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """启动时校验备用 LLM 端点、注册流任务与图片下载执行器的事件循环并加载流状态快照。
+
+    停机时排空进行中的流、写入快照，取消未完成的图片下载，并关闭本事件循环中的 LLM 与图片下载连接池。
+    """
+    # 备用端点配置有误（如缺少 api_key）时直接启动失败，而不是在首个流里才报错
+    parse_endpoints(settings.LLM_FALLBACK_ENDPOINTS)
+    stream_executor.attach(asyncio.get_running_loop())
+    image_downloader.executor.attach(asyncio.get_running_loop())
+    restore_streams(settings.STREAM_SNAPSHOT_PATH, settings.STREAM_SNAPSHOT_MAX_AGE_SECONDS)
+    yield
+    remaining = await drain_streams(settings.STREAM_DRAIN_SECONDS)
+    if remaining:
+        logger.warning("停机排空超时，仍有 %d 个流未结束，以中断状态写入快照", remaining)
+    snapshot_streams(settings.STREAM_SNAPSHOT_PATH)
+    stream_executor.cancel_all()
+    image_downloader.executor.cancel_all()
+    await image_downloader.aclose()
+    # openai 在首个流中才导入（见 test_startup）；未使用过时没有连接池需要关闭，也不为停机而导入
+    openai_client = sys.modules.get("core.llm.openai_client")
+    if openai_client is not None:
+        await openai_client.aclose_openai_clients()
+    stream_executor.detach()
+    image_downloader.executor.detach()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="FastAPI Demo",
     description="A simple FastAPI application",
     version="1.0.0",
@@ -29,11 +70,21 @@ logger = get_logger()
 # 装配全局异常处理器
 register_exception_handlers(app)
 
-# 挂载路由（echo、wecom callback 等）
+# 挂载路由（echo、wecom callback、admin、metrics 等）
 
 app.include_router(health_router, prefix=API_PREFIX)
+app.include_router(metrics_router, prefix=API_PREFIX)
 app.include_router(echo_router, prefix=API_PREFIX)
 app.include_router(wecom_router, prefix=API_PREFIX)
+app.include_router(admin_router, prefix=API_PREFIX)
+
+# 启动时预先构建共享的 WeComService，首个回调无需再初始化加解密上下文
+get_wecom_service(
+    token=settings.WECOM_TOKEN, encoding_aes_key=settings.WECOM_ENCODING_AES_KEY, corp_id=settings.WECOM_CORP_ID
+)
+# 多机器人：加载注册表（配置错误时启动即失败）并为每个机器人预先构建加解密上下文
+for _bot_id in get_bots():
+    get_bot_service(_bot_id)
 
 # 记录配置信息用于调试
 logger.info(
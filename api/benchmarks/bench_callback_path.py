@@ -0,0 +1,91 @@
+"""
+回调请求/响应路径 CPU 基准
+
+对比两种 POST /wecom/callback 实现的单请求 CPU 耗时（进程内 ASGI，刷新请求）：
+- legacy：`body: Annotated[dict, Body(...)]` 通用请求体校验 + JSONResponse 通用编码；
+- lean：按上限读取原始请求体 + 快速 JSON 解码取 encrypt + 预序列化 bytes 回包（当前实现）。
+两者调用同一个 WeComService，差值即请求/响应适配层节省的 CPU。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_callback_path [--requests 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Annotated
+
+import httpx
+from fastapi import Body, FastAPI, Query
+from fastapi.responses import JSONResponse
+
+from controller.wecom_callback_controller import router as lean_router
+from core.wecom.crypto import WeComMessageCrypto
+from service.wecom_callback_service import get_wecom_service
+from utils.config import settings
+
+
+def _legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/wecom/callback")
+    async def wecom_callback_post(
+        body: Annotated[dict, Body(...)],
+        msg_signature: str = Query(...),
+        timestamp: str = Query(...),
+        nonce: str = Query(...),
+    ):
+        service = get_wecom_service(
+            token=settings.WECOM_TOKEN,
+            encoding_aes_key=settings.WECOM_ENCODING_AES_KEY,
+            corp_id=settings.WECOM_CORP_ID,
+        )
+        _, _, encrypted = await service.process_callback_message_async(
+            msg_signature=msg_signature, timestamp=timestamp, nonce=nonce, encrypt=body.get("encrypt")
+        )
+        return JSONResponse(content=encrypted)
+
+    return app
+
+
+def _lean_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(lean_router, prefix="/api")
+    return app
+
+
+async def _cpu_per_request_us(app: FastAPI, requests: int) -> float:
+    crypto = WeComMessageCrypto(settings.WECOM_TOKEN, settings.WECOM_ENCODING_AES_KEY, settings.WECOM_CORP_ID)
+    enc = crypto.encrypt_to_json(plain_text=json.dumps({"msgtype": "stream", "stream": {"id": "bench"}}), nonce="n")
+    params = {"msg_signature": enc["msgsignature"], "timestamp": str(enc["timestamp"]), "nonce": enc["nonce"]}
+    body = json.dumps({"encrypt": enc["encrypt"]}).encode()
+    headers = {"content-type": "application/json"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(200):  # 预热
+            await client.post("/api/wecom/callback", params=params, content=body, headers=headers)
+        start = time.process_time()
+        for _ in range(requests):
+            response = await client.post("/api/wecom/callback", params=params, content=body, headers=headers)
+        elapsed = time.process_time() - start
+    assert response.status_code == 200, response.text
+    return elapsed / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    legacy = asyncio.run(_cpu_per_request_us(_legacy_app(), args.requests))
+    lean = asyncio.run(_cpu_per_request_us(_lean_app(), args.requests))
+    print(f"legacy  {legacy:8.1f} us CPU/request")
+    print(f"lean    {lean:8.1f} us CPU/request")
+    print(f"saved   {legacy - lean:8.1f} us CPU/request ({(legacy - lean) / legacy:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+首 token 延迟（TTFT）尾部：单端点 vs 对冲请求
+
+模拟网关：大多数请求的首 token 延迟在 0.2~0.4s，少量请求（--slow-ratio）落入 3~6s 的长尾。
+对比只请求主端点与 `hedged_stream_iter`（主端点 + 一个备用端点，对冲延迟 --hedge-delay）
+的 TTFT p50 / p95 / p99，以及对冲请求占比（额外的上游请求量）。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_llm_hedging --requests 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+
+from core.llm.providers import LLMEndpoint, hedged_stream_iter
+
+TOKENS = ["Hello", " ", "world"]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Gateway:
+    """按模拟延迟分布产出分片的上游，统计发出的请求数。"""
+
+    def __init__(self, slow_ratio: float, seed: int) -> None:
+        self.slow_ratio = slow_ratio
+        self.random = random.Random(seed)  # noqa: S311 - 仅用于模拟负载
+        self.requests = 0
+
+    def _first_token_delay(self) -> float:
+        if self.random.random() < self.slow_ratio:
+            return self.random.uniform(3, 6)
+        return self.random.uniform(0.2, 0.4)
+
+    async def stream(self, prompt: str, **kwargs):
+        self.requests += 1
+        await asyncio.sleep(self._first_token_delay())
+        for token in TOKENS:
+            yield token
+
+
+async def _ttft(stream) -> float:
+    started = time.perf_counter()
+    async for _ in stream:
+        elapsed = time.perf_counter() - started
+        await stream.aclose()
+        return elapsed
+    raise RuntimeError("empty stream")
+
+
+async def _run(requests: int, slow_ratio: float, hedge_delay: float | None, seed: int) -> tuple[list[float], int]:
+    gateway = _Gateway(slow_ratio, seed)
+    endpoints = [LLMEndpoint("primary", "http://primary"), LLMEndpoint("backup", "http://backup")]
+
+    def stream():
+        if hedge_delay is None:
+            return gateway.stream("hi")
+        return hedged_stream_iter("hi", endpoints, hedge_delay, stream_fn=gateway.stream)
+
+    ttfts = await asyncio.gather(*(_ttft(stream()) for _ in range(requests)))
+    return list(ttfts), gateway.requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--slow-ratio", type=float, default=0.1)
+    parser.add_argument("--hedge-delay", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, {args.slow_ratio:.0%} slow first tokens, hedge delay {args.hedge_delay}s")
+    for name, hedge_delay in (("single", None), ("hedged", args.hedge_delay)):
+        ttfts, upstream = asyncio.run(_run(args.requests, args.slow_ratio, hedge_delay, args.seed))
+        print(
+            f"{name:<7} ttft p50 {_percentile(ttfts, 0.5):5.2f}s  p95 {_percentile(ttfts, 0.95):5.2f}s  "
+            f"p99 {_percentile(ttfts, 0.99):5.2f}s  upstream requests {upstream / args.requests:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
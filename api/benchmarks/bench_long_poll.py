@@ -0,0 +1,99 @@
+"""
+刷新轮询挂起（long-poll）基准
+
+模拟企业微信的刷新轮询：每个会话先发送用户消息，随后在收到回复后间隔 poll_interval
+再次发起 msgtype=stream 刷新，直至 finish=true。对比关闭/开启挂起模式时，每个回答所需的
+刷新往返次数（即回包加密次数）、其中未带来新内容的往返次数以及回答完成耗时。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_long_poll [--conversations 20] [--hold 2.0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from core import stream_manager
+from service.wecom_callback_service import get_wecom_service
+
+TOKENS = 40
+
+
+async def _bursty_stream_iter(prompt: str):
+    """首 token 较慢、之后快慢交替的模拟 LLM 输出。"""
+    rng = random.Random(prompt)  # noqa: S311 - 仅用于模拟负载
+    await asyncio.sleep(1.0)
+    for i in range(TOKENS):
+        await asyncio.sleep(rng.choice((0.02, 0.05, 0.4)))
+        yield f"t{i} "
+
+
+async def _conversation(service, index: int, poll_interval: float, hold: float, counters: dict) -> None:
+    def _callback(payload: dict) -> dict:
+        enc = service.message_crypto.encrypt_to_json(plain_text=json.dumps(payload), nonce=f"n{index}")
+        return {
+            "msg_signature": enc["msgsignature"],
+            "timestamp": str(enc["timestamp"]),
+            "nonce": enc["nonce"],
+            "encrypt": enc["encrypt"],
+        }
+
+    def _stream(reply: dict) -> dict:
+        plain = service.message_crypto.decrypt_from_json(
+            reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"]
+        )
+        return json.loads(plain)["stream"]
+
+    start = time.monotonic()
+    _, _, reply = await service.process_callback_message_async(
+        **_callback({"msgid": f"bench-{index}-{hold}", "msgtype": "text", "text": {"content": f"q{index}"}}),
+        hold_seconds=hold,
+    )
+    stream_id = _stream(reply)["id"]
+    last = ""
+    while True:
+        await asyncio.sleep(poll_interval)
+        _, _, reply = await service.process_callback_message_async(
+            **_callback({"msgtype": "stream", "stream": {"id": stream_id}}), hold_seconds=hold
+        )
+        stream = _stream(reply)
+        counters["round_trips"] += 1
+        if stream["content"] == last and not stream["finish"]:
+            counters["unchanged"] += 1
+        last = stream["content"]
+        if stream["finish"]:
+            break
+    counters["latency"] += time.monotonic() - start
+
+
+async def _run(conversations: int, poll_interval: float, hold: float) -> dict:
+    service = get_wecom_service(token="t", encoding_aes_key="a" * 43, corp_id="")
+    counters = {"round_trips": 0, "unchanged": 0, "latency": 0.0}
+    await asyncio.gather(*(_conversation(service, i, poll_interval, hold, counters) for i in range(conversations)))
+    return {key: value / conversations for key, value in counters.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--hold", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stream_manager._mock_stream_iter = _bursty_stream_iter
+    print(f"{args.conversations} conversations, {TOKENS} tokens each, poll interval {args.poll_interval}s")
+    for label, hold in (("no hold", 0.0), (f"hold {args.hold}s", args.hold)):
+        result = asyncio.run(_run(args.conversations, args.poll_interval, hold))
+        print(
+            f"{label:<10} refresh round trips/encryptions per answer {result['round_trips']:6.1f}  "
+            f"unchanged {result['unchanged']:6.1f}  answer latency {result['latency']:5.2f}s"
+        )
+    print("stream_manager.refresh_stats():", stream_manager.refresh_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+指标埋点开销基准
+
+测量单次直方图观测与一次回调全部埋点（4 个阶段，每个阶段两次 perf_counter + 一次 observe）的耗时，
+并与预算对比：单次回调埋点开销需低于 PER_REQUEST_BUDGET_US，超出时以非零状态退出（可作为 CI 中的可选检查）。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_metrics
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from core.metrics import MetricsRegistry
+
+ITERATIONS = 200000
+# 单次回调的埋点开销预算（微秒）
+PER_REQUEST_BUDGET_US = 10.0
+
+
+def _per_call_us(fn, iterations: int = ITERATIONS) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def measure_request_overhead_us(iterations: int = ITERATIONS) -> float:
+    """一次回调全部埋点的平均耗时（微秒）。"""
+    registry = MetricsRegistry()
+    stages = [registry.histogram("bench_stage_seconds", "bench", {"stage": str(i)}) for i in range(4)]
+
+    def instrumented_request() -> None:
+        for histogram in stages:
+            start = time.perf_counter()
+            histogram.observe(time.perf_counter() - start)
+
+    return _per_call_us(instrumented_request, iterations)
+
+
+def main() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bench_seconds", "bench")
+    observe_us = _per_call_us(lambda: histogram.observe(0.003))
+    print(f"observe      {observe_us:8.3f} us/call")
+
+    request_us = measure_request_overhead_us()
+    verdict = "OK" if request_us < PER_REQUEST_BUDGET_US else "OVER BUDGET"
+    print(f"per-request  {request_us:8.3f} us/request (budget {PER_REQUEST_BUDGET_US:.0f} us: {verdict})")
+
+    for i in range(20):
+        registry.histogram("bench_stage_seconds", "bench", {"stage": str(i)}).observe(0.01)
+    render_us = _per_call_us(registry.render, 2000)
+    print(f"render       {render_us:8.1f} us/scrape (21 histograms)")
+    if request_us >= PER_REQUEST_BUDGET_US:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+OpenAI 流式接入基准：首 token 延迟（TTFT）与单进程并发流容量
+
+对比：
+- legacy：每个流新建同步 OpenAI 客户端 + 生产者线程 + 逐 token asyncio.to_thread(queue.get)
+- shared：进程级共享 AsyncOpenAI 客户端（keep-alive 连接池，无额外线程）
+
+负载来自本地 OpenAI 兼容 SSE 服务（benchmarks.fake_openai_server，独立子进程运行，
+因此统计到的线程数只包含客户端一侧）。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_openai_stream [--streams 50 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from queue import Queue
+
+from openai import OpenAI
+
+from core.llm import openai_client
+from utils.config import settings
+
+PORT = 18081
+
+
+async def _legacy_stream_iter(prompt: str):
+    """旧实现的等价复刻，仅用于对比。"""
+    queue: Queue[object] = Queue()
+
+    def _producer() -> None:
+        try:
+            client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+            stream = client.chat.completions.create(
+                model="fake", messages=[{"role": "user", "content": prompt}], stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    queue.put(chunk.choices[0].delta.content)
+        except Exception as exc:
+            queue.put(exc)
+        finally:
+            queue.put(None)
+
+    threading.Thread(target=_producer, daemon=True).start()
+    while True:
+        item = await asyncio.to_thread(queue.get)
+        if item is None:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def _one_stream(iter_fn, ttfts: list[float]) -> None:
+    start = time.perf_counter()
+    first = True
+    async for _ in iter_fn("hi"):
+        if first:
+            ttfts.append(time.perf_counter() - start)
+            first = False
+
+
+async def _run(iter_fn, streams: int) -> dict:
+    ttfts: list[float] = []
+    peak_threads = threading.active_count()
+
+    async def _sample_threads() -> None:
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.create_task(_sample_threads())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_one_stream(iter_fn, ttfts) for _ in range(streams)), return_exceptions=True)
+    wall = time.perf_counter() - start
+    sampler.cancel()
+    errors = sum(isinstance(r, Exception) for r in results)
+    ttfts.sort()
+    return {
+        "wall": wall,
+        "ttft_p50": statistics.median(ttfts) if ttfts else float("nan"),
+        "ttft_p95": ttfts[int(len(ttfts) * 0.95) - 1] if ttfts else float("nan"),
+        "peak_threads": peak_threads,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, nargs="+", default=[50, 200])
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai_server", "--port", str(PORT)],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    settings.OPENAI_API_KEY = "sk-bench"
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{PORT}/v1"
+    settings.OPENAI_MAX_CONNECTIONS = max(args.streams)
+    try:
+        for streams in args.streams:
+            for label, iter_fn in (("legacy", _legacy_stream_iter), ("shared", openai_client.openai_stream_iter)):
+                result = asyncio.run(_run(iter_fn, streams))
+                print(
+                    f"{streams:>4} streams {label:<7} wall {result['wall']:6.2f}s  "
+                    f"ttft p50 {result['ttft_p50'] * 1000:7.1f}ms p95 {result['ttft_p95'] * 1000:7.1f}ms  "
+                    f"peak threads {result['peak_threads']:4d}  errors {result['errors']}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+冷启动基准
+
+在全新的 Python 进程中测量：
+- import：导入 `app` 的耗时，以及此时是否已加载较重的 SDK（openai、wechatpy）；
+- first health：从进程启动到 `uvicorn app:app` 首次成功响应 `/api/health` 的耗时
+  （对应 docker-compose 健康检查的 start_period）。
+导入 + 首个健康检查的中位数超过 STARTUP_BUDGET_SECONDS 时以非零状态退出（可作为 CI 中的可选检查）。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+# 冷启动预算（秒）：导入 app 并完成首个 /api/health 请求
+STARTUP_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = ("openai", "wechatpy")
+
+_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+response = TestClient(app.app).get("/api/health")
+assert response.status_code == 200, response.text
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "first_health_seconds": time.perf_counter() - start,
+    "heavy_modules_loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_in_process_startup() -> dict:
+    """在子进程中导入 app 并用 TestClient 请求一次 /api/health，返回耗时与已加载的重型模块。"""
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=API_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_uvicorn_first_health(timeout: float = 30.0) -> float:
+    """启动 uvicorn 子进程，返回从启动到 /api/health 首次返回 200 的秒数。"""
+    port = _free_port()
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("uvicorn did not answer /api/health in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    probes = [measure_in_process_startup() for _ in range(args.runs)]
+    uvicorn_runs = [measure_uvicorn_first_health() for _ in range(args.runs)]
+    import_median = statistics.median(p["import_seconds"] for p in probes)
+    health_median = statistics.median(p["first_health_seconds"] for p in probes)
+    print(f"import app            {import_median * 1000:8.1f} ms (median of {args.runs})")
+    print(f"import + first health {health_median * 1000:8.1f} ms (budget {STARTUP_BUDGET_SECONDS * 1000:.0f} ms)")
+    print(f"uvicorn first health  {statistics.median(uvicorn_runs) * 1000:8.1f} ms")
+    print(f"heavy modules loaded at startup: {probes[0]['heavy_modules_loaded'] or 'none'}")
+    if health_median >= STARTUP_BUDGET_SECONDS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
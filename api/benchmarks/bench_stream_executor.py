@@ -0,0 +1,107 @@
+"""
+流 worker 调度开销：每流线程 + asyncio.run vs 进程级 StreamExecutor
+
+同步调用方（脚本、测试）开启 1000 个流时：
+- legacy：原实现，每个流新建一个线程并 asyncio.run 一个新的事件循环；
+- executor：提交到常驻的后台事件循环线程。
+每个流模拟一次短暂的分片生成（若干次 asyncio.sleep），统计总耗时、进程 CPU 时间、新建线程数与峰值线程数。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_stream_executor --streams 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+
+from core.stream_executor import StreamExecutor
+
+TOKENS = 5
+TOKEN_INTERVAL = 0.01
+
+
+async def _fake_stream() -> None:
+    for _ in range(TOKENS):
+        await asyncio.sleep(TOKEN_INTERVAL)
+
+
+class _ThreadCounter:
+    """统计运行期间新建的线程数与峰值存活线程数。"""
+
+    def __init__(self) -> None:
+        self.created = 0
+        self.peak = threading.active_count()
+        self._original = threading.Thread.start
+
+    def __enter__(self) -> _ThreadCounter:
+        counter = self
+
+        def start(thread: threading.Thread) -> None:
+            counter.created += 1
+            counter._original(thread)
+            counter.peak = max(counter.peak, threading.active_count())
+
+        threading.Thread.start = start
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        threading.Thread.start = self._original
+
+
+def run_legacy(streams: int) -> dict:
+    with _ThreadCounter() as counter:
+        wall, cpu = time.perf_counter(), time.process_time()
+        threads = []
+        for _ in range(streams):
+            thread = threading.Thread(target=lambda: asyncio.run(_fake_stream()), daemon=True)
+            thread.start()
+            threads.append(thread)
+        submit = time.perf_counter() - wall
+        for thread in threads:
+            thread.join()
+        return _result(wall, cpu, submit, counter)
+
+
+def run_executor(streams: int) -> dict:
+    executor = StreamExecutor(name="bench-executor")
+    with _ThreadCounter() as counter:
+        wall, cpu = time.perf_counter(), time.process_time()
+        futures = [executor.submit(str(i), _fake_stream()) for i in range(streams)]
+        submit = time.perf_counter() - wall
+        for future in futures:
+            future.result()
+        result = _result(wall, cpu, submit, counter)
+    executor.close()
+    return result
+
+
+def _result(wall: float, cpu: float, submit: float, counter: _ThreadCounter) -> dict:
+    return {
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": time.process_time() - cpu,
+        "submit_ms": submit * 1000,
+        "threads_created": counter.created,
+        "peak_threads": counter.peak,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams, {TOKENS} tokens x {TOKEN_INTERVAL * 1000:.0f} ms each")
+    for name, run in (("legacy", run_legacy), ("executor", run_executor)):
+        result = run(args.streams)
+        print(
+            f"{name:<9} wall {result['wall_s']:6.2f}s  cpu {result['cpu_s']:6.2f}s  "
+            f"submit {result['submit_ms']:8.1f} ms  threads created {result['threads_created']:>5}  "
+            f"peak {result['peak_threads']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+流记录内存与 CPU 基准
+
+以 2k / 4k / 8k token 的真实长度回答为负载，对比：
+- legacy：dict 记录 + 逐 token `content += chunk`
+- session：`StreamSession`（分片列表 + 版本号 + join 缓存）
+
+每个 token 追加一次，每 20 个 token 模拟一次刷新轮询读取完整内容。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_stream_session
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+
+from core.stream_state import StreamSession, StreamStatus
+
+TOKEN_COUNTS = (2000, 4000, 8000)
+STREAMS = 50
+POLL_EVERY = 20
+# 中英文混合的典型 token
+TOKENS = ["企业", "微信", "的", "流式", " reply", " token", "，", "。", " the", " answer"]
+
+
+def _legacy(tokens: list[str]) -> list[dict]:
+    records = [{"status": StreamStatus.RUNNING, "content": ""} for _ in range(STREAMS)]
+    for i, token in enumerate(tokens):
+        for record in records:
+            record["content"] += token
+            if i % POLL_EVERY == 0:
+                _ = {"status": record["status"], "content": record["content"]}
+    return records
+
+
+def _session(tokens: list[str]) -> list[StreamSession]:
+    records = [StreamSession() for _ in range(STREAMS)]
+    for i, token in enumerate(tokens):
+        for record in records:
+            record.append(token)
+            if i % POLL_EVERY == 0:
+                _ = record.to_state()
+    return records
+
+
+def _measure(fn, tokens: list[str]) -> tuple[float, float]:
+    tracemalloc.start()
+    start = time.process_time()
+    records = fn(tokens)
+    cpu = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return cpu, peak / 1024 / 1024
+
+
+def main() -> None:
+    print(f"{STREAMS} concurrent streams, poll every {POLL_EVERY} tokens")
+    for count in TOKEN_COUNTS:
+        tokens = [TOKENS[i % len(TOKENS)] for i in range(count)]
+        for label, fn in (("legacy", _legacy), ("session", _session)):
+            cpu, peak = _measure(fn, tokens)
+            print(f"{count:>5} tokens  {label:<8} cpu {cpu * 1000:8.1f} ms  peak {peak:7.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
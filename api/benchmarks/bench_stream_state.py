@@ -0,0 +1,103 @@
+"""
+流状态后端轮询吞吐基准
+
+模拟多个 uvicorn worker 进程并发执行刷新轮询（get_stream_state），
+同时由主进程持续向流追加分片，统计不同 worker 数下的总轮询吞吐。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_stream_state [--backend sqlite|redis] [--seconds 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from core.stream_state import MemoryStreamStateBackend, StreamStatus, create_stream_state_backend
+
+STREAMS = 64
+
+
+def _open_backend(name: str, target: str):
+    if name == "sqlite":
+        return create_stream_state_backend("sqlite", sqlite_path=target)
+    return create_stream_state_backend("redis", redis_url=target)
+
+
+def _poller(name: str, target: str, seconds: float, counter) -> None:
+    backend = _open_backend(name, target)
+    polls = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        backend.get(f"s{polls % STREAMS}")
+        polls += 1
+    with counter.get_lock():
+        counter.value += polls
+
+
+def _writer(backend, stop: threading.Event) -> None:
+    while not stop.is_set():
+        for i in range(STREAMS):
+            backend.append(f"s{i}", "token ")
+        time.sleep(0.01)
+
+
+def _run(name: str, target: str, workers: int, seconds: float) -> float:
+    backend = _open_backend(name, target)
+    for i in range(STREAMS):
+        backend.create(f"s{i}")
+
+    stop = threading.Event()
+    writer = threading.Thread(target=_writer, args=(backend, stop), daemon=True)
+    writer.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    counter = ctx.Value("q", 0)
+    procs = [ctx.Process(target=_poller, args=(name, target, seconds, counter)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    stop.set()
+    writer.join()
+
+    for i in range(STREAMS):
+        backend.set_status(f"s{i}", StreamStatus.DONE)
+    return counter.value / seconds
+
+
+def _memory_baseline(seconds: float) -> float:
+    backend = MemoryStreamStateBackend()
+    for i in range(STREAMS):
+        backend.create(f"s{i}")
+    polls = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        backend.get(f"s{polls % STREAMS}")
+        polls += 1
+    return polls / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
+    parser.add_argument("--redis-url", default="redis://127.0.0.1:6379/0")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"memory (1 worker, baseline)  {_memory_baseline(args.seconds):12.0f} polls/s")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "streams.db") if args.backend == "sqlite" else args.redis_url
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            rate = _run(args.backend, target, workers, args.seconds)
+            print(f"{args.backend} ({workers:>2} workers)         {rate:12.0f} polls/s")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
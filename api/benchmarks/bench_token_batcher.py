@@ -0,0 +1,142 @@
+"""
+分片写入开销：逐 token 写入 vs 批量合并写入
+
+快速的本地模型：上游每次网络读取产出若干 token，token 之间不等待。对比：
+- per-token：原实现，每个 token 调用一次 `append`（加一次后端锁 / 一次 sqlite 事务）并唤醒一次 long-poll；
+- batched：`batch_tokens` 按时间窗口 / 字符数合并后每批写入、唤醒一次。
+统计每 1k token 的锁获取次数（后端锁 + long-poll 唤醒锁）、后端写入次数与进程 CPU 时间，以及平均批次大小。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_token_batcher --streams 50 --tokens 2000
+    python -m benchmarks.bench_token_batcher --backend sqlite --streams 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+import time
+
+from core.stream_state import MemoryStreamStateBackend, SQLiteStreamStateBackend, StreamStateBackend, StreamStatus
+from core.token_batcher import batch_tokens
+
+TOKENS_PER_READ = 8
+TOKEN = " token"
+
+
+class _CountingLock:
+    """统计获取次数的锁。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self.acquisitions = 0
+
+    def __enter__(self) -> _CountingLock:
+        self._lock.acquire()
+        self.acquisitions += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._lock.release()
+
+
+async def _fast_model(tokens: int):
+    for i in range(tokens):
+        yield TOKEN
+        if i % TOKENS_PER_READ == TOKENS_PER_READ - 1:
+            await asyncio.sleep(0)
+
+
+# 模拟 `_notify_stream_update` 每次写入后获取的 long-poll 等待表锁
+_waiters_lock = _CountingLock()
+
+
+def _write(backend: StreamStateBackend, stream_id: str, text: str) -> bool:
+    status = backend.append(stream_id, text)
+    with _waiters_lock:
+        pass
+    return status == StreamStatus.RUNNING
+
+
+async def _per_token(backend: StreamStateBackend, stream_id: str, tokens: int) -> int:
+    writes = 0
+    async for chunk in _fast_model(tokens):
+        writes += 1
+        if not _write(backend, stream_id, chunk):
+            break
+    return writes
+
+
+async def _batched(backend: StreamStateBackend, stream_id: str, tokens: int) -> int:
+    writes = 0
+    batches = batch_tokens(_fast_model(tokens), max_chars=512, window_seconds=0.05, buffer_size=256)
+    async with contextlib.aclosing(batches):
+        async for batch in batches:
+            writes += 1
+            if not _write(backend, stream_id, batch.text):
+                break
+    return writes
+
+
+def _backend(name: str, directory: str) -> tuple[StreamStateBackend, _CountingLock]:
+    lock = _CountingLock()
+    if name == "sqlite":
+        # sqlite 后端没有进程内锁，每次写入是一次事务（见 writes 列）
+        return SQLiteStreamStateBackend(os.path.join(directory, f"bench-{time.monotonic_ns()}.db")), lock
+    backend = MemoryStreamStateBackend()
+    backend._lock = lock
+    return backend, lock
+
+
+def run(consume, backend_name: str, streams: int, tokens: int, directory: str) -> dict:
+    backend, lock = _backend(backend_name, directory)
+    for i in range(streams):
+        backend.create(str(i))
+        backend.set_status(str(i), StreamStatus.RUNNING)
+
+    async def main() -> list[int]:
+        return await asyncio.gather(*(consume(backend, str(i), tokens) for i in range(streams)))
+
+    acquisitions = lock.acquisitions + _waiters_lock.acquisitions
+    wall, cpu = time.perf_counter(), time.process_time()
+    writes = sum(asyncio.run(main()))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    total = streams * tokens
+    assert all(len(backend.get(str(i))["content"]) == tokens * len(TOKEN) for i in range(streams))
+    return {
+        "wall_s": wall,
+        "locks_per_1k": (lock.acquisitions + _waiters_lock.acquisitions - acquisitions) * 1000 / total,
+        "writes_per_1k": writes * 1000 / total,
+        "cpu_ms_per_1k": cpu * 1000 * 1000 / total,
+        "avg_batch": total / writes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    print(
+        f"{args.backend} backend, {args.streams} streams x {args.tokens} tokens, "
+        f"{TOKENS_PER_READ} tokens per upstream read"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name, consume in (("per-token", _per_token), ("batched", _batched)):
+            result = run(consume, args.backend, args.streams, args.tokens, directory)
+            print(
+                f"{name:<10} wall {result['wall_s']:6.2f}s  locks/1k tokens {result['locks_per_1k']:7.1f}  "
+                f"writes/1k tokens {result['writes_per_1k']:7.1f}  cpu/1k tokens {result['cpu_ms_per_1k']:7.2f} ms  "
+                f"avg batch {result['avg_batch']:5.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
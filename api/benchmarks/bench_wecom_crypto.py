@@ -0,0 +1,72 @@
+"""
+新回调协议加解密吞吐基准
+
+对比旧路径（包装 XML 后交给 wechatpy，再用 ElementTree 解析加密结果）
+与原生 WeComAESCodec 路径（不生成/解析任何 XML）的每秒处理次数。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_wecom_crypto
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import xml.etree.ElementTree as ET
+
+from wechatpy.enterprise.crypto import WeChatCrypto
+
+from core.wecom.crypto import WeComMessageCrypto
+
+TOKEN = "t"
+AES_KEY = "a" * 43
+ITERATIONS = 20000
+PLAIN_TEXT = json.dumps(
+    {"msgtype": "stream", "stream": {"id": "0" * 32, "finish": False, "content": "流式回复内容。" * 40}},
+    ensure_ascii=False,
+)
+
+
+class LegacyMessageCrypto:
+    """旧实现：借助 wechatpy 的 XML 接口完成新回调协议加解密。"""
+
+    def __init__(self) -> None:
+        self.crypto = WeChatCrypto(TOKEN, AES_KEY, "")
+
+    def decrypt_from_json(self, msg_signature: str, timestamp: str, nonce: str, encrypt: str) -> str:
+        encrypted_xml = f"<xml><Encrypt><![CDATA[{encrypt}]]></Encrypt></xml>"
+        return self.crypto.decrypt_message(msg=encrypted_xml, signature=msg_signature, timestamp=timestamp, nonce=nonce)
+
+    def encrypt_to_json(self, plain_text: str, nonce: str) -> dict:
+        root = ET.fromstring(self.crypto.encrypt_message(plain_text, nonce))
+        ts = root.findtext("TimeStamp")
+        return {
+            "encrypt": root.findtext("Encrypt"),
+            "msgsignature": root.findtext("MsgSignature"),
+            "timestamp": int(ts),
+            "nonce": root.findtext("Nonce"),
+        }
+
+
+def _bench(label: str, crypto) -> float:
+    enc = crypto.encrypt_to_json(PLAIN_TEXT, "nonce")
+    args = (enc["msgsignature"], str(enc["timestamp"]), enc["nonce"], enc["encrypt"])
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        crypto.decrypt_from_json(*args)
+        crypto.encrypt_to_json(PLAIN_TEXT, "nonce")
+    elapsed = time.perf_counter() - start
+    ops = ITERATIONS / elapsed
+    print(f"{label:<8} {ops:10.0f} decrypt+encrypt/s  {elapsed / ITERATIONS * 1e6:8.2f} us/op")
+    return ops
+
+
+def main() -> None:
+    legacy = _bench("legacy", LegacyMessageCrypto())
+    native = _bench("native", WeComMessageCrypto(token=TOKEN, encoding_aes_key=AES_KEY, corp_id=""))
+    print(f"speedup  {native / legacy:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
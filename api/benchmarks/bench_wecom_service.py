@@ -0,0 +1,41 @@
+"""
+WeComService 构建开销基准
+
+对比每次请求新建 WeComService 与复用进程级共享实例的单次耗时。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.bench_wecom_service
+"""
+
+from __future__ import annotations
+
+import time
+
+from service.wecom_callback_service import WeComService, get_wecom_service
+from utils.config import settings
+
+ITERATIONS = 20000
+
+
+def _bench(label: str, fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    per_call_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+    print(f"{label:<12} {per_call_us:8.2f} us/request")
+    return per_call_us
+
+
+def main() -> None:
+    kwargs = {
+        "token": settings.WECOM_TOKEN,
+        "encoding_aes_key": settings.WECOM_ENCODING_AES_KEY,
+        "corp_id": settings.WECOM_CORP_ID,
+    }
+    fresh = _bench("per-request", lambda: WeComService(**kwargs))
+    cached = _bench("registry", lambda: get_wecom_service(**kwargs))
+    print(f"saved        {fresh - cached:8.2f} us/request ({fresh / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+本地 OpenAI 兼容 SSE 服务（测试与基准使用）
+
+实现 `POST /v1/chat/completions`（stream=true）：按配置的首 token 延迟与 token 间隔，
+以 HTTP/1.1 chunked 编码逐个推送 `chat.completion.chunk` 事件，支持 keep-alive。
+同时统计建立过的 TCP 连接数、并发中的流数量以及被客户端提前断开的流数量。
+
+单独运行（在 api/ 目录）：
+    python -m benchmarks.fake_openai_server --port 18080
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tokens: list[str] | None = None,
+        first_token_delay: float = 0.0,
+        token_interval: float = 0.0,
+    ) -> None:
+        super().__init__((host, port), _FakeOpenAIHandler)
+        self.tokens = tokens if tokens is not None else ["Hello", " ", "from", " ", "fake", " ", "LLM."]
+        self.first_token_delay = first_token_delay
+        self.token_interval = token_interval
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.active_streams = 0
+        self.max_active_streams = 0
+        self.completed_streams = 0
+        self.aborted_streams = 0
+        self.aborted = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> FakeOpenAIServer:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOpenAIServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _sleep(self, seconds: float) -> None:
+        """等待 seconds 秒；期间客户端关闭连接时立即抛出 ConnectionResetError，而不是等到下一次写入。"""
+        if seconds <= 0:
+            return
+        readable, _, _ = select.select([self.connection], [], [], seconds)
+        # 流式响应期间客户端不会再发送数据：连接可读只可能是对端已关闭
+        if readable and not self.connection.recv(1, socket.MSG_PEEK):
+            raise ConnectionResetError("client closed the stream")
+
+    def _event(self, delta: dict, finish_reason: str | None = None) -> bytes:
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        server = self.server
+        with server.lock:
+            server.active_streams += 1
+            server.max_active_streams = max(server.max_active_streams, server.active_streams)
+        try:
+            self._write_chunk(self._event({"role": "assistant", "content": ""}))
+            self._sleep(server.first_token_delay)
+            for i, token in enumerate(server.tokens):
+                if i:
+                    self._sleep(server.token_interval)
+                self._write_chunk(self._event({"content": token}))
+            self._write_chunk(self._event({}, finish_reason="stop"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前关闭连接（例如停止生成）
+            with server.lock:
+                server.aborted_streams += 1
+            server.aborted.set()
+            self.close_connection = True
+        else:
+            with server.lock:
+                server.completed_streams += 1
+        finally:
+            with server.lock:
+                server.active_streams -= 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        port=args.port, first_token_delay=args.first_token_delay, token_interval=args.token_interval
+    )
+    print(f"fake OpenAI server listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+企业微信回调端到端压测
+
+用 `WeComMessageCrypto` 生成签名正确的加密 text 回调，驱动真实的 `app`：默认在进程内通过
+ASGI transport 调用，也可以通过 `--url` 压测本地已启动的服务。每个会话先发送用户消息，
+之后模拟企业微信的刷新轮询（间隔 poll_interval 发起 msgtype=stream 刷新），直至 finish=true。
+
+输出每秒请求数、各端点（message / refresh）的 p50/p95/p99 延迟以及端到端回答耗时，
+并可通过 `--output` 保存为 JSON，便于跨提交对比。
+
+运行（在 api/ 目录）：
+    python -m benchmarks.loadgen --conversations 200 --concurrency 50 --output loadgen.json
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --conversations 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+from core.wecom.crypto import WeComMessageCrypto
+from utils.config import settings
+from utils.logging import init_logging
+
+CALLBACK_PATH = "/api/wecom/callback"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩百分位数；空列表返回 0。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _summary(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+    }
+
+
+@dataclass
+class LoadResult:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: {"message": [], "refresh": []})
+    answer_latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        requests = sum(len(values) for values in self.latencies.values())
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "elapsed_seconds": self.elapsed,
+            "requests_per_second": requests / self.elapsed if self.elapsed else 0.0,
+            "conversations_completed": len(self.answer_latencies),
+            "endpoints": {name: _summary(values) for name, values in self.latencies.items()},
+            "answer_latency": _summary(self.answer_latencies),
+        }
+
+
+class CallbackClient:
+    """生成加密回调、解密回包的企业微信模拟客户端。"""
+
+    def __init__(self, http: httpx.AsyncClient, crypto: WeComMessageCrypto, result: LoadResult) -> None:
+        self.http = http
+        self.crypto = crypto
+        self.result = result
+
+    async def send(self, endpoint: str, payload: dict) -> dict | None:
+        """发送一次回调，返回回包中的 stream 字段；失败时计入错误并返回 None。"""
+        nonce = uuid.uuid4().hex[:16]
+        enc = self.crypto.encrypt_to_json(plain_text=json.dumps(payload, ensure_ascii=False), nonce=nonce)
+        params = {"msg_signature": enc["msgsignature"], "timestamp": str(enc["timestamp"]), "nonce": enc["nonce"]}
+
+        start = time.perf_counter()
+        try:
+            response = await self.http.post(CALLBACK_PATH, params=params, json={"encrypt": enc["encrypt"]})
+        except httpx.HTTPError:
+            self.result.errors += 1
+            return None
+        self.result.latencies[endpoint].append(time.perf_counter() - start)
+        if response.status_code != 200:
+            self.result.errors += 1
+            return None
+
+        reply = response.json()
+        plain = self.crypto.decrypt_from_json(
+            reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"]
+        )
+        return json.loads(plain)["stream"]
+
+
+async def _conversation(client: CallbackClient, index: int, poll_interval: float, max_polls: int) -> None:
+    start = time.perf_counter()
+    stream = await client.send(
+        "message",
+        {
+            "msgid": uuid.uuid4().hex,
+            "aibotid": "loadgen",
+            "chatid": f"chat-{index}",
+            "chattype": "single",
+            "from": {"userid": f"user-{index}"},
+            "msgtype": "text",
+            "text": {"content": f"loadgen question {index}"},
+        },
+    )
+    if stream is None:
+        return
+
+    stream_id = stream["id"]
+    for _ in range(max_polls):
+        await asyncio.sleep(poll_interval)
+        stream = await client.send("refresh", {"msgtype": "stream", "stream": {"id": stream_id}})
+        if stream is not None and stream["finish"]:
+            client.result.answer_latencies.append(time.perf_counter() - start)
+            return
+    client.result.errors += 1
+
+
+async def run_load(
+    conversations: int,
+    concurrency: int,
+    poll_interval: float = 0.5,
+    max_polls: int = 600,
+    url: str | None = None,
+) -> LoadResult:
+    """并发运行 conversations 个会话（同时最多 concurrency 个），返回统计结果。"""
+    if url:
+        transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport()
+        base_url = url
+    else:
+        from app import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadgen"
+
+    crypto = WeComMessageCrypto(settings.WECOM_TOKEN, settings.WECOM_ENCODING_AES_KEY, settings.WECOM_CORP_ID)
+    result = LoadResult()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as http:
+        client = CallbackClient(http, crypto, result)
+
+        async def _limited(index: int) -> None:
+            async with semaphore:
+                await _conversation(client, index, poll_interval, max_polls)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_limited(i) for i in range(conversations)))
+        result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--max-polls", type=int, default=600)
+    parser.add_argument("--url", default=None, help="压测已启动的服务（默认进程内 ASGI）")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    parser.add_argument("--log-level", default="WARNING", help="进程内压测时应用的日志级别")
+    args = parser.parse_args()
+
+    # 先于 app 导入初始化日志，避免逐请求的 INFO 日志影响测量
+    init_logging(args.log_level)
+
+    result = asyncio.run(run_load(args.conversations, args.concurrency, args.poll_interval, args.max_polls, args.url))
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "results": result.to_dict(),
+    }
+
+    summary = report["results"]
+    print(
+        f"{summary['requests']} requests in {summary['elapsed_seconds']:.2f}s "
+        f"({summary['requests_per_second']:.1f} req/s), errors {summary['errors']}"
+    )
+    for name, stats in (*summary["endpoints"].items(), ("answer", summary["answer_latency"])):
+        print(
+            f"{name:<8} n={stats['count']:<6} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+            f"p99 {stats['p99_ms']:8.1f} ms"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+        print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,13 @@ set -euo pipefail
 HOST=${HOST:-"0.0.0.0"}
 PORT=${PORT:-8000}
 WORKERS=${WORKERS:-1}
+STREAM_STATE_BACKEND=${STREAM_STATE_BACKEND:-"memory"}
 
-echo "fastapi run on $HOST:$PORT with $WORKERS workers"
+# memory 后端的流状态仅存在于单个进程内，多 worker 时刷新轮询可能落到其他进程而拿到 MISSING
+if [ "$WORKERS" -gt 1 ] && [ "$STREAM_STATE_BACKEND" = "memory" ]; then
+  echo "STREAM_STATE_BACKEND=memory only supports a single worker, falling back to WORKERS=1"
+  WORKERS=1
+fi
+
+echo "fastapi run on $HOST:$PORT with $WORKERS workers (stream state: $STREAM_STATE_BACKEND)"
 exec uvicorn app:app --host "$HOST" --port "$PORT" --workers "$WORKERS"
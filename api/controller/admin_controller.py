@@ -0,0 +1,60 @@
+"""
+管理接口控制器
+提供运维用的缓存查询/清理等接口，需在请求头携带 X-Admin-Token
+"""
+
+import hmac
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from core.stream_manager import (
+    admission_stats,
+    answer_cache_stats,
+    dedup_stats,
+    flush_answer_cache,
+    stream_store_stats,
+)
+from utils.config import settings
+
+
+def require_admin_token(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    """校验管理令牌（常量时间比较）；未配置 ADMIN_TOKEN 时管理接口整体禁用。"""
+    if not settings.ADMIN_TOKEN or not hmac.compare_digest(
+        (x_admin_token or "").encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/answer-cache")
+async def answer_cache_get() -> dict[str, Any]:
+    """查询回答缓存统计（命中率、占用字节数等）。"""
+    return answer_cache_stats()
+
+
+@router.post("/answer-cache/flush")
+async def answer_cache_flush() -> dict[str, Any]:
+    """清空回答缓存。"""
+    flushed = flush_answer_cache()
+    return {"flushed": flushed, **answer_cache_stats()}
+
+
+@router.get("/admission")
+async def admission_get(bot_id: str | None = None) -> dict[str, Any]:
+    """查询 LLM 并发准入统计（运行中数量、排队深度、排队等待时间），可按机器人查询。"""
+    return admission_stats(bot_id)
+
+
+@router.get("/dedup")
+async def dedup_get() -> dict[str, Any]:
+    """查询回调重投去重统计（命中即被识别为重投的回调；memory 后端另含条目数与淘汰次数）。"""
+    return dedup_stats()
+
+
+@router.get("/streams")
+async def streams_get() -> dict[str, Any]:
+    """查询内存流状态存储的容量统计（流数量、内容字节数、上限、淘汰与拒绝次数）。"""
+    return stream_store_stats()
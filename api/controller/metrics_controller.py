@@ -0,0 +1,17 @@
+"""
+指标控制器
+以 Prometheus 文本格式暴露进程内的阶段耗时直方图与计数器
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus 抓取端点（text/plain; version=0.0.4）。"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -3,12 +3,11 @@
 负责处理企业微信回调相关的HTTP请求和响应，只做协议适配和参数校验，调用service层处理业务逻辑
 """
 
-from typing import Annotated
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import PlainTextResponse, Response
 
-from fastapi import APIRouter, Body, Query, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
-
-from service.wecom_callback_service import WeComService
+from service.wecom_callback_service import WeComService, get_bot_service, get_wecom_service
+from utils import fast_json
 from utils.config import settings
 from utils.logging import get_logger
 
@@ -39,11 +38,21 @@ async def wecom_callback_get(
         echostr,
     )
 
-    # 初始化WeComService（配置完整性已在启动时校验）
-    wecom_service = WeComService(
+    # 获取进程内共享的WeComService（配置完整性已在启动时校验）
+    wecom_service = get_wecom_service(
         token=settings.WECOM_TOKEN, encoding_aes_key=settings.WECOM_ENCODING_AES_KEY, corp_id=settings.WECOM_CORP_ID
     )
+    return _verify_url(wecom_service, msg_signature, timestamp, nonce, echostr)
+
 
+def _verify_url(
+    wecom_service: WeComService,
+    msg_signature: str | None,
+    timestamp: str | None,
+    nonce: str | None,
+    echostr: str | None,
+) -> PlainTextResponse:
+    """URL 验证的公共处理（默认机器人与多机器人路由共用）"""
     # 验证参数完整性
     params_valid, params_error = wecom_service.validate_callback_params(
         msg_signature=msg_signature, timestamp=timestamp, nonce=nonce, echostr=echostr
@@ -64,39 +73,104 @@ async def wecom_callback_get(
         return PlainTextResponse("internal error", status_code=500)
 
 
+async def _read_body(request: Request, limit: int) -> bytes | None:
+    """按上限读取原始请求体，超出上限时返回 None（先看 Content-Length，再按实际读取的字节数判断）。"""
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        return None
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
 @router.post("/wecom/callback")
 async def wecom_callback_post(
     request: Request,
-    body: Annotated[dict, Body(...)],
     msg_signature: str = Query(..., description="企业微信签名 msg_signature"),
     timestamp: str = Query(..., description="时间戳 timestamp（字符串）"),
     nonce: str = Query(..., description="随机串 nonce"),
 ):
     """企业微信回调消息处理（POST）
 
-    重构后实现：
-    - 使用WeComService处理业务逻辑
-    - 控制器层仅负责协议适配和参数校验
-    - 保持原有的请求/响应格式和状态码
+    热路径实现：
+    - 按 CALLBACK_MAX_BODY_BYTES 读取原始请求体，不经过 FastAPI 的通用请求体校验
+    - 用快速 JSON 解码器取出 encrypt
+    - 回包直接序列化为 bytes 返回，不再经过 JSONResponse 的通用编码
     """
-    # 读取 JSON 请求体并直接取 encrypt（签名中声明为 dict，无需再判断类型）
-    encrypt = body.get("encrypt")
-    if not isinstance(encrypt, str) or not encrypt:
-        return PlainTextResponse("missing encrypt in body", status_code=400)
-
-    # 初始化WeComService（配置完整性已在启动时校验）
-    wecom_service = WeComService(
+    # 获取进程内共享的WeComService（配置完整性已在启动时校验）
+    wecom_service = get_wecom_service(
         token=settings.WECOM_TOKEN, encoding_aes_key=settings.WECOM_ENCODING_AES_KEY, corp_id=settings.WECOM_CORP_ID
     )
+    return await _handle_callback(wecom_service, request, msg_signature, timestamp, nonce)
+
+
+async def _handle_callback(
+    wecom_service: WeComService, request: Request, msg_signature: str, timestamp: str, nonce: str
+) -> Response:
+    """回调消息的公共处理（默认机器人与多机器人路由共用）"""
+    body = await _read_body(request, settings.CALLBACK_MAX_BODY_BYTES)
+    if body is None:
+        return PlainTextResponse("request body too large", status_code=413)
+
+    try:
+        payload = fast_json.loads(body)
+    except ValueError:
+        return PlainTextResponse("invalid json body", status_code=400)
+    encrypt = payload.get("encrypt") if isinstance(payload, dict) else None
+    if not isinstance(encrypt, str) or not encrypt:
+        return PlainTextResponse("missing encrypt in body", status_code=400)
 
-    # 处理回调消息
-    success, result, encrypted_response = wecom_service.process_callback_message(
-        msg_signature=msg_signature, timestamp=timestamp, nonce=nonce, encrypt=encrypt
+    # 处理回调消息（配置 STREAM_HOLD_SECONDS 时，刷新请求会挂起等待新内容）
+    success, result, encrypted_response = await wecom_service.process_callback_message_async(
+        msg_signature=msg_signature,
+        timestamp=timestamp,
+        nonce=nonce,
+        encrypt=encrypt,
+        hold_seconds=settings.STREAM_HOLD_SECONDS,
     )
 
     if success:
-        return JSONResponse(content=encrypted_response)
+        if encrypted_response is None:
+            # 事件回调无需回复内容：返回空包
+            return Response(status_code=200)
+        return Response(content=fast_json.dumps(encrypted_response), media_type="application/json")
     elif result == "invalid signature":
         return PlainTextResponse("invalid signature", status_code=400)
     else:
         return PlainTextResponse("internal error", status_code=500)
+
+
+@router.get("/wecom/callback/{bot_id}")
+async def wecom_bot_callback_get(
+    bot_id: str,
+    msg_signature: str | None = Query(default=None),
+    timestamp: str | None = Query(default=None),
+    nonce: str | None = Query(default=None),
+    echostr: str | None = Query(default=None),
+) -> PlainTextResponse:
+    """多机器人：验证指定机器人的回调URL（使用该机器人的 Token / EncodingAESKey）"""
+    wecom_service = get_bot_service(bot_id)
+    if wecom_service is None:
+        return PlainTextResponse("unknown bot", status_code=404)
+    return _verify_url(wecom_service, msg_signature, timestamp, nonce, echostr)
+
+
+@router.post("/wecom/callback/{bot_id}")
+async def wecom_bot_callback_post(
+    bot_id: str,
+    request: Request,
+    msg_signature: str = Query(..., description="企业微信签名 msg_signature"),
+    timestamp: str = Query(..., description="时间戳 timestamp（字符串）"),
+    nonce: str = Query(..., description="随机串 nonce"),
+):
+    """多机器人：处理指定机器人的回调消息，流状态与并发上限按机器人隔离"""
+    wecom_service = get_bot_service(bot_id)
+    if wecom_service is None:
+        return PlainTextResponse("unknown bot", status_code=404)
+    return await _handle_callback(wecom_service, request, msg_signature, timestamp, nonce)
@@ -0,0 +1,168 @@
+"""
+LLM 并发准入控制
+
+限制同时进行的上游 LLM 流数量：全局上限 + 单会话（chat）上限 + 单用户上限。
+超出上限的流按到达顺序排队；每次释放名额时从队首开始，唤醒第一个各项上限都允许的等待者
+（某个会话已满不会阻塞其他会话的排队者）。排队超过最长时间的流以 `AdmissionTimeoutError` 失败。
+
+等待者以 future 表示，通过 call_soon_threadsafe 唤醒，可跨线程/事件循环使用。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class AdmissionTimeoutError(Exception):
+    """排队超过最长等待时间"""
+
+    pass
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    chat_id: str | None
+    user_id: str | None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ConcurrencyGovernor:
+    """全局/会话/用户三级并发上限 + 公平 FIFO 排队。上限为 0 表示不限制。"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 0,
+        max_per_chat: int = 0,
+        max_per_user: int = 0,
+        max_queue_seconds: float = 60.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_per_chat = max_per_chat
+        self.max_per_user = max_per_user
+        self.max_queue_seconds = max_queue_seconds
+        self._lock = threading.Lock()
+        self._active = 0
+        self._active_per_chat: Counter[str] = Counter()
+        self._active_per_user: Counter[str] = Counter()
+        self._queue: list[_Waiter] = []
+        # 指标
+        self.admitted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _has_capacity(self, chat_id: str | None, user_id: str | None) -> bool:
+        if self.max_concurrency and self._active >= self.max_concurrency:
+            return False
+        if self.max_per_chat and chat_id and self._active_per_chat[chat_id] >= self.max_per_chat:
+            return False
+        return not (self.max_per_user and user_id and self._active_per_user[user_id] >= self.max_per_user)
+
+    def _take(self, chat_id: str | None, user_id: str | None, waited: float) -> None:
+        self._active += 1
+        if chat_id:
+            self._active_per_chat[chat_id] += 1
+        if user_id:
+            self._active_per_user[user_id] += 1
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def try_acquire(self, chat_id: str | None = None, user_id: str | None = None) -> bool:
+        """不排队地尝试获取名额；有排队者时不插队。"""
+        with self._lock:
+            if self._queue or not self._has_capacity(chat_id, user_id):
+                return False
+            self._take(chat_id, user_id, 0.0)
+            return True
+
+    async def acquire(self, chat_id: str | None = None, user_id: str | None = None) -> None:
+        """获取名额，必要时排队等待。
+
+        Raises:
+            AdmissionTimeoutError: 排队超过 max_queue_seconds
+        """
+        if self.try_acquire(chat_id, user_id):
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), chat_id, user_id)
+        with self._lock:
+            self._queue.append(waiter)
+            self.queued += 1
+            # 入队与释放之间可能已有名额空出
+            self._admit_waiters()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_queue_seconds)
+        except TimeoutError:
+            with self._lock:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                    self.timeouts += 1
+                    raise AdmissionTimeoutError(f"queued for more than {self.max_queue_seconds}s") from None
+            # 超时与准入同时发生：名额已分配，视为准入成功
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                else:
+                    self._release_locked(chat_id, user_id)
+            raise
+
+    def release(self, chat_id: str | None = None, user_id: str | None = None) -> None:
+        """归还名额并唤醒可准入的排队者。"""
+        with self._lock:
+            self._release_locked(chat_id, user_id)
+
+    def _release_locked(self, chat_id: str | None, user_id: str | None) -> None:
+        self._active -= 1
+        if chat_id:
+            self._active_per_chat[chat_id] -= 1
+            if self._active_per_chat[chat_id] <= 0:
+                del self._active_per_chat[chat_id]
+        if user_id:
+            self._active_per_user[user_id] -= 1
+            if self._active_per_user[user_id] <= 0:
+                del self._active_per_user[user_id]
+        self._admit_waiters()
+
+    def _admit_waiters(self) -> None:
+        """从队首开始唤醒所有当前可准入的排队者。调用方需持有锁。"""
+        now = time.monotonic()
+        index = 0
+        while index < len(self._queue):
+            if self.max_concurrency and self._active >= self.max_concurrency:
+                break
+            waiter = self._queue[index]
+            if self._has_capacity(waiter.chat_id, waiter.user_id):
+                self._queue.pop(index)
+                self._take(waiter.chat_id, waiter.user_id, now - waiter.enqueued_at)
+                waiter.future.get_loop().call_soon_threadsafe(_resolve, waiter.future)
+            else:
+                index += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "active": self._active,
+                "queue_depth": len(self._queue),
+                "oldest_queued_seconds": now - self._queue[0].enqueued_at if self._queue else 0.0,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "timeouts": self.timeouts,
+                "wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
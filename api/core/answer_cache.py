@@ -0,0 +1,92 @@
+"""
+重复提问的回答缓存
+
+以"规范化后的 prompt + 模型名"为键缓存已完成的回答，命中时直接以 DONE 状态回放，
+无需再发起一次 LLM 流式生成。
+
+- 总容量按字节数限制，超出时按最近最少使用淘汰；
+- 条目超过 TTL 后失效；
+- 暴露命中率与当前占用字节数。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化 prompt：去除首尾空白、合并连续空白并统一大小写。"""
+    return " ".join(prompt.split()).casefold()
+
+
+class AnswerCache:
+    """按字节数限制容量的 LRU + TTL 回答缓存（线程安全）。"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600.0) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # { (model, normalized_prompt): (answer, size_bytes, expires_at) }，按最近使用排序
+        self._entries: OrderedDict[tuple[str, str], tuple[str, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, key: tuple[str, str]) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, prompt: str, model: str) -> str | None:
+        """查询缓存的回答，未命中或已过期时返回 None。"""
+        key = (model, normalize_prompt(prompt))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, prompt: str, model: str, answer: str) -> None:
+        """写入回答；单条超过容量上限时不缓存。"""
+        key = (model, normalize_prompt(prompt))
+        size = len(answer.encode("utf-8")) + len(key[1].encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (answer, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> int:
+        """清空缓存，返回被清除的条目数。"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return count
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,145 @@
+"""
+多机器人注册表
+
+一个进程服务多个企业微信智能机器人：每个机器人有独立的 Token / EncodingAESKey 与 LLM 配置，
+回调地址为 `/api/wecom/callback/{bot_id}`。
+
+配置来源为 `WECOM_BOTS_PATH`：
+- JSON 文件：机器人列表，或 `{"bots": [...]}`；
+- 目录：其中每个 `*.json` 文件描述一个机器人，未写 `id` 时以文件名作为 bot_id。
+
+单个机器人的字段：
+    {
+        "id": "sales",                       # 路由中的 bot_id（字母、数字、- 与 _）
+        "token": "...",
+        "encoding_aes_key": "...",           # 43 位
+        "corp_id": "",                       # 可选
+        "llm_provider": "openai",            # 可选，默认沿用 LLM_PROVIDER
+        "openai_api_key": "...",             # 可选，默认沿用 OPENAI_API_KEY
+        "openai_base_url": "...",            # 可选
+        "openai_model": "gpt-5-mini",        # 可选
+        "max_concurrency": 8,                # 可选，机器人独立的并发上限，默认沿用 LLM_MAX_CONCURRENCY*
+        "max_per_chat": 2,
+        "max_per_user": 1
+    }
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from utils.config import ConfigValidationError, settings
+
+_BOT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+@dataclass(frozen=True)
+class BotConfig:
+    bot_id: str
+    token: str
+    encoding_aes_key: str
+    corp_id: str = ""
+    llm_provider: str | None = None
+    openai_api_key: str | None = None
+    openai_base_url: str | None = None
+    openai_model: str | None = None
+    max_concurrency: int | None = None
+    max_per_chat: int | None = None
+    max_per_user: int | None = None
+
+    @property
+    def provider(self) -> str:
+        """该机器人实际使用的 LLM provider。"""
+        return (self.llm_provider or settings.LLM_PROVIDER).lower()
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], default_id: str | None = None) -> BotConfig:
+        bot_id = str(data.get("id") or default_id or "")
+        if not _BOT_ID_PATTERN.match(bot_id):
+            raise ConfigValidationError(f"invalid bot id: {bot_id!r}")
+        token = data.get("token")
+        encoding_aes_key = data.get("encoding_aes_key")
+        if not token or not encoding_aes_key:
+            raise ConfigValidationError(f"bot {bot_id}: missing token or encoding_aes_key")
+        if len(encoding_aes_key) != 43:
+            raise ConfigValidationError(f"bot {bot_id}: encoding_aes_key must be 43 characters")
+
+        def _int(name: str) -> int | None:
+            value = data.get(name)
+            return None if value is None else int(value)
+
+        return cls(
+            bot_id=bot_id,
+            token=token,
+            encoding_aes_key=encoding_aes_key,
+            corp_id=data.get("corp_id") or "",
+            llm_provider=data.get("llm_provider"),
+            openai_api_key=data.get("openai_api_key"),
+            openai_base_url=data.get("openai_base_url"),
+            openai_model=data.get("openai_model"),
+            max_concurrency=_int("max_concurrency"),
+            max_per_chat=_int("max_per_chat"),
+            max_per_user=_int("max_per_user"),
+        )
+
+
+def load_bots(path: str | Path) -> dict[str, BotConfig]:
+    """从 JSON 文件或目录加载机器人配置。
+
+    Raises:
+        ConfigValidationError: 文件不存在、格式错误或 bot_id 重复
+    """
+    path = Path(path)
+    entries: list[tuple[dict[str, Any], str | None]] = []
+    try:
+        if path.is_dir():
+            for file in sorted(path.glob("*.json")):
+                entries.append((json.loads(file.read_text(encoding="utf-8")), file.stem))
+        else:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            items = data.get("bots", []) if isinstance(data, dict) else data
+            entries.extend((item, None) for item in items)
+    except (OSError, ValueError) as exc:
+        raise ConfigValidationError(f"failed to load bots from {path}: {exc}") from exc
+
+    bots: dict[str, BotConfig] = {}
+    for data, default_id in entries:
+        if not isinstance(data, dict):
+            raise ConfigValidationError(f"invalid bot entry in {path}: {data!r}")
+        bot = BotConfig.from_dict(data, default_id)
+        if bot.bot_id in bots:
+            raise ConfigValidationError(f"duplicate bot id: {bot.bot_id}")
+        bots[bot.bot_id] = bot
+    return bots
+
+
+# 进程级注册表：首次访问时按 WECOM_BOTS_PATH 加载
+_bots: dict[str, BotConfig] | None = None
+_bots_lock = threading.Lock()
+
+
+def get_bots() -> dict[str, BotConfig]:
+    """获取全部已注册的机器人（未配置 WECOM_BOTS_PATH 时为空）。"""
+    global _bots
+    if _bots is None:
+        with _bots_lock:
+            if _bots is None:
+                _bots = load_bots(settings.WECOM_BOTS_PATH) if settings.WECOM_BOTS_PATH else {}
+    return _bots
+
+
+def get_bot(bot_id: str) -> BotConfig | None:
+    """按 bot_id 查询机器人配置，未注册时返回 None。"""
+    return get_bots().get(bot_id)
+
+
+def set_bots(bots: dict[str, BotConfig] | None) -> None:
+    """替换注册表（测试使用）；传入 None 时下次访问重新按配置加载。"""
+    global _bots
+    with _bots_lock:
+        _bots = bots
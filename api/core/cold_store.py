@@ -0,0 +1,111 @@
+"""
+已结束流的冷存储
+
+企业微信对同一个流最多会持续刷新约 6 分钟。已结束的流在内存中以原文保留一小段时间（热层）后，
+降级到这里：内容以 zlib 压缩保存，保留更长的 TTL，迟到的刷新仍能拿到完整回答。
+
+- 总容量按压缩后的字节数限制，超出时淘汰最早降级的条目；
+- 条目超过 TTL 后失效（读取时惰性清理，写入时顺带清理已过期的最早条目）。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any
+
+from core.stream_state import StreamStatus
+
+# 每个流只在降级时压缩一次，使用 zlib 默认级别，在压缩率与 CPU 之间折中
+_COMPRESS_LEVEL = 6
+
+
+class ColdStreamStore:
+    """按压缩后字节数限制容量的 TTL 冷存储（线程安全）。"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 360.0) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # { stream_id: (status, compressed_content, error, expires_at) }，按降级先后排序
+        self._entries: OrderedDict[str, tuple[StreamStatus, bytes, str | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # 累计写入的原文与压缩后字节数，用于计算压缩率
+        self._raw_total = 0
+        self._compressed_total = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _pop(self, stream_id: str) -> None:
+        _, compressed, _, _ = self._entries.pop(stream_id)
+        self._bytes -= len(compressed)
+
+    def put(self, stream_id: str, status: StreamStatus, content: str, error: str | None = None) -> None:
+        """压缩并保存已结束流的内容；压缩后仍超过容量上限时不保存。"""
+        raw = content.encode("utf-8")
+        compressed = zlib.compress(raw, _COMPRESS_LEVEL)
+        if len(compressed) > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if stream_id in self._entries:
+                self._pop(stream_id)
+            self._entries[stream_id] = (status, compressed, error, now + self.ttl_seconds)
+            self._bytes += len(compressed)
+            self._raw_total += len(raw)
+            self._compressed_total += len(compressed)
+            # 条目按降级先后排序，TTL 相同，最早的条目即最先过期的条目
+            while self._entries:
+                oldest_id, (_, _, _, expires_at) = next(iter(self._entries.items()))
+                if expires_at > now and self._bytes <= self.max_bytes:
+                    break
+                if expires_at > now:
+                    self.evictions += 1
+                self._pop(oldest_id)
+
+    def get(self, stream_id: str) -> dict[str, Any] | None:
+        """读取并解压流状态，不存在或已过期时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(stream_id)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                self._pop(stream_id)
+                return None
+            self.hits += 1
+        return self._decode(entry)
+
+    @staticmethod
+    def _decode(entry: tuple[StreamStatus, bytes, str | None, float]) -> dict[str, Any]:
+        status, compressed, error, _ = entry
+        state: dict[str, Any] = {"status": status, "content": zlib.decompress(compressed).decode("utf-8")}
+        if error is not None:
+            state["error"] = error
+        return state
+
+    def items(self) -> list[tuple[str, dict[str, Any]]]:
+        """导出全部未过期的条目（停机快照使用）。"""
+        now = time.monotonic()
+        with self._lock:
+            entries = [(stream_id, entry) for stream_id, entry in self._entries.items() if entry[3] > now]
+        return [(stream_id, self._decode(entry)) for stream_id, entry in entries]
+
+    def delete(self, stream_id: str) -> None:
+        with self._lock:
+            if stream_id in self._entries:
+                self._pop(stream_id)
+
+    def stats(self) -> dict[str, Any]:
+        """条目数、压缩后占用字节数、累计压缩率与命中/淘汰次数。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "compression_ratio": self._raw_total / self._compressed_total if self._compressed_total else 0.0,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,91 @@
+"""
+企业微信回调重投去重
+
+企业微信未及时收到回复时会重投同一条消息（msgid 相同）。去重缓存把消息键映射到首次创建的
+stream_id，使重投请求复用原有的流，而不是重新发起一次 LLM 生成。
+
+- `MessageDedupCache`：进程内 LRU + TTL 缓存（单 worker）；
+- `SharedMessageDedup`：委托给共享状态后端的原子 claim（多 worker）。
+两者接口一致：`claim(key, stream_id)` 返回该消息键对应的 stream_id，并统计命中/未命中；
+`release(key, stream_id)` 在流创建失败时撤销登记，重投的消息可以重新尝试。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from core.stream_state import StreamStateBackend
+
+
+class MessageDedupCache:
+    """进程内有界去重缓存：按最近使用淘汰，条目超过 TTL 后失效。"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # { key: (stream_id, expires_at) }，按最近使用排序
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def claim(self, key: str, stream_id: str) -> str:
+        """若 key 已存在且未过期则返回已有 stream_id（命中），否则登记并返回传入的 stream_id。"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            self._entries[key] = (stream_id, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return stream_id
+
+    def release(self, key: str, stream_id: str) -> None:
+        """撤销 key 的登记（仅当其仍映射到 stream_id 时）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stream_id:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
+
+
+class SharedMessageDedup:
+    """基于共享状态后端的去重：跨 worker 原子登记，条目由后端按 TTL 过期。"""
+
+    def __init__(self, backend: StreamStateBackend, ttl_seconds: float = 300.0) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # 命中/未命中为当前进程视角的计数
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, key: str, stream_id: str) -> str:
+        owner = self.backend.claim_message(key, stream_id, self.ttl_seconds)
+        with self._lock:
+            if owner == stream_id:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return owner
+
+    def release(self, key: str, stream_id: str) -> None:
+        self.backend.release_message(key, stream_id)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
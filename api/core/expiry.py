@@ -0,0 +1,125 @@
+"""
+进程级过期调度器
+
+以单个后台线程 + 最小堆替代"每个到期任务一个 threading.Timer 线程"：
+- 每个 key 只保留一个有效截止时间（重复调度时取较晚者）；延后与取消采用惰性删除：
+  只更新 `_deadlines` 并压入新记录，旧记录留在堆中、出堆时跳过，单次操作 O(log n)；
+  过期记录超过有效记录数时整体压缩一次，堆大小始终与 key 数量成正比；
+- 截止时间按 `resolution` 向上取整到时间刻度（类似时间轮的槽位），同一刻度内到期的 key
+  合并为一批，最多延后一个刻度、绝不提前；
+- 到期后按批次回调 `on_expire(keys)`，由调用方一次性批量清理；
+- 通过 `pending_count` 暴露当前待过期数量，便于观测。
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+import time
+from collections.abc import Callable
+
+from utils.logging import get_logger
+
+logger = get_logger()
+
+
+class ExpiryScheduler:
+    """基于最小堆的单线程过期调度器。"""
+
+    def __init__(
+        self,
+        on_expire: Callable[[list[str]], None],
+        resolution: float = 0.5,
+        batch_size: int = 256,
+        name: str = "expiry",
+    ) -> None:
+        """
+        Args:
+            on_expire: 批量过期回调，参数为已到期的 key 列表
+            resolution: 时间刻度（秒），截止时间按该刻度向上取整
+            batch_size: 单次回调的最大 key 数量
+            name: 后台线程名称
+        """
+        self._on_expire = on_expire
+        self._resolution = resolution
+        self._batch_size = batch_size
+        self._name = name
+        # 堆中元素为 (deadline, key)；_deadlines 记录每个 key 当前有效的截止时间，
+        # 与之不一致的堆记录已失效（被延后或取消），出堆时跳过
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def pending_count(self) -> int:
+        """当前待过期的 key 数量。"""
+        with self._cond:
+            return len(self._deadlines)
+
+    def schedule(self, key: str, delay_seconds: float) -> None:
+        """安排 key 在 delay_seconds 秒后过期；已安排的 key 仅会被延后。"""
+        deadline = math.ceil((time.monotonic() + delay_seconds) / self._resolution) * self._resolution
+        with self._cond:
+            current = self._deadlines.get(key)
+            if current is not None and current >= deadline:
+                return
+            self._deadlines[key] = deadline
+            # 延后时旧记录留在堆中（惰性删除），出堆时因截止时间不一致被跳过
+            heapq.heappush(self._heap, (deadline, key))
+            self._maybe_compact()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            elif self._heap[0][1] == key:
+                self._cond.notify()
+
+    def cancel(self, key: str) -> None:
+        """取消 key 的过期安排（未安排时忽略）。"""
+        with self._cond:
+            if self._deadlines.pop(key, None) is not None:
+                self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """失效记录多于有效记录时重建堆（均摊 O(1)），避免频繁延后的 key 让堆无限增长。调用方需持有锁。"""
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(deadline, key) for key, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _is_stale(self, entry: tuple[float, str]) -> bool:
+        deadline, key = entry
+        return self._deadlines.get(key) != deadline
+
+    def _pop_due(self) -> list[str]:
+        """阻塞直到有 key 到期，返回一批到期 key。调用方需持有锁。"""
+        while True:
+            # 丢弃堆顶的失效记录，避免为已延后或取消的 key 提前醒来
+            while self._heap and self._is_stale(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._cond.wait()
+                continue
+            wait_seconds = self._heap[0][0] - time.monotonic()
+            if wait_seconds > 0:
+                self._cond.wait(wait_seconds)
+                continue
+            now = time.monotonic()
+            due: list[str] = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self._batch_size:
+                entry = heapq.heappop(self._heap)
+                if self._is_stale(entry):
+                    continue
+                del self._deadlines[entry[1]]
+                due.append(entry[1])
+            if due:
+                return due
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due = self._pop_due()
+            try:
+                self._on_expire(due)
+            except Exception:
+                logger.exception("%s: 批量过期回调失败 (count=%d)", self._name, len(due))
@@ -1,97 +1,117 @@
 from __future__ import annotations
 
 import asyncio
-import threading
-from collections.abc import AsyncIterator, Iterator
-from queue import Queue
+import weakref
+from collections.abc import AsyncIterator
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from utils.config import settings
 from utils.logging import get_logger
 
 logger = get_logger()
 
+# 共享客户端：{ event_loop: { (api_key, base_url): AsyncOpenAI } }
+# httpx 连接池绑定创建时的事件循环，因此按事件循环缓存；同一事件循环内每组凭据（如每个机器人）一个共享客户端
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], AsyncOpenAI]] = (
+    weakref.WeakKeyDictionary()
+)
 
-def _create_openai_client() -> OpenAI:
+
+def _create_openai_client(api_key: str | None = None, base_url: str | None = None) -> AsyncOpenAI:
     """
-    创建并返回 OpenAI 客户端。
+    创建并返回 AsyncOpenAI 客户端（带 keep-alive 连接池）。
 
-    读取 `settings.OPENAI_API_KEY` 与 `settings.OPENAI_BASE_URL`。
-    若缺少 API Key，将抛出异常，由上层捕获并转换为流状态错误。
+    未传入 api_key / base_url 时读取 `settings.OPENAI_API_KEY` 与 `settings.OPENAI_BASE_URL`，
+    连接池上限与超时来自配置。若缺少 API Key，将抛出异常，由上层捕获并转换为流状态错误。
     """
 
-    if not settings.OPENAI_API_KEY:
+    api_key = api_key or settings.OPENAI_API_KEY
+    base_url = base_url or settings.OPENAI_BASE_URL
+    if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not configured")
 
-    client_kwargs = {"api_key": settings.OPENAI_API_KEY}
-    if settings.OPENAI_BASE_URL:
-        client_kwargs["base_url"] = settings.OPENAI_BASE_URL
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+    )
+
+    client_kwargs = {"api_key": api_key, "http_client": http_client}
+    if base_url:
+        client_kwargs["base_url"] = base_url
+
+    return AsyncOpenAI(**client_kwargs)
+
 
-    return OpenAI(**client_kwargs)
+def get_openai_client(api_key: str | None = None, base_url: str | None = None) -> AsyncOpenAI:
+    """获取当前事件循环中该组凭据共享的 AsyncOpenAI 客户端，首次调用时创建。"""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    key = (api_key or settings.OPENAI_API_KEY or "", base_url or settings.OPENAI_BASE_URL or "")
+    client = clients.get(key)
+    if client is None:
+        client = _create_openai_client(api_key, base_url)
+        clients[key] = client
+    return client
 
 
-def _iter_openai_tokens(prompt: str) -> Iterator[str]:
+async def aclose_openai_clients() -> int:
+    """关闭当前事件循环的共享客户端及其连接池（停机时调用），返回关闭的客户端数量。"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception as exc:  # 单个客户端关闭失败不影响其余连接池释放
+            logger.warning("failed to close OpenAI client: %r", exc)
+    return len(clients)
+
+
+def _extract_content(chunk: object) -> str | None:
+    """兼容 OpenAI 以及同构兼容实现：从 delta.content 中取文本。"""
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return None
+    delta = getattr(choices[0], "delta", None)
+    if not delta:
+        return None
+    return getattr(delta, "content", None)
+
+
+async def openai_stream_iter(
+    prompt: str, model: str | None = None, api_key: str | None = None, base_url: str | None = None
+) -> AsyncIterator[str]:
     """
-    同步迭代器：使用 OpenAI Chat Completions 流式接口，逐个产出内容增量。
+    异步生成器：直接基于 AsyncOpenAI 流式接口逐个产出内容增量。
+
+    - model / api_key / base_url 未传入时使用全局配置（多机器人部署时按机器人传入）；
+    - 复用进程级共享客户端与连接池，无需为每个流新建 TLS 连接；
+    - 不再使用后台线程 + 队列桥接，分片在事件循环内直接产出；
+    - 异常直接向上抛出，以便上层标记 ERROR。
     """
 
-    client = _create_openai_client()
-    model_name = settings.OPENAI_MODEL or "gpt-5-mini"
+    client = get_openai_client(api_key, base_url)
+    model_name = model or settings.OPENAI_MODEL or "gpt-5-mini"
 
     logger.debug("starting OpenAI streaming (model=%s)", model_name)
 
-    stream = client.chat.completions.create(
+    stream = await client.chat.completions.create(
         model=model_name,
         messages=[{"role": "user", "content": prompt}],
         stream=True,
     )
 
-    for chunk in stream:
-        # 兼容 OpenAI 以及同构兼容实现：从 delta.content 中取文本
-        try:
-            choices = getattr(chunk, "choices", None)
-            if not choices:
-                continue
-            first_choice = choices[0]
-            delta = getattr(first_choice, "delta", None)
-            if not delta:
+    # 退出时（含提前中断）关闭响应，连接归还连接池
+    async with stream:
+        async for chunk in stream:
+            try:
+                content = _extract_content(chunk)
+            except Exception as exc:  # 容错：单个分片解析失败时尽量不中断
+                logger.warning("failed to parse streaming chunk: %r; raw=%r", exc, chunk)
                 continue
-            content = getattr(delta, "content", None)
             if content:
                 yield content
-        except Exception as exc:  # 容错：单个分片解析失败时尽量不中断
-            logger.warning("failed to parse streaming chunk: %r; raw=%r", exc, chunk)
-            continue
-
-
-async def openai_stream_iter(prompt: str) -> AsyncIterator[str]:
-    """
-    异步生成器：桥接同步 SDK 流式迭代为异步分片产出。
-
-    - 后台线程负责从 OpenAI SDK 同步拉取分片并写入线程安全队列；
-    - 前台以异步方式从队列读取并逐个 yield。
-    - 如后台遇到异常，会将异常对象入队，前台读到后抛出，以便上层标记 ERROR。
-    """
-
-    queue: Queue[object] = Queue()
-
-    def _producer() -> None:
-        try:
-            for token in _iter_openai_tokens(prompt):
-                queue.put(token)
-        except Exception as exc:  # 传递异常到异步消费者
-            queue.put(exc)
-        finally:
-            queue.put(None)  # sentinel
-
-    thread = threading.Thread(target=_producer, daemon=True)
-    thread.start()
-
-    while True:
-        item = await asyncio.to_thread(queue.get)
-        if item is None:  # type: ignore[comparison-overlap]
-            break
-        if isinstance(item, Exception):
-            raise item
-        yield item  # type: ignore[misc]
@@ -0,0 +1,179 @@
+"""
+多个 OpenAI 兼容端点的对冲（hedged）请求
+
+按顺序配置若干 OpenAI 兼容端点（主端点 + `LLM_FALLBACK_ENDPOINTS`）：
+- 先向主端点发起流式请求；若 `LLM_HEDGE_DELAY_SECONDS` 内仍未收到首个分片，再向下一个端点发起对冲请求，
+  依此类推，直到所有端点都已发起；
+- 某个端点在首个分片前出错时，立即向下一个端点发起请求（不再等待对冲延迟）；
+- 最先产出分片的流胜出，其余请求立即取消（关闭 HTTP 流，不再消耗 token）；全部失败时抛出最后一个错误。
+
+指标：`llm_hedge_wins_total{provider}`（胜出端点）、`llm_time_to_first_token_seconds{provider}`
+（按胜出端点统计的首 token 延迟）与 `llm_hedged_requests_total`（发起的对冲请求数）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import json
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+
+from core.metrics import Counter, Histogram, registry
+from utils.config import ConfigValidationError
+from utils.logging import get_logger
+
+logger = get_logger()
+
+StreamFn = Callable[..., AsyncIterator[str]]
+
+
+@dataclass(frozen=True)
+class LLMEndpoint:
+    """一个 OpenAI 兼容端点；主端点未配置的字段沿用全局 OPENAI_* 配置（备用端点必须显式配置 base_url 与 api_key）。"""
+
+    name: str
+    base_url: str | None = None
+    api_key: str | None = None
+    model: str | None = None
+
+
+@functools.lru_cache(maxsize=8)
+def parse_endpoints(raw: str) -> tuple[LLMEndpoint, ...]:
+    """解析 JSON 格式的端点列表：`[{"name": ..., "base_url": ..., "api_key": ..., "model": ...}, ...]`。
+
+    每个备用端点必须显式配置自己的 api_key：否则请求会沿用全局 `OPENAI_API_KEY`，
+    把主端点的密钥发送到第三方 base_url。
+
+    Raises:
+        ConfigValidationError: JSON 格式错误或条目缺少 base_url / api_key
+    """
+    if not raw.strip():
+        return ()
+    try:
+        items = json.loads(raw)
+    except ValueError as exc:
+        raise ConfigValidationError(f"invalid LLM_FALLBACK_ENDPOINTS: {exc}") from exc
+    if not isinstance(items, list):
+        raise ConfigValidationError("LLM_FALLBACK_ENDPOINTS must be a JSON list")
+    endpoints = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not item.get("base_url"):
+            raise ConfigValidationError(f"LLM_FALLBACK_ENDPOINTS[{index}]: missing base_url")
+        if not item.get("api_key"):
+            raise ConfigValidationError(
+                f"LLM_FALLBACK_ENDPOINTS[{index}]: missing api_key (OPENAI_API_KEY is not sent to fallbacks)"
+            )
+        endpoints.append(
+            LLMEndpoint(
+                name=str(item.get("name") or f"fallback{index}"),
+                base_url=item["base_url"],
+                api_key=item["api_key"],
+                model=item.get("model"),
+            )
+        )
+    return tuple(endpoints)
+
+
+def _wins(provider: str) -> Counter:
+    return registry.counter("llm_hedge_wins", "Streams won by each LLM endpoint", {"provider": provider})
+
+
+def _ttft(provider: str) -> Histogram:
+    return registry.histogram(
+        "llm_time_to_first_token_seconds",
+        "Time to first token of hedged streams by winning endpoint",
+        {"provider": provider},
+    )
+
+
+llm_hedged_requests = registry.counter("llm_hedged_requests", "Hedged requests started on a secondary LLM endpoint")
+
+
+async def _first_chunk(stream: AsyncIterator[str]) -> str | None:
+    """取流的首个分片；流在产出前结束时返回 None。"""
+    async for chunk in stream:
+        return chunk
+    return None
+
+
+async def _discard(task: asyncio.Task, stream: AsyncIterator[str]) -> None:
+    """取消落败（或出错）端点的请求并关闭其流。"""
+    task.cancel()
+    with contextlib.suppress(BaseException):
+        await task
+    with contextlib.suppress(Exception):
+        await stream.aclose()
+
+
+async def hedged_stream_iter(
+    prompt: str,
+    endpoints: list[LLMEndpoint] | tuple[LLMEndpoint, ...],
+    hedge_delay: float,
+    stream_fn: StreamFn | None = None,
+) -> AsyncIterator[str]:
+    """按对冲策略向多个端点请求流式回复，产出最先出分片的端点的完整输出。"""
+    if stream_fn is None:
+        from core.llm.openai_client import openai_stream_iter
+
+        stream_fn = openai_stream_iter
+
+    start = time.perf_counter()
+    # { 首分片 task: (端点, 流) }
+    contenders: dict[asyncio.Task, tuple[LLMEndpoint, AsyncIterator[str]]] = {}
+    remaining = list(endpoints)
+    last_error: BaseException | None = None
+    winner: tuple[LLMEndpoint, AsyncIterator[str]] | None = None
+    first: str | None = None
+
+    def launch() -> None:
+        endpoint = remaining.pop(0)
+        if contenders or last_error is not None:
+            llm_hedged_requests.inc()
+            logger.info("hedging LLM request on %s after %.2fs", endpoint.name, time.perf_counter() - start)
+        stream = stream_fn(prompt, model=endpoint.model, api_key=endpoint.api_key, base_url=endpoint.base_url)
+        contenders[asyncio.ensure_future(_first_chunk(stream))] = (endpoint, stream)
+
+    try:
+        launch()
+        while winner is None:
+            done, _ = await asyncio.wait(
+                contenders, timeout=hedge_delay if remaining else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # 对冲延迟内没有任何端点产出首个分片：向下一个端点发起请求
+                launch()
+                continue
+            for task in done:
+                endpoint, stream = contenders.pop(task)
+                if winner is None and not task.cancelled() and task.exception() is None:
+                    winner, first = (endpoint, stream), task.result()
+                else:
+                    if not task.cancelled() and task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning("LLM endpoint %s failed before first token: %r", endpoint.name, last_error)
+                    await _discard(task, stream)
+            if winner is None and not contenders:
+                if not remaining:
+                    raise last_error or RuntimeError("no LLM endpoint configured")
+                # 出错后立即尝试下一个端点
+                launch()
+    finally:
+        losers = list(contenders.items())
+        contenders.clear()
+        for task, (_, stream) in losers:
+            await _discard(task, stream)
+
+    endpoint, stream = winner
+    _wins(endpoint.name).inc()
+    if first is None:
+        return
+    _ttft(endpoint.name).observe(time.perf_counter() - start)
+    try:
+        yield first
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
@@ -0,0 +1,147 @@
+"""
+合成 LLM 分片来源（容量测试用）
+
+按可配置的分布模拟真实 LLM 的流式输出，无需消耗真实 token：
+- 首 token 延迟、token 间隔：constant / exponential / lognormal 分布，参数为均值；
+- 回答长度：按均值与标准差的正态分布取整（至少 1 个 token）；
+- 故障注入：按概率在流中途抛出异常（error_rate）或卡顿 stall_seconds 秒（stall_rate）。
+
+每个流使用由 seed 与流序号派生的独立随机数生成器：同样的 seed 与同样的开流顺序会得到
+完全相同的延迟、长度与故障序列，便于重复对比。通过 `LLM_PROVIDER=synthetic` 启用。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import random
+import threading
+from collections.abc import AsyncIterator
+
+from utils.config import settings
+
+_WORDS = (
+    "the",
+    "stream",
+    "answer",
+    "model",
+    "token",
+    "latency",
+    "capacity",
+    "request",
+    "企业微信",
+    "回调",
+    "消息",
+    "流式",
+    "生成",
+    "。",
+    "，",
+)
+
+DISTRIBUTIONS = ("constant", "exponential", "lognormal")
+
+
+class SyntheticLLMError(RuntimeError):
+    """合成 LLM 注入的流中途故障"""
+
+    pass
+
+
+class SyntheticLLM:
+    """可复现的合成 LLM：按配置的分布产出 token，并按概率注入故障与卡顿。"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        first_token_delay: float = 0.5,
+        token_interval: float = 0.05,
+        distribution: str = "lognormal",
+        sigma: float = 0.5,
+        answer_tokens_mean: float = 200.0,
+        answer_tokens_stddev: float = 80.0,
+        error_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 10.0,
+    ) -> None:
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"unsupported distribution {distribution!r}, expected one of {DISTRIBUTIONS}")
+        self.seed = seed
+        self.first_token_delay = first_token_delay
+        self.token_interval = token_interval
+        self.distribution = distribution
+        self.sigma = sigma
+        self.answer_tokens_mean = answer_tokens_mean
+        self.answer_tokens_stddev = answer_tokens_stddev
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_settings(cls) -> SyntheticLLM:
+        return cls(
+            seed=settings.SYNTHETIC_SEED,
+            first_token_delay=settings.SYNTHETIC_FIRST_TOKEN_DELAY,
+            token_interval=settings.SYNTHETIC_TOKEN_INTERVAL,
+            distribution=settings.SYNTHETIC_DELAY_DISTRIBUTION,
+            sigma=settings.SYNTHETIC_DELAY_SIGMA,
+            answer_tokens_mean=settings.SYNTHETIC_ANSWER_TOKENS_MEAN,
+            answer_tokens_stddev=settings.SYNTHETIC_ANSWER_TOKENS_STDDEV,
+            error_rate=settings.SYNTHETIC_ERROR_RATE,
+            stall_rate=settings.SYNTHETIC_STALL_RATE,
+            stall_seconds=settings.SYNTHETIC_STALL_SECONDS,
+        )
+
+    def _delay(self, rng: random.Random, mean: float) -> float:
+        """按配置的分布采样一次延迟（均值为 mean 秒）。"""
+        if mean <= 0:
+            return 0.0
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / mean)
+        if self.distribution == "lognormal":
+            # 调整 mu 使分布均值等于 mean
+            return rng.lognormvariate(math.log(mean) - self.sigma**2 / 2, self.sigma)
+        return mean
+
+    def plan(self, rng: random.Random) -> tuple[int, int | None, int | None]:
+        """为一个流采样 (回答 token 数, 故障位置, 卡顿位置)；位置为 None 表示不发生。"""
+        length = max(1, round(rng.gauss(self.answer_tokens_mean, self.answer_tokens_stddev)))
+        fail_at = rng.randrange(length) if rng.random() < self.error_rate else None
+        stall_at = rng.randrange(length) if rng.random() < self.stall_rate else None
+        return length, fail_at, stall_at
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """异步生成器：逐个产出合成 token；注入的故障以 SyntheticLLMError 抛出。"""
+        rng = random.Random(f"{self.seed}:{next(self._sequence)}")  # noqa: S311 - 仅用于模拟负载
+        length, fail_at, stall_at = self.plan(rng)
+
+        await asyncio.sleep(self._delay(rng, self.first_token_delay))
+        for index in range(length):
+            if index:
+                await asyncio.sleep(self._delay(rng, self.token_interval))
+            if index == stall_at:
+                await asyncio.sleep(self.stall_seconds)
+            if index == fail_at:
+                raise SyntheticLLMError(f"synthetic failure after {index} tokens")
+            yield rng.choice(_WORDS) + " "
+
+
+_synthetic: SyntheticLLM | None = None
+_synthetic_lock = threading.Lock()
+
+
+def get_synthetic_llm() -> SyntheticLLM:
+    """获取进程内共享的合成 LLM（首次调用时按配置创建）。"""
+    global _synthetic
+    if _synthetic is None:
+        with _synthetic_lock:
+            if _synthetic is None:
+                _synthetic = SyntheticLLM.from_settings()
+    return _synthetic
+
+
+async def synthetic_stream_iter(prompt: str) -> AsyncIterator[str]:
+    """按配置的合成 LLM 逐个产出 token。"""
+    async for token in get_synthetic_llm().stream(prompt):
+        yield token
@@ -0,0 +1,237 @@
+"""
+进程内指标：固定分桶直方图 + 计数器，输出 Prometheus 文本格式
+
+为了让每次观测足够轻量（目标：单次 observe 低于 2 微秒，单次回调的全部埋点低于 10 微秒），
+- 分桶边界在创建时固定，观测时用 bisect 定位桶，只做一次自增；
+- 累计分布（le 桶）只在渲染时计算；
+- 每个指标（含标签组合）一把锁，互不争用。
+
+测量方法见 `benchmarks/bench_metrics.py`。
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+# 默认耗时分桶（秒）：覆盖微秒级的加解密到数十秒的完整生成
+DEFAULT_LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# 生成速率分桶（token/秒）
+RATE_BUCKETS: tuple[float, ...] = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+# 批次大小分桶（每批合并的 token 数）
+BATCH_SIZE_BUCKETS: tuple[float, ...] = (1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 128.0, 256.0)
+
+
+def _escape_label_value(value: str) -> str:
+    """按 Prometheus 文本格式转义标签值中的反斜杠、双引号与换行。"""
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """固定分桶直方图（线程安全）。"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: dict[str, str] | None = None,
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        # 最后一格为 +Inf 桶
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """记录 with 块的耗时（秒）。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return sum(self._counts)
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def render_samples(self) -> list[str]:
+        counts, total = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), counts, strict=True):
+            cumulative += count
+            labels = _format_labels({**self.labels, "le": _format_value(bound)})
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """单调递增计数器（线程安全）。"""
+
+    def __init__(self, name: str, help_text: str, labels: dict[str, str] | None = None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return self._value
+
+    def render_samples(self) -> list[str]:
+        return [f"{self.name}_total{_format_labels(self.labels)} {_format_value(self.value)}"]
+
+
+class MetricsRegistry:
+    """指标注册表：按 (名称, 标签) 复用指标实例，并支持在渲染时读取的回调型 gauge。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # { name: (type, help_text, { labels_key: metric }) }，保持注册顺序
+        self._families: dict[str, tuple[str, str, dict[tuple, Histogram | Counter]]] = {}
+        # { name: (help_text, fn) }，fn 返回 [(labels, value)]
+        self._gauges: dict[str, tuple[str, Callable[[], list[tuple[dict[str, str], float]]]]] = {}
+
+    def _get(self, kind: str, name: str, help_text: str, labels: dict[str, str] | None, factory):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"metric {name} already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = factory()
+                family[2][key] = metric
+            return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: dict[str, str] | None = None,
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name: str, help_text: str, labels: dict[str, str] | None = None) -> Counter:
+        return self._get("counter", name, help_text, labels, lambda: Counter(name, help_text, labels))
+
+    def gauge_callback(self, name: str, help_text: str, fn: Callable[[], list[tuple[dict[str, str], float]]]) -> None:
+        """注册回调型 gauge：渲染时调用 fn 取当前值（重复注册时覆盖）。"""
+        with self._lock:
+            self._gauges[name] = (help_text, fn)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        with self._lock:
+            families = [
+                (name, kind, help_text, list(metrics.values()))
+                for name, (kind, help_text, metrics) in self._families.items()
+            ]
+            gauges = list(self._gauges.items())
+
+        lines: list[str] = []
+        for name, kind, help_text, metrics in families:
+            exposed = f"{name}_total" if kind == "counter" else name
+            lines.append(f"# HELP {exposed} {help_text}")
+            lines.append(f"# TYPE {exposed} {kind}")
+            for metric in metrics:
+                lines.extend(metric.render_samples())
+        for name, (help_text, fn) in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in fn():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 进程级默认注册表
+registry = MetricsRegistry()
+
+# 回调处理各阶段耗时：decrypt（验签 + 解密）、json_parse、start_stream、encrypt
+_CALLBACK_STAGE = "wecom_callback_stage_seconds"
+_CALLBACK_STAGE_HELP = "Latency of WeCom callback processing stages in seconds"
+
+
+def callback_stage(stage: str) -> Histogram:
+    """获取回调处理某阶段的耗时直方图。"""
+    return registry.histogram(_CALLBACK_STAGE, _CALLBACK_STAGE_HELP, {"stage": stage})
+
+
+stream_ttft = registry.histogram("stream_time_to_first_token_seconds", "Time from stream start to the first token")
+stream_duration = registry.histogram("stream_duration_seconds", "Total duration of stream generation")
+stream_tokens_per_second = registry.histogram(
+    "stream_tokens_per_second", "Token generation rate of finished streams", buckets=RATE_BUCKETS
+)
+
+stream_batch_tokens = registry.histogram(
+    "stream_batch_tokens", "Tokens coalesced into one stream state write", buckets=BATCH_SIZE_BUCKETS
+)
+stream_producer_wait = registry.histogram(
+    "stream_producer_wait_seconds", "Time the LLM reader waited on a full token buffer"
+)
+
+
+def stream_finished(status: str) -> Counter:
+    """按结束状态统计的流数量计数器。"""
+    return registry.counter("stream_finished", "Number of finished streams by final status", {"status": status})
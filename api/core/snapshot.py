@@ -0,0 +1,113 @@
+"""
+流状态快照
+
+停机时把内存中的流状态写入本地文件，重启后加载，使企业微信在重启后的刷新轮询仍能拿到
+重启前已生成的内容。格式为紧凑的二进制：
+
+    magic(6) | saved_at: float64 | zlib(记录...)
+    记录 = id_len: u16 | id | status: u8 | content_len: u32 | content | error_len: u16 | error
+
+字符串均为 UTF-8；error_len 为 0xFFFF 表示没有错误信息。写入时先写临时文件再原子替换。
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import NamedTuple
+
+from core.stream_state import StreamStatus
+
+_MAGIC = b"WSNAP1"
+_HEADER = struct.Struct(">d")
+_STATUSES = list(StreamStatus)
+_NO_ERROR = 0xFFFF
+
+
+class SnapshotRecord(NamedTuple):
+    stream_id: str
+    status: StreamStatus
+    content: str
+    error: str | None
+
+
+def encode_snapshot(records: list[SnapshotRecord], saved_at: float | None = None) -> bytes:
+    parts = []
+    for record in records:
+        stream_id = record.stream_id.encode("utf-8")
+        content = record.content.encode("utf-8")
+        parts.append(struct.pack(">H", len(stream_id)))
+        parts.append(stream_id)
+        parts.append(struct.pack(">BI", _STATUSES.index(record.status), len(content)))
+        parts.append(content)
+        if record.error is None:
+            parts.append(struct.pack(">H", _NO_ERROR))
+        else:
+            # 错误信息仅用于排查，过长时截断
+            error = record.error.encode("utf-8")[: _NO_ERROR - 1]
+            parts.append(struct.pack(">H", len(error)))
+            parts.append(error)
+    body = zlib.compress(b"".join(parts))
+    return _MAGIC + _HEADER.pack(time.time() if saved_at is None else saved_at) + body
+
+
+def decode_snapshot(data: bytes) -> tuple[float, list[SnapshotRecord]]:
+    """解析快照，返回 (保存时间, 记录列表)。
+
+    Raises:
+        ValueError: 不是快照文件或内容损坏
+    """
+    if not data.startswith(_MAGIC):
+        raise ValueError("not a stream snapshot")
+    offset = len(_MAGIC)
+    (saved_at,) = _HEADER.unpack_from(data, offset)
+    try:
+        body = zlib.decompress(data[offset + _HEADER.size :])
+    except zlib.error as exc:
+        raise ValueError(f"corrupted stream snapshot: {exc}") from exc
+
+    records = []
+    pos = 0
+    try:
+        while pos < len(body):
+            (id_len,) = struct.unpack_from(">H", body, pos)
+            pos += 2
+            stream_id = body[pos : pos + id_len].decode("utf-8")
+            pos += id_len
+            status_index, content_len = struct.unpack_from(">BI", body, pos)
+            pos += 5
+            content = body[pos : pos + content_len].decode("utf-8")
+            pos += content_len
+            (error_len,) = struct.unpack_from(">H", body, pos)
+            pos += 2
+            error = None
+            if error_len != _NO_ERROR:
+                error = body[pos : pos + error_len].decode("utf-8", errors="replace")
+                pos += error_len
+            records.append(SnapshotRecord(stream_id, _STATUSES[status_index], content, error))
+    except (struct.error, IndexError, UnicodeDecodeError) as exc:
+        raise ValueError(f"corrupted stream snapshot: {exc}") from exc
+    return saved_at, records
+
+
+def write_snapshot(path: str | Path, records: list[SnapshotRecord]) -> None:
+    """原子地写入快照文件。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(encode_snapshot(records))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str | Path, max_age_seconds: float) -> list[SnapshotRecord]:
+    """读取快照文件；文件不存在、已损坏或早于 max_age_seconds 时返回空列表。"""
+    try:
+        saved_at, records = decode_snapshot(Path(path).read_bytes())
+    except (OSError, ValueError):
+        return []
+    if time.time() - saved_at > max_age_seconds:
+        return []
+    return records
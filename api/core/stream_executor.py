@@ -0,0 +1,155 @@
+"""
+流任务执行器
+
+进程内所有流 worker 都运行在同一个事件循环上，由执行器持有强引用：
+- 应用启动时通过 `attach` 注册应用自身的事件循环，请求处理中开启的流直接在该循环上 create_task；
+- 未注册（脚本、同步调用方、测试）时，首次提交时启动一个常驻的后台事件循环线程，
+  不再为每个流创建线程并 asyncio.run 一个新的事件循环；
+- 每个任务以 key（stream_id）登记，可计数、按 key 或全部取消，并通过 `concurrent.futures.Future`
+  在任意线程/事件循环中等待其结束（异步侧用 `asyncio.wrap_future`）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from collections.abc import Coroutine
+from typing import Any
+
+
+class StreamExecutor:
+    """进程级流任务执行器（线程安全）。"""
+
+    def __init__(self, name: str = "stream-executor") -> None:
+        self.name = name
+        # (事件循环, 运行该循环的线程 ID)：应用注册的循环优先，否则使用后台线程中的常驻循环
+        self._attached: tuple[asyncio.AbstractEventLoop, int] | None = None
+        self._background: tuple[asyncio.AbstractEventLoop, int] | None = None
+        self._thread: threading.Thread | None = None
+        # { key: (完成通知, 运行中的 task；尚未在事件循环中创建时为 None) }
+        self._entries: dict[str, tuple[concurrent.futures.Future, asyncio.Task | None]] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """注册应用的事件循环（需在该循环内调用），之后提交的任务都在其上运行。"""
+        with self._lock:
+            self._attached = (loop, threading.get_ident())
+
+    def detach(self) -> None:
+        """取消注册的应用事件循环；之后提交的任务回退到后台事件循环线程。"""
+        with self._lock:
+            self._attached = None
+
+    def _ensure_loop(self) -> tuple[asyncio.AbstractEventLoop, int]:
+        with self._lock:
+            if self._attached is not None and not self._attached[0].is_closed():
+                return self._attached
+            if self._background is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                self._background = (loop, self._thread.ident)
+            return self._background
+
+    def submit(self, key: str, coro: Coroutine[Any, Any, Any]) -> concurrent.futures.Future:
+        """在执行器的事件循环上运行 coro，返回在其结束时完成的 Future（可跨线程等待）。"""
+        loop, thread_id = self._ensure_loop()
+        done: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            self._entries[key] = (done, None)
+            self.submitted += 1
+        if threading.get_ident() == thread_id:
+            # 已在执行器的事件循环线程内（如应用的请求处理中）：直接创建任务
+            self._spawn(loop, key, coro, done)
+        else:
+            loop.call_soon_threadsafe(self._spawn, loop, key, coro, done)
+        return done
+
+    def _spawn(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        key: str,
+        coro: Coroutine[Any, Any, Any],
+        done: concurrent.futures.Future,
+    ) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not done:
+                # 创建前已被取消
+                coro.close()
+                if not done.done():
+                    done.cancel()
+                return
+            task = loop.create_task(coro, name=f"{self.name}:{key}")
+            self._entries[key] = (done, task)
+        task.add_done_callback(lambda t: self._finish(key, done, t))
+
+    def _finish(self, key: str, done: concurrent.futures.Future, task: asyncio.Task) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is done:
+                del self._entries[key]
+        if done.done():
+            return
+        if task.cancelled():
+            done.cancel()
+        elif task.exception() is not None:
+            done.set_exception(task.exception())
+        else:
+            done.set_result(task.result())
+
+    @property
+    def active_count(self) -> int:
+        """已提交且尚未结束的任务数量。"""
+        with self._lock:
+            return len(self._entries)
+
+    def cancel(self, key: str) -> bool:
+        """取消指定任务，返回其是否仍在运行。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            done, task = entry
+            if task is None:
+                # 尚未开始运行：由 _spawn 放弃创建
+                del self._entries[key]
+                loop = None
+            else:
+                loop = task.get_loop()
+        if loop is None:
+            done.cancel()
+        else:
+            loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def cancel_all(self) -> int:
+        """取消全部任务，返回被取消的数量。"""
+        with self._lock:
+            keys = list(self._entries)
+        return sum(self.cancel(key) for key in keys)
+
+    async def wait(self, timeout: float | None = None) -> int:
+        """等待当前全部任务结束（可在任意事件循环中调用），返回超时后仍在运行的数量。"""
+        with self._lock:
+            futures = [done for done, _ in self._entries.values()]
+        if not futures:
+            return 0
+        _, pending = await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=timeout)
+        return len(pending)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """取消全部任务并停止后台事件循环线程（注册的应用事件循环由应用自行关闭）。"""
+        self.cancel_all()
+        with self._lock:
+            background, self._background = self._background, None
+            thread, self._thread = self._thread, None
+        if background is None or thread is None:
+            return
+        loop = background[0]
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
@@ -1,111 +1,558 @@
 """
-流式会话管理（内存版，模拟流式产出）
-
-- 单进程内存字典承载共享状态：
-  state = { stream_id: {"status": "running|done|stopping|error:...", "content": str} }
-- 优先在现有事件循环中使用 asyncio.create_task 启动 worker；
-  若当前上下文无运行中的事件循环，则回退到后台线程内以 asyncio.run 执行。
+流式会话管理
+
+- 流状态由可插拔后端承载（见 `core.stream_state`，默认单进程内存字典）：
+  state = { stream_id: {"status": StreamStatus, "content": str, "error"?: str} }
+  选用 sqlite/redis 后端时，状态可被多个 worker 进程共享；
+- worker 统一交给进程级 `StreamExecutor`（见 `core.stream_executor`）：应用启动时注册的事件循环，
+  或未注册时的常驻后台事件循环线程；执行器持有全部 worker 的强引用，可计数、等待与取消；
+- 刷新轮询可通过 `wait_for_stream_update` 挂起等待（long-poll），直到出现新内容、流结束或超时；
+- 平滑重启：停机时 `drain_streams` 停止接收新流并等待进行中的 worker 结束，`snapshot_streams`
+  把内存后端中剩余的流状态写入快照文件，启动时 `restore_streams` 加载，重启后的刷新轮询仍能取到内容。
 """
 
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
+import os
 import threading
 import time
 import uuid
-from collections.abc import AsyncIterator
-from enum import Enum
-from typing import Any
-
-from core.llm.openai_client import openai_stream_iter
+from collections.abc import AsyncIterator, Callable
+
+from core.admission import ConcurrencyGovernor
+from core.answer_cache import AnswerCache
+from core.bots import BotConfig
+from core.cold_store import ColdStreamStore
+from core.dedup import MessageDedupCache, SharedMessageDedup
+from core.expiry import ExpiryScheduler
+from core.llm.synthetic import synthetic_stream_iter
+from core.metrics import registry, stream_duration, stream_finished, stream_tokens_per_second, stream_ttft
+from core.snapshot import SnapshotRecord, read_snapshot, write_snapshot
+from core.stream_executor import StreamExecutor
+from core.stream_state import (
+    MemoryStreamStateBackend,
+    StreamCapacityError,
+    StreamStateBackend,
+    StreamStatus,
+    create_stream_state_backend,
+)
+from core.token_batcher import batch_tokens
 from utils.config import settings
 from utils.logging import get_logger
 
 logger = get_logger()
 
 
-class StreamStatus(Enum):
-    RUNNING = "running"
-    DONE = "done"
-    STOPPING = "stopping"
-    ERROR = "error"
-    MISSING = "missing"
+# 共享状态后端：{ stream_id: {"status": StreamStatus, "content": str, "error"?: str} }
+_backend: StreamStateBackend = create_stream_state_backend(
+    settings.STREAM_STATE_BACKEND,
+    sqlite_path=settings.STREAM_STATE_SQLITE_PATH,
+    redis_url=settings.STREAM_STATE_REDIS_URL,
+    max_streams=settings.STREAM_MAX_STREAMS,
+    max_bytes=settings.STREAM_MAX_BYTES,
+)
+# 回调重投去重：共享后端下跨 worker 去重，否则使用进程内 LRU
+_dedup: MessageDedupCache | SharedMessageDedup = (
+    SharedMessageDedup(_backend, ttl_seconds=settings.MSG_DEDUP_TTL_SECONDS)
+    if _backend.shared
+    else MessageDedupCache(max_entries=settings.MSG_DEDUP_MAX_ENTRIES, ttl_seconds=settings.MSG_DEDUP_TTL_SECONDS)
+)
+# 重复提问回答缓存（ANSWER_CACHE_ENABLED 开启时生效）
+_answer_cache = AnswerCache(max_bytes=settings.ANSWER_CACHE_MAX_BYTES, ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS)
+# LLM 并发准入：超出全局/会话/用户上限的流以 QUEUED 状态排队（进程级，默认机器人）
+_governor = ConcurrencyGovernor(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_per_chat=settings.LLM_MAX_CONCURRENCY_PER_CHAT,
+    max_per_user=settings.LLM_MAX_CONCURRENCY_PER_USER,
+    max_queue_seconds=settings.LLM_MAX_QUEUE_SECONDS,
+)
+# 多机器人：每个机器人独立的并发准入 { bot_id: (BotConfig, ConcurrencyGovernor) }，首次使用时创建；
+# 机器人配置被替换后按新配置重建（进行中的流仍在原准入上释放名额）
+_bot_governors: dict[str, tuple[BotConfig, ConcurrencyGovernor]] = {}
+_bot_governors_lock = threading.Lock()
+# 完成后以原文在内存中保留的时间（热层），便于最后一次拉取；之后降级到压缩冷存储
+_RETENTION_SECONDS: float = settings.STREAM_RETENTION_SECONDS
+# 已结束流的压缩冷存储：企业微信最多持续刷新约 6 分钟，迟到的刷新从这里取回完整内容（仅 memory 后端）
+_cold_store = ColdStreamStore(max_bytes=settings.STREAM_COLD_MAX_BYTES, ttl_seconds=settings.STREAM_COLD_TTL_SECONDS)
+# 从快照恢复的流的保留时间：重启后企业微信需要一段时间才会恢复刷新轮询
+_RESTORED_RETENTION_SECONDS: float = 120.0
+# 被重启打断的流在已生成内容后追加的提示
+_INTERRUPTED_NOTICE = "\n\n（服务重启，回答已中断，请重新提问）"
+
+
+class StreamDrainingError(RuntimeError):
+    """服务正在停机排空，不再接收新的流"""
+
+    pass
+
+
+# 停机排空开始后置为 False，start_stream 随即拒绝新流
+_accepting = True
+# 运行全部 worker 的进程级执行器（以 stream_id 为 key）
+stream_executor = StreamExecutor(name="stream-worker")
+
+
+# long-poll：{ stream_id: 等待该流更新的 future 集合 }，worker 每次更新后唤醒
+_update_waiters: dict[str, set[asyncio.Future]] = {}
+# 每个进行中的流最近一次回复给企业微信的内容长度，用于判断刷新是否带来新内容
+_delivered_lengths: dict[str, int] = {}
+# _delivered_lengths 的条目上限：共享后端下其他进程的流不会被本进程的过期调度器清理，超出时丢弃最早的条目
+_MAX_DELIVERED_ENTRIES = 10000
+_waiters_lock = threading.Lock()
+# 共享后端的更新可能来自其他进程、无法直接唤醒，此时以该间隔回退为轮询
+_SHARED_POLL_INTERVAL: float = 0.1
+# 刷新统计（同时在 /api/metrics 输出）：refreshes 刷新回复总数；unchanged 内容未变化的回复
+# （白白消耗一次往返与加密）；held 挂起等待的刷新数；hold_timeouts 等待至截止时间仍无新内容的刷新数
+_refresh_counters = {
+    "refreshes": registry.counter("stream_refreshes", "Stream refresh replies sent to WeCom"),
+    "unchanged": registry.counter("stream_refreshes_unchanged", "Refresh replies that carried no new content"),
+    "held": registry.counter("stream_refreshes_held", "Refreshes held open waiting for new content"),
+    "hold_timeouts": registry.counter(
+        "stream_refresh_hold_timeouts", "Held refreshes that reached the deadline without new content"
+    ),
+}
+# 尚未结束、刷新时值得继续等待的状态
+_IN_PROGRESS = (StreamStatus.QUEUED, StreamStatus.RUNNING)
+
+
+def _expire_streams(stream_ids: list[str]) -> None:
+    """过期调度器回调：已到热层保留期限的 DONE 流降级到冷存储，并从状态后端批量清理。
+
+    只降级 DONE：STOPPING 的流回复 finish=false，若降级会让企业微信在冷存储有效期内一直刷新到部分内容；
+    ERROR / STOPPING 的流清理后按 MISSING 回复 finish=true，轮询随即结束。
+    共享后端的刷新可能落到其他进程，进程内冷存储无法服务，因此只清理不降级。
+    """
+    if not _backend.shared:
+        for stream_id in stream_ids:
+            state = _backend.get(stream_id)
+            if state is not None and state["status"] == StreamStatus.DONE:
+                _cold_store.put(stream_id, state["status"], state["content"], state.get("error"))
+    _backend.delete_many(stream_ids)
+    with _waiters_lock:
+        for stream_id in stream_ids:
+            _delivered_lengths.pop(stream_id, None)
+    logger.debug("stream 状态已批量清理 (count=%d)", len(stream_ids))
 
 
-# 共享状态：{ stream_id: {"status": StreamStatus, "content": str, "error"?: str} }
-_streams_state: dict[str, dict[str, Any]] = {}
-_streams_state_lock = threading.RLock()
-_RETENTION_SECONDS: float = 30.0  # 完成后在内存中保留的时间，便于最后一次拉取
+# 进程级过期调度器：单个后台线程按截止时间批量清理，替代每个流一个 threading.Timer
+_reaper = ExpiryScheduler(_expire_streams, name="stream-reaper")
 
 
 def _schedule_cleanup(stream_id: str, delay_seconds: float = _RETENTION_SECONDS) -> None:
-    """在指定延迟后清理内存中的流状态。
+    """在指定延迟后清理流状态（同一流重复调度只保留一条过期记录）。"""
+    _reaper.schedule(stream_id, delay_seconds)
+
+
+def pending_cleanup_count() -> int:
+    """当前等待过期清理的流数量。"""
+    return _reaper.pending_count
+
+
+def _pending_expirations_gauge() -> list[tuple[dict[str, str], float]]:
+    return [({}, pending_cleanup_count())]
+
+
+registry.gauge_callback(
+    "stream_pending_expirations", "Streams waiting for expiry cleanup by the reaper", _pending_expirations_gauge
+)
+
+
+def set_stream_state_backend(backend: StreamStateBackend) -> StreamStateBackend:
+    """替换当前进程使用的流状态后端（测试与基准使用），返回旧后端。"""
+    global _backend, _dedup
+    previous, _backend = _backend, backend
+    if backend.shared:
+        _dedup = SharedMessageDedup(backend, ttl_seconds=settings.MSG_DEDUP_TTL_SECONDS)
+    else:
+        _dedup = MessageDedupCache(
+            max_entries=settings.MSG_DEDUP_MAX_ENTRIES, ttl_seconds=settings.MSG_DEDUP_TTL_SECONDS
+        )
+    return previous
+
+
+def dedup_stats() -> dict:
+    """回调重投去重的命中/未命中统计。"""
+    return _dedup.stats()
+
+
+def _dedup_gauges() -> list[tuple[dict[str, str], float]]:
+    stats = dedup_stats()
+    return [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]
+
+
+registry.gauge_callback(
+    "msg_dedup_claims", "Callback msgid claims since the dedup store was created (hit = redelivery)", _dedup_gauges
+)
+
+
+def answer_cache_stats() -> dict:
+    """回答缓存统计：条目数、占用字节数、命中率等。"""
+    return _answer_cache.stats()
+
+
+def flush_answer_cache() -> int:
+    """清空回答缓存，返回被清除的条目数。"""
+    return _answer_cache.clear()
 
-    由于 worker 可能运行在独立线程的事件循环中，退出后无法再安全地调度 asyncio 任务，
-    这里统一用 threading.Timer 做延迟删除，确保各场景下都能清理。
-    """
 
-    def _delete() -> None:
-        with _streams_state_lock:
-            if stream_id in _streams_state:
-                _streams_state.pop(stream_id, None)
-                logger.debug("stream 状态已清理 (stream_id=%s)", stream_id)
+def _governor_for(bot: BotConfig | None) -> ConcurrencyGovernor:
+    """获取机器人对应的并发准入（未指定机器人时为进程默认准入）。"""
+    if bot is None:
+        return _governor
+    entry = _bot_governors.get(bot.bot_id)
+    if entry is not None and entry[0] is bot:
+        return entry[1]
+    with _bot_governors_lock:
+        entry = _bot_governors.get(bot.bot_id)
+        if entry is None or entry[0] is not bot:
+            governor = ConcurrencyGovernor(
+                max_concurrency=_first_set(bot.max_concurrency, settings.LLM_MAX_CONCURRENCY),
+                max_per_chat=_first_set(bot.max_per_chat, settings.LLM_MAX_CONCURRENCY_PER_CHAT),
+                max_per_user=_first_set(bot.max_per_user, settings.LLM_MAX_CONCURRENCY_PER_USER),
+                max_queue_seconds=settings.LLM_MAX_QUEUE_SECONDS,
+            )
+            entry = (bot, governor)
+            _bot_governors[bot.bot_id] = entry
+    return entry[1]
 
-    timer = threading.Timer(delay_seconds, _delete)
-    timer.daemon = True
-    timer.start()
 
+def _first_set(value: int | None, default: int) -> int:
+    return default if value is None else value
 
-def start_stream(prompt: str) -> str:
-    """创建一个新的流式会话并在后台开始产出。
 
-    优先使用同事件循环的 create_task；若无运行中的事件循环，回退到后台线程。
+def admission_stats(bot_id: str | None = None) -> dict:
+    """并发准入统计：运行中数量、排队深度、排队等待时间等（bot_id 为空时为默认机器人）。"""
+    if bot_id is None:
+        return _governor.stats()
+    entry = _bot_governors.get(bot_id)
+    return entry[1].stats() if entry is not None else ConcurrencyGovernor().stats()
+
+
+def _admission_gauges() -> list[tuple[dict[str, str], float]]:
+    with _bot_governors_lock:
+        governors = [("", _governor), *((bot_id, entry[1]) for bot_id, entry in _bot_governors.items())]
+    samples = []
+    for bot_id, governor in governors:
+        stats = governor.stats()
+        samples.append(({"bot": bot_id, "kind": "active"}, stats["active"]))
+        samples.append(({"bot": bot_id, "kind": "queued"}, stats["queue_depth"]))
+    return samples
+
+
+registry.gauge_callback("llm_streams", "LLM streams currently generating or waiting for admission", _admission_gauges)
+
+
+def stream_store_stats() -> dict:
+    """内存后端的容量统计（流数量、内容字节数、淘汰与拒绝次数，cold 为冷存储统计）；共享后端返回空字典。"""
+    if not isinstance(_backend, MemoryStreamStateBackend):
+        return {}
+    return {**_backend.stats(), "cold": _cold_store.stats()}
+
+
+def _store_stream_gauges() -> list[tuple[dict[str, str], float]]:
+    stats = stream_store_stats()
+    if not stats:
+        return []
+    live = stats["streams"] - stats["finished"]
+    return [({"state": "live"}, live), ({"state": "finished"}, stats["finished"])]
+
+
+def _store_bytes_gauge() -> list[tuple[dict[str, str], float]]:
+    stats = stream_store_stats()
+    if not stats:
+        return []
+    return [({"tier": "hot"}, stats["bytes"]), ({"tier": "cold"}, stats["cold"]["bytes"])]
+
+
+registry.gauge_callback("stream_store_streams", "Streams held in the in-memory store", _store_stream_gauges)
+registry.gauge_callback(
+    "stream_store_bytes", "Bytes of stream content held in memory (cold tier compressed)", _store_bytes_gauge
+)
+
+
+def _provider(bot: BotConfig | None) -> str:
+    """实际使用的分片来源：openai 未配置 API Key 时退回 mock。"""
+    provider = bot.provider if bot is not None else settings.LLM_PROVIDER
+    if provider == "openai":
+        api_key = (bot.openai_api_key if bot is not None else None) or getattr(settings, "OPENAI_API_KEY", None)
+        return "openai" if api_key else "mock"
+    return provider if provider == "synthetic" else "mock"
+
+
+def _model_name(bot: BotConfig | None = None) -> str:
+    """当前分片来源对应的模型名，作为回答缓存键的一部分（多机器人时带上 bot_id，互不共享）。"""
+    provider = _provider(bot)
+    if provider == "openai":
+        name = (bot.openai_model if bot is not None else None) or settings.OPENAI_MODEL or "gpt-5-mini"
+    else:
+        name = provider
+    return f"{bot.bot_id}/{name}" if bot is not None else name
+
+
+def _stream_iter_fn(bot: BotConfig | None = None) -> Callable[[str], AsyncIterator[str]]:
+    """按 LLM_PROVIDER（或机器人自身的 llm_provider）选择分片来源；openai 未配置 API Key 时退回模拟流。"""
+    provider = _provider(bot)
+    if provider == "openai":
+        # openai SDK 导入较慢，仅在首次使用时导入
+        from core.llm.openai_client import openai_stream_iter
+
+        logger.debug("stream worker: using OpenAI streaming")
+        if settings.LLM_FALLBACK_ENDPOINTS:
+            # 配置了备用端点：主端点首 token 过慢或出错时对冲到下一个端点
+            from core.llm.providers import LLMEndpoint, hedged_stream_iter, parse_endpoints
+
+            primary = (
+                LLMEndpoint("primary")
+                if bot is None
+                else LLMEndpoint(bot.bot_id, bot.openai_base_url, bot.openai_api_key, bot.openai_model)
+            )
+            return functools.partial(
+                hedged_stream_iter,
+                endpoints=(primary, *parse_endpoints(settings.LLM_FALLBACK_ENDPOINTS)),
+                hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+            )
+        if bot is None:
+            return openai_stream_iter
+        return functools.partial(
+            openai_stream_iter, model=bot.openai_model, api_key=bot.openai_api_key, base_url=bot.openai_base_url
+        )
+    if provider == "synthetic":
+        return synthetic_stream_iter
+    return _mock_stream_iter
+
+
+def stream_owner(stream_id: str) -> str | None:
+    """流所属的机器人 bot_id（默认机器人创建的流返回 None）。"""
+    bot_id, sep, _ = stream_id.partition(".")
+    return bot_id if sep else None
+
+
+def start_stream(
+    prompt: str,
+    dedup_key: str | None = None,
+    chat_id: str | None = None,
+    user_id: str | None = None,
+    bot: BotConfig | None = None,
+) -> str:
+    """创建一个新的流式会话，并交给流任务执行器在后台开始产出（可在同步或异步上下文中调用）。
 
     Args:
         prompt: 用于驱动模拟流的提示词（在模拟阶段仅用于回显）
+        dedup_key: 去重键（如 aibotid + msgid）；同一键在 TTL 内重复调用时直接返回已有 stream_id
+        chat_id: 会话 ID（群聊），用于单会话并发上限
+        user_id: 用户 ID，用于单用户并发上限
+        bot: 所属机器人；stream_id 以 "{bot_id}." 为前缀，并使用机器人自己的 LLM 配置与并发上限
 
     Returns:
-        生成的 stream_id
-    """
-    stream_id = uuid.uuid4().hex
-    with _streams_state_lock:
-        _streams_state[stream_id] = {"status": StreamStatus.RUNNING, "content": ""}
+        生成的 stream_id（去重命中时为已有 stream_id）
 
+    Raises:
+        StreamDrainingError: 服务正在停机排空
+        StreamCapacityError: 流状态存储已满（淘汰已结束的流后仍超出容量上限）
+    """
+    if not _accepting:
+        raise StreamDrainingError("server is draining, not accepting new streams")
+    stream_id = f"{bot.bot_id}.{uuid.uuid4().hex}" if bot is not None else uuid.uuid4().hex
+    if dedup_key:
+        owner = _dedup.claim(dedup_key, stream_id)
+        if owner != stream_id:
+            logger.info("重投消息复用已有流 (dedup_key=%s, stream_id=%s)", dedup_key, owner)
+            return owner
     try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        # 当前上下文没有运行中的事件循环：回退到线程 + asyncio.run
-        logger.warning("没有检测到运行中的事件循环，回退到后台线程执行流式任务 (stream_id: %s)", stream_id)
-        thread = threading.Thread(
-            target=lambda: asyncio.run(_worker(stream_id=stream_id, prompt=prompt)),
-            daemon=True,
-        )
-        thread.start()
-    else:
-        # 在已有事件循环中，直接调度后台任务
-        loop.create_task(_worker(stream_id=stream_id, prompt=prompt))
-
+        _backend.create(stream_id)
+    except BaseException as exc:
+        # 撤销去重登记：否则重投的同一消息会一直拿到这个从未创建的 stream_id（MISSING），而不是重新尝试
+        if dedup_key:
+            _dedup.release(dedup_key, stream_id)
+        if isinstance(exc, StreamCapacityError):
+            stream_finished("rejected").inc()
+            logger.warning("流状态存储已满，拒绝新流 (stream_id=%s)", stream_id)
+        raise
+
+    # 回答缓存命中：直接以 DONE 状态回放，不再启动 worker
+    if settings.ANSWER_CACHE_ENABLED:
+        cached = _answer_cache.get(prompt, _model_name(bot))
+        if cached is not None:
+            _backend.append(stream_id, cached)
+            _backend.set_status(stream_id, StreamStatus.DONE, expected=StreamStatus.RUNNING)
+            _schedule_cleanup(stream_id)
+            return stream_id
+
+    stream_executor.submit(stream_id, _worker(stream_id, prompt, chat_id=chat_id, user_id=user_id, bot=bot))
     return stream_id
 
 
 def get_stream_state(stream_id: str) -> dict:
     """查询指定流的当前状态（对外直接返回枚举）。"""
-    with _streams_state_lock:
-        state = _streams_state.get(stream_id)
-        if state is None:
-            return {"status": StreamStatus.MISSING, "content": ""}
+    state = _backend.get(stream_id)
+    if state is None and not _backend.shared:
+        state = _cold_store.get(stream_id)
+    if state is None:
+        return {"status": StreamStatus.MISSING, "content": ""}
 
-        result = {"status": state.get("status", StreamStatus.MISSING), "content": state.get("content", "")}
-        if result["status"] == StreamStatus.ERROR and "error" in state:
-            result["error"] = state["error"]
-        return result
+    result = {"status": state.get("status", StreamStatus.MISSING), "content": state.get("content", "")}
+    if result["status"] == StreamStatus.ERROR and "error" in state:
+        result["error"] = state["error"]
+    return result
 
 
 def stop_stream(stream_id: str) -> None:
-    """请求停止指定流的产出。"""
-    with _streams_state_lock:
-        if stream_id in _streams_state:
-            _streams_state[stream_id]["status"] = StreamStatus.STOPPING
+    """停止指定流的产出。
+
+    除标记 STOPPING 外，若 worker 运行在本进程，立即取消它：取消沿分片生成器传递，
+    上游 LLM 的 HTTP 流随之关闭，不再继续消耗 token 与连接。worker 在其他进程时
+    （共享后端），由其在下一个分片到达时看到 STOPPING 后退出。
+    """
+    _backend.set_status(stream_id, StreamStatus.STOPPING)
+    _notify_stream_update(stream_id)
+    stream_executor.cancel(stream_id)
+
+
+def _resolve_waiter(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _notify_stream_update(stream_id: str) -> None:
+    """唤醒等待该流更新的 long-poll 请求（可跨线程/事件循环调用）。"""
+    with _waiters_lock:
+        futures = _update_waiters.pop(stream_id, None)
+    for future in futures or ():
+        future.get_loop().call_soon_threadsafe(_resolve_waiter, future)
+
+
+def _record_refresh(stream_id: str, state: dict) -> None:
+    _refresh_counters["refreshes"].inc()
+    with _waiters_lock:
+        if state["status"] not in _IN_PROGRESS:
+            # 已结束、已降级或不存在的流之后不再比较内容长度；不登记，避免迟到或伪造的刷新留下无人清理的条目
+            _delivered_lengths.pop(stream_id, None)
+            return
+        delivered = _delivered_lengths.pop(stream_id, 0)
+        if len(state["content"]) <= delivered:
+            _refresh_counters["unchanged"].inc()
+        # 重新插入到末尾：超出上限时淘汰的是最久未刷新的流
+        _delivered_lengths[stream_id] = len(state["content"])
+        if len(_delivered_lengths) > _MAX_DELIVERED_ENTRIES:
+            del _delivered_lengths[next(iter(_delivered_lengths))]
+
+
+def poll_stream_update(stream_id: str) -> dict:
+    """立即返回流的当前状态，并记录本次刷新回复（非挂起模式）。"""
+    state = get_stream_state(stream_id)
+    _record_refresh(stream_id, state)
+    return state
+
+
+async def wait_for_stream_update(stream_id: str, timeout: float) -> dict:
+    """挂起等待流出现新内容（相对上一次刷新回复）、结束或超时，返回当时的流状态。
+
+    Args:
+        stream_id: 流 ID
+        timeout: 最长等待秒数，需远小于企业微信回调的超时时间
+
+    Returns:
+        与 `get_stream_state` 相同结构的状态字典
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with _waiters_lock:
+        delivered = _delivered_lengths.get(stream_id, 0)
+    _refresh_counters["held"].inc()
+
+    while True:
+        # 先登记再检查状态，避免检查与等待之间的更新被错过
+        future = loop.create_future()
+        with _waiters_lock:
+            _update_waiters.setdefault(stream_id, set()).add(future)
+        try:
+            state = get_stream_state(stream_id)
+            if state["status"] not in _IN_PROGRESS or len(state["content"]) > delivered:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                _refresh_counters["hold_timeouts"].inc()
+                break
+            wait_seconds = min(remaining, _SHARED_POLL_INTERVAL) if _backend.shared else remaining
+            await asyncio.wait({future}, timeout=wait_seconds)
+        finally:
+            with _waiters_lock:
+                waiters = _update_waiters.get(stream_id)
+                if waiters is not None:
+                    waiters.discard(future)
+                    if not waiters:
+                        _update_waiters.pop(stream_id, None)
+
+    _record_refresh(stream_id, state)
+    return state
+
+
+def refresh_stats() -> dict:
+    """刷新轮询统计：回复总数、未带来新内容的回复数、挂起数与挂起超时数。"""
+    return {name: int(counter.value) for name, counter in _refresh_counters.items()}
+
+
+async def drain_streams(timeout: float) -> int:
+    """停止接收新流，并最多等待 timeout 秒让进行中的 worker 结束。
+
+    Returns:
+        超时后仍在运行的 worker 数量
+    """
+    global _accepting
+    _accepting = False
+    active = stream_executor.active_count
+    if not active:
+        return 0
+    logger.info("停机排空：等待 %d 个进行中的流结束（最长 %.1f 秒）", active, timeout)
+    return await stream_executor.wait(timeout)
+
+
+def resume_streams() -> None:
+    """恢复接收新流（排空后继续服务时使用，如测试）。"""
+    global _accepting
+    _accepting = True
+
+
+def snapshot_streams(path: str) -> int:
+    """把内存后端（含冷存储）中的流状态写入快照文件，返回写入的流数量。
+
+    共享后端（sqlite/redis）的状态本身可跨进程存活，不需要快照，直接返回 0。
+    """
+    if not isinstance(_backend, MemoryStreamStateBackend):
+        return 0
+    records = [
+        SnapshotRecord(stream_id, state["status"], state["content"], state.get("error"))
+        for stream_id, state in (*_cold_store.items(), *_backend.items())
+    ]
+    write_snapshot(path, records)
+    logger.info("已写入流状态快照 (count=%d, path=%s)", len(records), path)
+    return len(records)
+
+
+def restore_streams(path: str, max_age_seconds: float) -> int:
+    """启动时加载快照文件中的流状态，返回恢复的流数量；加载后删除快照，避免再次重启时重复恢复。
+
+    快照中尚未结束的流（排队、生成或停止中）已无 worker 继续产出，以 ERROR 状态恢复，
+    保留已生成的内容并追加中断提示，使企业微信的刷新轮询能正常结束。
+    """
+    if not isinstance(_backend, MemoryStreamStateBackend):
+        return 0
+    records = read_snapshot(path, max_age_seconds)
+    for record in records:
+        status, content, error = record.status, record.content, record.error
+        if status in (*_IN_PROGRESS, StreamStatus.STOPPING):
+            content = (content + _INTERRUPTED_NOTICE).lstrip()
+            status, error = StreamStatus.ERROR, "interrupted by restart"
+        _backend.restore(record.stream_id, status, content, error)
+        _schedule_cleanup(record.stream_id, _RESTORED_RETENTION_SECONDS)
+    with contextlib.suppress(OSError):
+        os.remove(path)
+    if records:
+        logger.info("已从快照恢复流状态 (count=%d)", len(records))
+    return len(records)
 
 
 async def _mock_stream_iter(prompt: str) -> AsyncIterator[str]:
@@ -117,42 +564,101 @@ async def _mock_stream_iter(prompt: str) -> AsyncIterator[str]:
         yield token
 
 
-async def _worker(stream_id: str, prompt: str) -> None:
-    """后台 worker：消费分片并累加到共享状态。"""
+async def _admit(stream_id: str, governor: ConcurrencyGovernor, chat_id: str | None, user_id: str | None) -> bool:
+    """获取 LLM 并发名额；需要排队时将流标记为 QUEUED。
+
+    Returns:
+        是否获得名额并进入 RUNNING（排队期间被停止时返回 False，且不占用名额）
+
+    Raises:
+        AdmissionTimeoutError: 排队超时
+    """
+    if governor.try_acquire(chat_id, user_id):
+        return True
+
+    if _backend.set_status(stream_id, StreamStatus.QUEUED, expected=StreamStatus.RUNNING):
+        _notify_stream_update(stream_id)
+    await governor.acquire(chat_id, user_id)
+    if _backend.set_status(stream_id, StreamStatus.RUNNING, expected=StreamStatus.QUEUED):
+        _notify_stream_update(stream_id)
+        return True
+    # 排队期间被停止或已被清理
+    governor.release(chat_id, user_id)
+    return False
+
+
+async def _worker(
+    stream_id: str,
+    prompt: str,
+    chat_id: str | None = None,
+    user_id: str | None = None,
+    bot: BotConfig | None = None,
+) -> None:
+    """后台 worker：获取并发名额后消费分片并累加到共享状态。"""
+    governor = _governor_for(bot)
     try:
-        # 选择分片来源：若配置了 OPENAI_API_KEY，则优先使用真实 LLM 流；否则退回模拟流
-        iter_fn = _mock_stream_iter
-        if settings.LLM_PROVIDER == "openai" and getattr(settings, "OPENAI_API_KEY", None):
-            iter_fn = openai_stream_iter
-            logger.debug("stream worker: using OpenAI streaming")
-
-        async for chunk in iter_fn(prompt):
-            # 若被请求停止，则提前退出
-            with _streams_state_lock:
-                status = _streams_state.get(stream_id, {}).get("status")
-            if status == StreamStatus.STOPPING:
-                # 标记为停止后安排清理
-                _schedule_cleanup(stream_id)
-                break
-            # 累加分片
-            with _streams_state_lock:
-                if stream_id in _streams_state:
-                    _streams_state[stream_id]["content"] += chunk
-        # 正常结束（未被删除）
-        with _streams_state_lock:
-            if stream_id in _streams_state and _streams_state[stream_id]["status"] == StreamStatus.RUNNING:
-                # 若先前被标记为 stopping，这里不覆盖为 done，保持 stopping 以便上层识别
-                _streams_state[stream_id]["status"] = StreamStatus.DONE
-        # 安排延迟清理，给予外层一段时间做最后一次拉取
+        if not await _admit(stream_id, governor, chat_id, user_id):
+            stream_finished("stopped").inc()
+            _schedule_cleanup(stream_id)
+            return
+        try:
+            await _produce(stream_id, prompt, bot)
+        finally:
+            governor.release(chat_id, user_id)
+    except asyncio.CancelledError:
+        # 被 stop_stream（或停机）取消：分片生成器已在取消传递时关闭上游连接
+        for status in _IN_PROGRESS:
+            _backend.set_status(stream_id, StreamStatus.STOPPING, expected=status)
+        stream_finished("stopped").inc()
+        _notify_stream_update(stream_id)
         _schedule_cleanup(stream_id)
+        raise
     except Exception as exc:  # pragma: no cover - 异常路径难以稳定复现
-        with _streams_state_lock:
-            if stream_id in _streams_state:
-                _streams_state[stream_id]["status"] = StreamStatus.ERROR
-                _streams_state[stream_id]["error"] = repr(exc)
+        stream_finished("error").inc()
+        _backend.set_status(stream_id, StreamStatus.ERROR, error=repr(exc))
+        _notify_stream_update(stream_id)
         _schedule_cleanup(stream_id)
 
 
+async def _produce(stream_id: str, prompt: str, bot: BotConfig | None = None) -> None:
+    """消费 LLM 分片并累加到共享状态，结束后安排清理。"""
+    iter_fn = _stream_iter_fn(bot)
+    start = time.perf_counter()
+    tokens = 0
+    # 分片按时间窗口 / 字符数合并后再写入：每批只加锁（共享后端只往返）一次
+    batches = batch_tokens(
+        iter_fn(prompt),
+        max_chars=settings.STREAM_BATCH_MAX_CHARS,
+        window_seconds=settings.STREAM_BATCH_WINDOW_SECONDS,
+        buffer_size=settings.STREAM_BUFFER_TOKENS,
+    )
+    async with contextlib.aclosing(batches):
+        async for batch in batches:
+            if not tokens:
+                stream_ttft.observe(time.perf_counter() - start)
+            tokens += batch.tokens
+            # 仅在 RUNNING 时累加分片；若被请求停止（可能来自其他 worker 进程），则提前退出
+            status = _backend.append(stream_id, batch.text)
+            if status is None or status == StreamStatus.STOPPING:
+                break
+            _notify_stream_update(stream_id)
+    # 正常结束（未被删除）：若先前被标记为 stopping，这里不覆盖为 done，保持 stopping 以便上层识别
+    finished = _backend.set_status(stream_id, StreamStatus.DONE, expected=StreamStatus.RUNNING)
+    _notify_stream_update(stream_id)
+    duration = time.perf_counter() - start
+    stream_duration.observe(duration)
+    if tokens and duration > 0:
+        stream_tokens_per_second.observe(tokens / duration)
+    stream_finished("done" if finished else "stopped").inc()
+    # 仅缓存完整生成的回答（停止或出错的不缓存）
+    if finished and settings.ANSWER_CACHE_ENABLED:
+        state = _backend.get(stream_id)
+        if state is not None and state["content"]:
+            _answer_cache.put(prompt, _model_name(bot), state["content"])
+    # 安排延迟清理，给予外层一段时间做最后一次拉取
+    _schedule_cleanup(stream_id)
+
+
 # 简单轮询示例（便于本地临时验证）
 if __name__ == "__main__":  # pragma: no cover
     sid = start_stream("示例问题：今天天气如何？")
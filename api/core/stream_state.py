@@ -0,0 +1,525 @@
+"""
+流式会话状态存储后端
+
+- `StreamStateBackend` 定义流状态的最小读写接口，`core.stream_manager` 只依赖该接口；
+- `MemoryStreamStateBackend`：单进程内存字典（默认，单 worker 使用），记录为紧凑的 `StreamSession`，
+  可限制流数量与内容总字节数：超出时先按 LRU 淘汰已结束的流，仍不足时拒绝新流（`StreamCapacityError`）；
+- `SQLiteStreamStateBackend`：SQLite WAL 模式，同机多进程（多 uvicorn worker）共享；
+- `RedisStreamStateBackend`：Redis 协议存储，跨机器/多副本共享。
+
+记录结构统一为 {"status": StreamStatus, "content": str, "error"?: str}，
+内存后端额外附带单调递增的 "version"。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from typing import Any
+
+
+class StreamStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    STOPPING = "stopping"
+    ERROR = "error"
+    MISSING = "missing"
+
+
+# 已结束、可被容量淘汰的状态（STOPPING 后 worker 不再追加内容）
+FINISHED_STATUSES = frozenset({StreamStatus.DONE, StreamStatus.ERROR, StreamStatus.STOPPING})
+
+
+class StreamCapacityError(RuntimeError):
+    """流状态存储已满（淘汰全部已结束的流后仍超出上限），拒绝创建新流"""
+
+    pass
+
+
+class StreamSession:
+    """单个流的内存记录。
+
+    内容以只追加的分片列表保存，避免逐 token 字符串拼接带来的 O(N²) 复制；
+    `version` 在每次追加或状态变更时单调递增，`content` 仅在版本变化后才重新 join 并缓存；
+    `size` 为内容的 UTF-8 字节数，用于容量统计。
+    """
+
+    __slots__ = ("_chunks", "_content", "_content_version", "error", "size", "status", "version")
+
+    def __init__(self) -> None:
+        self.status = StreamStatus.RUNNING
+        self.error: str | None = None
+        self.version = 0
+        self.size = 0
+        self._chunks: list[str] = []
+        self._content = ""
+        self._content_version = 0
+
+    def append(self, chunk: str) -> int:
+        """追加分片，返回其字节数。"""
+        self._chunks.append(chunk)
+        self.version += 1
+        size = len(chunk.encode("utf-8"))
+        self.size += size
+        return size
+
+    def set_status(self, status: StreamStatus, error: str | None = None) -> None:
+        self.status = status
+        if error is not None:
+            self.error = error
+        self.version += 1
+
+    @property
+    def content(self) -> str:
+        if self._content_version != self.version:
+            if len(self._chunks) > 1:
+                # 合并后以单个分片替换列表，后续 join 只需拼接新增分片
+                self._chunks = ["".join(self._chunks)]
+            self._content = self._chunks[0] if self._chunks else ""
+            self._content_version = self.version
+        return self._content
+
+    def to_state(self) -> dict[str, Any]:
+        state: dict[str, Any] = {"status": self.status, "content": self.content, "version": self.version}
+        if self.error is not None:
+            state["error"] = self.error
+        return state
+
+
+class StreamStateBackend(ABC):
+    """流状态存储接口。所有方法需线程安全。"""
+
+    # 状态是否可被多个进程共享
+    shared = False
+
+    @abstractmethod
+    def create(self, stream_id: str) -> None:
+        """创建状态为 RUNNING、内容为空的流记录。"""
+
+    @abstractmethod
+    def get(self, stream_id: str) -> dict[str, Any] | None:
+        """读取流记录，不存在时返回 None。"""
+
+    @abstractmethod
+    def append(self, stream_id: str, chunk: str) -> StreamStatus | None:
+        """仅当流处于 RUNNING 时追加分片，返回追加前的状态（不存在时返回 None）。"""
+
+    @abstractmethod
+    def set_status(
+        self,
+        stream_id: str,
+        status: StreamStatus,
+        error: str | None = None,
+        expected: StreamStatus | None = None,
+    ) -> bool:
+        """更新流状态；给定 expected 时仅在当前状态匹配时更新。返回是否更新。"""
+
+    @abstractmethod
+    def delete(self, stream_id: str) -> None:
+        """删除流记录（不存在时忽略）。"""
+
+    def delete_many(self, stream_ids: list[str]) -> None:
+        """批量删除流记录，供过期调度器一次性清理；子类可覆盖为单次往返实现。"""
+        for stream_id in stream_ids:
+            self.delete(stream_id)
+
+    def claim_message(self, key: str, stream_id: str, ttl_seconds: float) -> str:
+        """原子登记消息键到 stream_id 的映射（仅共享后端实现）。
+
+        Returns:
+            key 已登记且未过期时返回已有 stream_id，否则登记并返回传入的 stream_id
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support shared message dedup")
+
+    def release_message(self, key: str, stream_id: str) -> None:
+        """撤销 claim_message 的登记（仅当 key 仍映射到该 stream_id 时），供流创建失败后回滚。"""
+        raise NotImplementedError(f"{type(self).__name__} does not support shared message dedup")
+
+
+class MemoryStreamStateBackend(StreamStateBackend):
+    """单进程内存字典实现。
+
+    max_streams / max_bytes 限制流数量与内容总字节数（0 表示不限制）。创建新流时若已达上限，
+    按最近最少访问的顺序淘汰已结束的流；全部淘汰后仍超出则抛出 `StreamCapacityError`。
+    进行中的流追加内容时不会被拒绝（总字节数可短暂超出上限），但会先淘汰已结束的流腾出空间。
+    """
+
+    def __init__(self, max_streams: int = 0, max_bytes: int = 0) -> None:
+        self.max_streams = max_streams
+        self.max_bytes = max_bytes
+        # { stream_id: StreamSession }
+        self._streams: dict[str, StreamSession] = {}
+        # 已结束的流，按最近访问排序（最早的在前，优先淘汰）
+        self._finished: OrderedDict[str, None] = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._rejected = 0
+        self._lock = threading.RLock()
+
+    def _over_capacity(self, extra_streams: int = 0) -> bool:
+        return (self.max_streams > 0 and len(self._streams) + extra_streams > self.max_streams) or (
+            self.max_bytes > 0 and self._bytes > self.max_bytes
+        )
+
+    def _evict(self, extra_streams: int = 0) -> None:
+        """淘汰最久未访问的已结束流，直到不再超出上限或没有可淘汰的流（调用方持有锁）。"""
+        while self._finished and self._over_capacity(extra_streams):
+            stream_id, _ = self._finished.popitem(last=False)
+            session = self._streams.pop(stream_id, None)
+            if session is not None:
+                self._bytes -= session.size
+                self._evicted += 1
+
+    def _remove(self, stream_id: str) -> None:
+        session = self._streams.pop(stream_id, None)
+        if session is not None:
+            self._bytes -= session.size
+            self._finished.pop(stream_id, None)
+
+    def _track_status(self, stream_id: str, status: StreamStatus) -> None:
+        if status in FINISHED_STATUSES:
+            self._finished[stream_id] = None
+            self._finished.move_to_end(stream_id)
+        else:
+            self._finished.pop(stream_id, None)
+
+    def create(self, stream_id: str) -> None:
+        with self._lock:
+            self._remove(stream_id)
+            self._evict(extra_streams=1)
+            if self._over_capacity(extra_streams=1):
+                self._rejected += 1
+                raise StreamCapacityError(
+                    f"stream store full ({len(self._streams)} streams, {self._bytes} bytes in use)"
+                )
+            self._streams[stream_id] = StreamSession()
+
+    def get(self, stream_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            session = self._streams.get(stream_id)
+            if session is None:
+                return None
+            if stream_id in self._finished:
+                self._finished.move_to_end(stream_id)
+            return session.to_state()
+
+    def append(self, stream_id: str, chunk: str) -> StreamStatus | None:
+        with self._lock:
+            session = self._streams.get(stream_id)
+            if session is None:
+                return None
+            if session.status == StreamStatus.RUNNING:
+                self._bytes += session.append(chunk)
+                if self.max_bytes > 0 and self._bytes > self.max_bytes:
+                    self._evict()
+            return session.status
+
+    def set_status(
+        self,
+        stream_id: str,
+        status: StreamStatus,
+        error: str | None = None,
+        expected: StreamStatus | None = None,
+    ) -> bool:
+        with self._lock:
+            session = self._streams.get(stream_id)
+            if session is None or (expected is not None and session.status != expected):
+                return False
+            session.set_status(status, error)
+            self._track_status(stream_id, status)
+            return True
+
+    def delete(self, stream_id: str) -> None:
+        with self._lock:
+            self._remove(stream_id)
+
+    def delete_many(self, stream_ids: list[str]) -> None:
+        with self._lock:
+            for stream_id in stream_ids:
+                self._remove(stream_id)
+
+    def items(self) -> list[tuple[str, dict[str, Any]]]:
+        """导出全部流记录（停机快照使用）。"""
+        with self._lock:
+            return [(stream_id, session.to_state()) for stream_id, session in self._streams.items()]
+
+    def restore(self, stream_id: str, status: StreamStatus, content: str, error: str | None = None) -> None:
+        """以给定状态与内容重建流记录（启动时加载快照使用，不受容量上限限制）。"""
+        session = StreamSession()
+        if content:
+            session.append(content)
+        session.set_status(status, error)
+        with self._lock:
+            self._remove(stream_id)
+            self._streams[stream_id] = session
+            self._bytes += session.size
+            self._track_status(stream_id, status)
+
+    def stats(self) -> dict[str, Any]:
+        """容量统计：流数量、其中已结束的数量、内容总字节数、上限，以及累计淘汰与拒绝次数。"""
+        with self._lock:
+            return {
+                "streams": len(self._streams),
+                "finished": len(self._finished),
+                "bytes": self._bytes,
+                "max_streams": self.max_streams,
+                "max_bytes": self.max_bytes,
+                "evicted": self._evicted,
+                "rejected": self._rejected,
+            }
+
+
+class SQLiteStreamStateBackend(StreamStateBackend):
+    """SQLite（WAL 模式）实现：同一数据库文件可被多个进程并发读写。
+
+    每个线程持有独立连接；WAL 模式下读不阻塞写，适合多 worker 高频轮询。
+    内容以只追加的分片行保存在 `stream_chunks` 中（按 rowid 排序），追加只插入一行，
+    不会像 `content = content || ?` 那样每次重写整条记录（流总开销 O(N²)）；读取时按序拼接。
+    """
+
+    shared = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS streams (stream_id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS stream_chunks (stream_id TEXT NOT NULL, chunk TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS stream_chunks_stream_id ON stream_chunks (stream_id)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS msg_dedup ("
+            "key TEXT PRIMARY KEY, stream_id TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS msg_dedup_expires_at ON msg_dedup (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：自动提交，每条语句即一次短事务
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _delete(self, conn: sqlite3.Connection, stream_ids: list[tuple[str]]) -> None:
+        """在调用方开启的事务内删除流记录及其分片。"""
+        conn.executemany("DELETE FROM streams WHERE stream_id = ?", stream_ids)
+        conn.executemany("DELETE FROM stream_chunks WHERE stream_id = ?", stream_ids)
+
+    def create(self, stream_id: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            self._delete(conn, [(stream_id,)])
+            conn.execute(
+                "INSERT INTO streams (stream_id, status) VALUES (?, ?)", (stream_id, StreamStatus.RUNNING.value)
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, stream_id: str) -> dict[str, Any] | None:
+        # 单条语句读取状态与全部分片，保证同一读快照
+        rows = (
+            self._conn()
+            .execute(
+                "SELECT s.status, s.error, c.chunk FROM streams s "
+                "LEFT JOIN stream_chunks c ON c.stream_id = s.stream_id "
+                "WHERE s.stream_id = ? ORDER BY c.rowid",
+                (stream_id,),
+            )
+            .fetchall()
+        )
+        if not rows:
+            return None
+        status, error = rows[0][0], rows[0][1]
+        state: dict[str, Any] = {
+            "status": StreamStatus(status),
+            "content": "".join(row[2] for row in rows if row[2] is not None),
+        }
+        if error is not None:
+            state["error"] = error
+        return state
+
+    def append(self, stream_id: str, chunk: str) -> StreamStatus | None:
+        # 仅当流处于 RUNNING 时插入分片行：检查与插入在同一条语句内完成
+        inserted = (
+            self._conn()
+            .execute(
+                "INSERT INTO stream_chunks (stream_id, chunk) SELECT stream_id, ? FROM streams "
+                "WHERE stream_id = ? AND status = ?",
+                (chunk, stream_id, StreamStatus.RUNNING.value),
+            )
+            .rowcount
+        )
+        if inserted:
+            return StreamStatus.RUNNING
+        rows = self._conn().execute("SELECT status FROM streams WHERE stream_id = ?", (stream_id,)).fetchall()
+        return StreamStatus(rows[0][0]) if rows else None
+
+    def set_status(
+        self,
+        stream_id: str,
+        status: StreamStatus,
+        error: str | None = None,
+        expected: StreamStatus | None = None,
+    ) -> bool:
+        sql = "UPDATE streams SET status = ?, error = COALESCE(?, error) WHERE stream_id = ?"
+        params: tuple[Any, ...] = (status.value, error, stream_id)
+        if expected is not None:
+            sql += " AND status = ?"
+            params += (expected.value,)
+        return self._conn().execute(sql, params).rowcount > 0
+
+    def delete(self, stream_id: str) -> None:
+        self.delete_many([stream_id])
+
+    def delete_many(self, stream_ids: list[str]) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            self._delete(conn, [(stream_id,) for stream_id in stream_ids])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def claim_message(self, key: str, stream_id: str, ttl_seconds: float) -> str:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 顺带清理已过期条目（仅首条消息会走到这里，开销可忽略）
+            conn.execute("DELETE FROM msg_dedup WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR IGNORE INTO msg_dedup (key, stream_id, expires_at) VALUES (?, ?, ?)",
+                (key, stream_id, now + ttl_seconds),
+            )
+            rows = conn.execute("SELECT stream_id FROM msg_dedup WHERE key = ?", (key,)).fetchall()
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return rows[0][0]
+
+    def release_message(self, key: str, stream_id: str) -> None:
+        self._conn().execute("DELETE FROM msg_dedup WHERE key = ? AND stream_id = ?", (key, stream_id))
+
+
+class RedisStreamStateBackend(StreamStateBackend):
+    """Redis 协议实现：状态放在 hash（status/error），内容放在独立字符串键以便 APPEND。
+
+    仅使用 HSET/HGET/HGETALL/APPEND/GET/DEL 与 WATCH/MULTI/EXEC 等基础命令（不依赖 Lua 脚本），
+    兼容各类 Redis 协议实现。追加与状态变更以 WATCH 状态 hash 的乐观事务执行：检查状态之后、
+    写入之前若状态被其他进程改写（如停止请求），事务放弃并重新检查，因此停止后不会再追加内容，
+    DONE 也不会覆盖 STOPPING。
+    """
+
+    shared = True
+
+    def __init__(self, url: str, key_prefix: str = "wecom:stream:") -> None:
+        import redis  # 仅在启用 Redis 后端时才需要该依赖
+
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def _keys(self, stream_id: str) -> tuple[str, str]:
+        base = f"{self.key_prefix}{stream_id}"
+        return f"{base}:meta", f"{base}:content"
+
+    def create(self, stream_id: str) -> None:
+        meta_key, content_key = self._keys(stream_id)
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(meta_key, content_key)
+        pipe.hset(meta_key, "status", StreamStatus.RUNNING.value)
+        pipe.set(content_key, "")
+        pipe.execute()
+
+    def get(self, stream_id: str) -> dict[str, Any] | None:
+        meta_key, content_key = self._keys(stream_id)
+        pipe = self._client.pipeline(transaction=False)
+        pipe.hgetall(meta_key)
+        pipe.get(content_key)
+        meta, content = pipe.execute()
+        if not meta:
+            return None
+        state: dict[str, Any] = {"status": StreamStatus(meta["status"]), "content": content or ""}
+        if "error" in meta:
+            state["error"] = meta["error"]
+        return state
+
+    def append(self, stream_id: str, chunk: str) -> StreamStatus | None:
+        meta_key, content_key = self._keys(stream_id)
+
+        def _append(pipe) -> str | None:
+            raw = pipe.hget(meta_key, "status")
+            pipe.multi()
+            if raw == StreamStatus.RUNNING.value:
+                pipe.append(content_key, chunk)
+            return raw
+
+        raw = self._client.transaction(_append, meta_key, value_from_callable=True)
+        return StreamStatus(raw) if raw is not None else None
+
+    def set_status(
+        self,
+        stream_id: str,
+        status: StreamStatus,
+        error: str | None = None,
+        expected: StreamStatus | None = None,
+    ) -> bool:
+        meta_key, _ = self._keys(stream_id)
+        mapping = {"status": status.value}
+        if error is not None:
+            mapping["error"] = error
+
+        def _set_status(pipe) -> bool:
+            raw = pipe.hget(meta_key, "status")
+            pipe.multi()
+            if raw is None or (expected is not None and raw != expected.value):
+                return False
+            pipe.hset(meta_key, mapping=mapping)
+            return True
+
+        return self._client.transaction(_set_status, meta_key, value_from_callable=True)
+
+    def delete(self, stream_id: str) -> None:
+        self._client.delete(*self._keys(stream_id))
+
+    def delete_many(self, stream_ids: list[str]) -> None:
+        if stream_ids:
+            self._client.delete(*(key for stream_id in stream_ids for key in self._keys(stream_id)))
+
+    def claim_message(self, key: str, stream_id: str, ttl_seconds: float) -> str:
+        dedup_key = f"{self.key_prefix}dedup:{key}"
+        if self._client.set(dedup_key, stream_id, nx=True, px=int(ttl_seconds * 1000)):
+            return stream_id
+        return self._client.get(dedup_key) or stream_id
+
+    def release_message(self, key: str, stream_id: str) -> None:
+        # 先比较再删除为两次往返；key 只会由本次 claim 的调用方释放，期间不会被改写为其他 stream_id
+        dedup_key = f"{self.key_prefix}dedup:{key}"
+        if self._client.get(dedup_key) == stream_id:
+            self._client.delete(dedup_key)
+
+
+def create_stream_state_backend(
+    name: str, sqlite_path: str = "", redis_url: str = "", max_streams: int = 0, max_bytes: int = 0
+) -> StreamStateBackend:
+    """按名称创建状态后端：memory | sqlite | redis（容量上限仅对 memory 生效）。"""
+    if name == "memory":
+        return MemoryStreamStateBackend(max_streams=max_streams, max_bytes=max_bytes)
+    if name == "sqlite":
+        return SQLiteStreamStateBackend(sqlite_path)
+    if name == "redis":
+        return RedisStreamStateBackend(redis_url)
+    raise ValueError(f"unknown stream state backend: {name}")
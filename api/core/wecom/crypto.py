@@ -2,27 +2,151 @@
 企业微信消息加解密封装 - 核心层实现
 
 - 面向"新回调模式"（JSON 体仅包含 encrypt 字段）
-  通过将 JSON 中的密文字段包装为标准 XML 形式，复用 wechatpy 的 decrypt_message 能力
+  直接基于 cryptography 原语实现 SHA1 签名、AES-256-CBC 与 PKCS#7（32 字节块），
+  不再为复用 wechatpy 而构造/解析 XML；密文格式与 wechatpy 逐字节兼容
 - 核心层实现：仅包含加解密算法，不依赖具体Web框架
 """
 
 from __future__ import annotations
 
+import base64
+import hashlib
+import hmac
 import logging
-import xml.etree.ElementTree as ET
+import os
+import struct
+import time
 from typing import Any
 
-from wechatpy.enterprise.crypto import WeChatCrypto
-from wechatpy.exceptions import InvalidSignatureException
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 logger = logging.getLogger(__name__)
 
 
+class InvalidSignatureError(Exception):
+    """回调签名校验失败"""
+
+    pass
+
+
+class InvalidCorpIdError(Exception):
+    """解密出的 receive_id 与配置不一致"""
+
+    pass
+
+
+# 企业微信约定的 PKCS#7 块大小为 32 字节（而非 AES 的 16 字节）
+_PKCS7_BLOCK_SIZE = 32
+_RANDOM_PREFIX_SIZE = 16
+
+
+def _random_prefix() -> bytes:
+    """生成明文头部的 16 字节随机串（接收方解密时直接丢弃）。"""
+    return os.urandom(_RANDOM_PREFIX_SIZE)
+
+
+class WeComAESCodec:
+    """企业微信消息体 AES 编解码器
+
+    明文格式：random(16B) + msg_len(4B, 网络字节序) + msg + receive_id，
+    经 32 字节块 PKCS#7 填充后以 AES-256-CBC（IV 取密钥前 16 字节）加密并 Base64 编码。
+    签名为 sha1(sorted([token, timestamp, nonce, encrypt])) 的十六进制摘要。
+    """
+
+    __slots__ = ("_cipher", "_receive_id", "_token")
+
+    def __init__(self, token: str, encoding_aes_key: str, receive_id: str = "") -> None:
+        key = base64.b64decode(encoding_aes_key + "=")
+        if len(key) != 32:
+            raise ValueError("EncodingAESKey 解码后需为 32 字节")
+        self._token = token.encode("utf-8")
+        self._receive_id = receive_id.encode("utf-8")
+        # Cipher 对象本身无状态，可在并发请求间复用；每次加解密各自创建 encryptor/decryptor
+        self._cipher = Cipher(algorithms.AES(key), modes.CBC(key[:16]))
+
+    def signature(self, timestamp: str, nonce: str, encrypt: str) -> str:
+        """计算回调签名。"""
+        parts = sorted([self._token, timestamp.encode("utf-8"), nonce.encode("utf-8"), encrypt.encode("utf-8")])
+        return hashlib.sha1(b"".join(parts)).hexdigest()
+
+    def check_signature(self, signature: str, timestamp: str, nonce: str, encrypt: str) -> None:
+        """校验回调签名，失败时抛出 InvalidSignatureError。"""
+        if not hmac.compare_digest(self.signature(timestamp, nonce, encrypt), signature or ""):
+            raise InvalidSignatureError()
+
+    def encrypt(self, plain: bytes) -> str:
+        """加密明文字节串，返回 Base64 密文。"""
+        body = b"".join((_random_prefix(), struct.pack(">I", len(plain)), plain, self._receive_id))
+        padding = _PKCS7_BLOCK_SIZE - len(body) % _PKCS7_BLOCK_SIZE
+        body += bytes((padding,)) * padding
+        encryptor = self._cipher.encryptor()
+        return base64.b64encode(encryptor.update(body) + encryptor.finalize()).decode("ascii")
+
+    def decrypt(self, encrypt: str) -> bytes:
+        """解密 Base64 密文，返回消息明文字节串。
+
+        Raises:
+            InvalidCorpIdError: 解密出的 receive_id 与配置不一致
+        """
+        decryptor = self._cipher.decryptor()
+        body = decryptor.update(base64.b64decode(encrypt)) + decryptor.finalize()
+        content = body[_RANDOM_PREFIX_SIZE : -body[-1]]
+        (msg_len,) = struct.unpack(">I", content[:4])
+        if content[4 + msg_len :] != self._receive_id:
+            raise InvalidCorpIdError()
+        return content[4 : 4 + msg_len]
+
+    def media_decryptor(self) -> WeComMediaDecryptor:
+        """创建媒体文件的增量解密器（与消息体共用同一 AESKey）。"""
+        return WeComMediaDecryptor(self._cipher)
+
+    def encrypt_media(self, plain: bytes) -> bytes:
+        """按媒体文件格式加密（仅 PKCS#7 填充，无随机串与长度头），用于测试与本地模拟。"""
+        padding = _PKCS7_BLOCK_SIZE - len(plain) % _PKCS7_BLOCK_SIZE
+        encryptor = self._cipher.encryptor()
+        return encryptor.update(plain + bytes((padding,)) * padding) + encryptor.finalize()
+
+
+class WeComMediaDecryptor:
+    """企业微信媒体文件（图片等）的增量解密器
+
+    媒体文件以回调 EncodingAESKey 做 AES-256-CBC 加密（IV 取密钥前 16 字节），数据经 32 字节块 PKCS#7 填充，
+    不含消息体的随机串与长度头。按下载分片调用 `update`，最后调用 `finalize` 去除填充。
+    """
+
+    __slots__ = ("_decryptor", "_tail")
+
+    def __init__(self, cipher: Cipher) -> None:
+        self._decryptor = cipher.decryptor()
+        # 保留最后一个填充块，直到确认数据结束再去除填充
+        self._tail = b""
+
+    def update(self, chunk: bytes) -> bytes:
+        """解密一段密文，返回可确定不含填充的明文。"""
+        data = self._tail + self._decryptor.update(chunk)
+        keep = len(data) % _PKCS7_BLOCK_SIZE or _PKCS7_BLOCK_SIZE
+        self._tail = data[-keep:]
+        return data[:-keep]
+
+    def finalize(self) -> bytes:
+        """结束解密并去除填充，返回剩余明文。
+
+        Raises:
+            ValueError: 密文长度或填充不合法
+        """
+        data = self._tail + self._decryptor.finalize()
+        self._tail = b""
+        padding = data[-1] if data else 0
+        if not 0 < padding <= min(_PKCS7_BLOCK_SIZE, len(data)) or data[-padding:] != bytes((padding,)) * padding:
+            raise ValueError("invalid media padding")
+        return data[:-padding]
+
+
 class WeComMessageCrypto:
     """企业微信消息加解密器 - 核心层实现
 
-    参考 `WeComURLVerifier` 的初始化方式，封装 wechatpy 的加解密能力。
-    仅先实现：从"新回调 JSON（含 encrypt）"解密出明文 XML。
+    参考 `WeComURLVerifier` 的初始化方式，使用原生 `WeComAESCodec` 完成
+    "新回调 JSON（含 encrypt）"的解密与回包加密。
     """
 
     def __init__(self, token: str, encoding_aes_key: str, corp_id: str | None = None) -> None:
@@ -30,13 +154,13 @@ class WeComMessageCrypto:
         # 企业内部智能机器人场景中，ReceiveId 为空字符串
         self.corp_id = corp_id or ""
         try:
-            self.crypto = WeChatCrypto(self.token, encoding_aes_key, self.corp_id)
+            self.codec = WeComAESCodec(self.token, encoding_aes_key, self.corp_id)
         except Exception:  # pragma: no cover - 初始化失败直接抛出
-            logger.exception("Failed to init WeChatCrypto")
+            logger.exception("Failed to init WeComAESCodec")
             raise
 
     def decrypt_from_json(self, msg_signature: str, timestamp: str, nonce: str, encrypt: str) -> str:
-        """解密"新回调模式"回调密文，返回明文 XML 字符串。
+        """解密"新回调模式"回调密文，返回明文字符串。
 
         Args:
             msg_signature: 回调签名
@@ -45,33 +169,21 @@ class WeComMessageCrypto:
             encrypt: 待解密的密文字符串（来自请求体的 encrypt 字段）
 
         Returns:
-            明文 XML 字符串
+            明文字符串
 
         Raises:
             ValueError: 入参不合法（encrypt 非法）
-            InvalidSignatureException: 签名校验失败
+            InvalidSignatureError: 签名校验失败
             Exception: 其他底层解密异常
         """
         if not isinstance(encrypt, str) or not encrypt:
             raise ValueError("待解密的 encrypt 需为非空字符串")
 
-        # wechatpy 的 decrypt_message 期望传入 XML 格式的密文包体：
-        #   <xml><Encrypt><![CDATA[...]]></Encrypt></xml>
-        encrypted_xml = f"<xml><Encrypt><![CDATA[{encrypt}]]></Encrypt></xml>"
+        # 签名失败时透传 InvalidSignatureError 给上层以便返回 400
+        self.codec.check_signature(msg_signature, timestamp, nonce, encrypt)
+        return self.codec.decrypt(encrypt).decode("utf-8")
 
-        try:
-            plain_xml: str = self.crypto.decrypt_message(
-                msg=encrypted_xml,
-                signature=msg_signature,
-                timestamp=timestamp,
-                nonce=nonce,
-            )
-            return plain_xml
-        except InvalidSignatureException:
-            # 透传给上层以便返回 400
-            raise
-
-    def encrypt_to_json(self, plain_text: str, nonce: str) -> dict[str, Any]:
+    def encrypt_to_json(self, plain_text: str, nonce: str, timestamp: str | None = None) -> dict[str, Any]:
         """将明文字符串加密并按新回调 JSON 协议返回。
 
         注意：本方法仅接受字符串。调用方需在调用前自行将 JSON/dict/bytes 等格式转换为字符串。
@@ -81,42 +193,29 @@ class WeComMessageCrypto:
         Args:
             plain_text: 明文字符串
             nonce: 随机串（建议使用回调 URL 中的 nonce 原样回传）
+            timestamp: 时间戳（可选，默认取当前时间）
 
         Returns:
             JSON 字段字典
 
         Raises:
-            ValueError: 当 wechatpy 返回的加密 XML 结构不完整或入参类型错误时
+            ValueError: 入参类型错误时
             Exception: 其他底层加密异常
         """
         if not isinstance(plain_text, str):
             raise ValueError("待加密明文只支持字符串，调用方需自行转换为字符串")
 
+        ts = timestamp or str(int(time.time()))
         try:
-            # timestamp 留空，由 wechatpy 内部生成
-            encrypted_xml: str = self.crypto.encrypt_message(plain_text, nonce)
+            encrypt_text = self.codec.encrypt(plain_text.encode("utf-8"))
         except Exception:
             logger.exception("Encrypt message failed")
             raise
 
-        try:
-            root = ET.fromstring(encrypted_xml)
-        except Exception:
-            logger.exception("Parse encrypted xml failed")
-            raise
-
-        encrypt_text = root.findtext("Encrypt")
-        msg_sig = root.findtext("MsgSignature")
-        ts = root.findtext("TimeStamp")
-        n = root.findtext("Nonce")
-
-        if not all([encrypt_text, msg_sig, ts, n]):
-            raise ValueError("加密结果缺少必要字段: Encrypt/MsgSignature/TimeStamp/Nonce")
-
         # 与企业微信文档一致，字段名采用 msgsignature/timestamp/nonce
         return {
             "encrypt": encrypt_text,
-            "msgsignature": msg_sig,
-            "timestamp": int(ts) if str(ts).isdigit() else ts,
-            "nonce": n,
+            "msgsignature": self.codec.signature(ts, nonce, encrypt_text),
+            "timestamp": int(ts) if ts.isdigit() else ts,
+            "nonce": nonce,
         }
@@ -0,0 +1,296 @@
+"""
+企业微信图片下载与缓存
+
+图片 / 图文混排消息中的 `image.url` 指向以回调 EncodingAESKey 加密的文件，5 分钟后失效：
+- `ImageDownloader` 使用按事件循环共享的 httpx 连接池流式下载，边下载边增量解密
+  （`WeComMediaDecryptor`）并计算明文 SHA-256，不在内存中拼接整个文件；
+- 解密结果写入 `ImageCache`：以内容哈希为文件名的磁盘缓存，总字节数有上限，按最近最少使用淘汰；
+  同一图片被多次发送（不同 URL）只保存一份。URL 到内容哈希的映射在 URL 有效期内保留，重投的消息不重复下载；
+- 收到消息时 `ImageDownloader.prefetch` 在下载器自己的执行器上后台下载（不计入流 worker，不拖慢停机排空），
+  完成后按 stream_id 登记内容哈希，生成回答时用 `stream_images(stream_id)` 取回消息中的图片。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, NamedTuple
+
+from core.stream_executor import StreamExecutor
+from core.wecom.crypto import WeComAESCodec
+from utils.config import settings
+from utils.logging import get_logger
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = get_logger()
+
+# 图片 URL 的有效期（秒）
+_URL_TTL_SECONDS = 300
+_CHUNK_SIZE = 64 * 1024
+# stream_id 到图片内容哈希映射的条目上限，超出时丢弃最早登记的流
+_MAX_STREAM_ENTRIES = 1024
+
+
+class CachedImage(NamedTuple):
+    """缓存中的图片：明文 SHA-256（十六进制）、文件路径与字节数。"""
+
+    digest: str
+    path: Path
+    size: int
+
+
+class ImageTooLargeError(ValueError):
+    """图片超过允许的下载大小。"""
+
+
+class ImageCache:
+    """按内容哈希寻址的图片磁盘缓存（线程安全），总字节数超过上限时淘汰最久未使用的文件。"""
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # { digest: 字节数 }，按最近使用排序（末尾为最新）
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self) -> None:
+        """首次使用时扫描目录，接管上次运行留下的缓存文件（按修改时间排序）。"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.iterdir():
+            if path.is_file() and len(path.name) == 64 and not path.suffix:
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, digest, size in sorted(files):
+            self._entries[digest] = size
+            self._bytes += size
+        self._evict()
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest
+
+    def get(self, digest: str) -> CachedImage | None:
+        """取缓存的图片并标记为最近使用，不存在时返回 None。"""
+        with self._lock:
+            self._load()
+            size = self._entries.get(digest)
+            if size is None:
+                return None
+            self._entries.move_to_end(digest)
+            self._hits += 1
+        return CachedImage(digest, self.path(digest), size)
+
+    def temp_file(self) -> IO[bytes]:
+        """在缓存目录中创建下载用的临时文件（与最终文件同一文件系统，可原子改名）。"""
+        with self._lock:
+            self._load()
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix=".download-", delete=False)
+
+    def commit(self, temp_path: str | os.PathLike, digest: str, size: int) -> CachedImage:
+        """把下载完成的临时文件以内容哈希登记入缓存；已存在相同内容时丢弃临时文件。"""
+        path = self.path(digest)
+        with self._lock:
+            self._load()
+            if digest in self._entries:
+                os.unlink(temp_path)
+                self._entries.move_to_end(digest)
+            else:
+                os.replace(temp_path, path)
+                self._entries[digest] = size
+                self._bytes += size
+                self._evict(keep=digest)
+        return CachedImage(digest, path, size)
+
+    def _evict(self, keep: str | None = None) -> None:
+        while self.max_bytes > 0 and self._bytes > self.max_bytes and self._entries:
+            digest = next(iter(self._entries))
+            if digest == keep:
+                break
+            size = self._entries.pop(digest)
+            self._bytes -= size
+            self._evictions += 1
+            with contextlib.suppress(FileNotFoundError):
+                self.path(digest).unlink()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "evictions": self._evictions,
+            }
+
+
+class ImageDownloader:
+    """企业微信图片下载器：共享连接池、流式下载与增量解密，结果写入内容寻址缓存。"""
+
+    def __init__(
+        self,
+        cache: ImageCache,
+        max_connections: int = 8,
+        max_bytes: int = 20 * 1024 * 1024,
+        timeout: float = 30.0,
+    ) -> None:
+        self.cache = cache
+        self.max_connections = max_connections
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        # httpx 连接池绑定创建时的事件循环，因此按事件循环缓存客户端
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+            weakref.WeakKeyDictionary()
+        )
+        # { url: (digest, 过期时间) }：URL 有效期内重复下载同一 URL 时直接取缓存
+        self._urls: dict[str, tuple[str, float]] = {}
+        # { stream_id: [digest, ...] }：消息中下载成功的图片，按消息内顺序
+        self._streams: OrderedDict[str, list[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 后台下载使用独立的执行器，不占用流执行器的任务计数
+        self.executor = StreamExecutor(name="image-download")
+        self.downloads = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        # httpx 导入较慢，仅在首次下载时导入
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(self.timeout),
+                follow_redirects=True,
+            )
+            self._clients[loop] = client
+        return client
+
+    def _cached_url(self, url: str) -> CachedImage | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._urls.get(url)
+            if entry is not None and entry[1] <= now:
+                del self._urls[url]
+                entry = None
+        return self.cache.get(entry[0]) if entry is not None else None
+
+    def _remember_url(self, url: str, digest: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._urls) >= 1024:
+                for key in [key for key, (_, expires_at) in self._urls.items() if expires_at <= now]:
+                    del self._urls[key]
+            self._urls[url] = (digest, now + _URL_TTL_SECONDS)
+
+    async def fetch(self, url: str, codec: WeComAESCodec) -> CachedImage:
+        """下载并解密图片，返回缓存条目。
+
+        Raises:
+            httpx.HTTPError: 下载失败（含非 2xx 响应）
+            ImageTooLargeError: 文件超过 max_bytes
+            ValueError: 解密失败（密钥不匹配或数据不完整）
+        """
+        cached = self._cached_url(url)
+        if cached is not None:
+            return cached
+
+        decryptor = codec.media_decryptor()
+        hasher = hashlib.sha256()
+        received = 0
+        size = 0
+        # 文件读写放到线程池，避免磁盘 I/O 阻塞事件循环
+        temp = await asyncio.to_thread(self.cache.temp_file)
+        try:
+            with temp:
+                async with self._client().stream("GET", url) as response:
+                    response.raise_for_status()
+                    length = int(response.headers.get("Content-Length") or 0)
+                    if self.max_bytes > 0 and length > self.max_bytes:
+                        raise ImageTooLargeError(f"image is {length} bytes, limit {self.max_bytes}")
+                    async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                        received += len(chunk)
+                        if self.max_bytes > 0 and received > self.max_bytes:
+                            raise ImageTooLargeError(f"image exceeds {self.max_bytes} bytes")
+                        plain = decryptor.update(chunk)
+                        hasher.update(plain)
+                        await asyncio.to_thread(temp.write, plain)
+                        size += len(plain)
+                plain = decryptor.finalize()
+                hasher.update(plain)
+                await asyncio.to_thread(temp.write, plain)
+                size += len(plain)
+        except BaseException:
+            await asyncio.to_thread(_discard, temp.name)
+            raise
+
+        image = await asyncio.to_thread(self.cache.commit, temp.name, hasher.hexdigest(), size)
+        self._remember_url(url, image.digest)
+        self.downloads += 1
+        logger.debug("image downloaded: digest=%s, size=%d", image.digest, image.size)
+        return image
+
+    def prefetch(self, stream_id: str, urls: Sequence[str], codec: WeComAESCodec) -> None:
+        """在后台下载消息中的图片，完成后登记到 stream_id 下（不阻塞调用方，失败只记录日志）。"""
+        if urls:
+            self.executor.submit(stream_id, self._prefetch(stream_id, list(urls), codec))
+
+    async def _prefetch(self, stream_id: str, urls: list[str], codec: WeComAESCodec) -> None:
+        results = await asyncio.gather(*(self.fetch(url, codec) for url in urls), return_exceptions=True)
+        digests = []
+        for result in results:
+            if isinstance(result, CachedImage):
+                digests.append(result.digest)
+            else:
+                logger.warning("企业微信图片下载失败: %r", result)
+        with self._lock:
+            self._streams[stream_id] = digests
+            self._streams.move_to_end(stream_id)
+            while len(self._streams) > _MAX_STREAM_ENTRIES:
+                self._streams.popitem(last=False)
+
+    def stream_images(self, stream_id: str) -> list[CachedImage]:
+        """该流对应消息中已下载的图片（按消息内顺序，跳过已被缓存淘汰的文件）；尚未下载完成时为空列表。"""
+        with self._lock:
+            digests = list(self._streams.get(stream_id, ()))
+        return [image for digest in digests if (image := self.cache.get(digest)) is not None]
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的连接池。"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def _discard(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+
+
+# 进程级图片缓存与下载器
+image_cache = ImageCache(settings.IMAGE_CACHE_DIR, max_bytes=settings.IMAGE_CACHE_MAX_BYTES)
+image_downloader = ImageDownloader(
+    image_cache,
+    max_connections=settings.IMAGE_DOWNLOAD_MAX_CONNECTIONS,
+    max_bytes=settings.IMAGE_MAX_BYTES,
+    timeout=settings.IMAGE_DOWNLOAD_TIMEOUT_SECONDS,
+)
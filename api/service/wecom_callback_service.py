@@ -4,23 +4,44 @@
 """
 
 import json
+import threading
+import time
 import uuid
 from typing import Any
 
-from wechatpy.exceptions import InvalidSignatureException
-
-from core.stream_manager import StreamStatus, get_stream_state, start_stream
-from core.wecom.crypto import WeComMessageCrypto
-from core.wecom.verify import WeComURLVerifier
+from core.bots import BotConfig, get_bot
+from core.metrics import callback_stage
+from core.stream_manager import (
+    StreamCapacityError,
+    StreamDrainingError,
+    StreamStatus,
+    poll_stream_update,
+    start_stream,
+    stream_owner,
+    wait_for_stream_update,
+)
+from core.wecom.crypto import InvalidSignatureError, WeComMessageCrypto
+from core.wecom.media import image_downloader
+from service.wecom_events import dispatch_event
+from utils import fast_json
 from utils.logging import get_logger
 
 logger = get_logger()
 
+# 不属于当前机器人的流按不存在处理
+_MISSING_STATE = {"status": StreamStatus.MISSING, "content": ""}
+
+# 回调处理各阶段耗时直方图（预先取出，避免每次请求查注册表）
+_DECRYPT_SECONDS = callback_stage("decrypt")
+_JSON_PARSE_SECONDS = callback_stage("json_parse")
+_START_STREAM_SECONDS = callback_stage("start_stream")
+_ENCRYPT_SECONDS = callback_stage("encrypt")
+
 
 class WeComService:
     """企业微信业务服务类"""
 
-    def __init__(self, token: str, encoding_aes_key: str, corp_id: str | None = None):
+    def __init__(self, token: str, encoding_aes_key: str, corp_id: str | None = None, bot: BotConfig | None = None):
         """
         初始化企业微信服务
 
@@ -28,23 +49,34 @@ class WeComService:
             token: 企业微信后台设置的Token
             encoding_aes_key: 企业微信后台设置的EncodingAESKey
             corp_id: 企业微信CorpID
+            bot: 多机器人部署时所属的机器人（决定流的归属、LLM 配置与并发上限），默认机器人为 None
         """
         self.token = token
         self.encoding_aes_key = encoding_aes_key
         self.corp_id = corp_id
+        self.bot = bot
 
-        # 初始化核心组件（直接初始化，保持简单）
-        self.url_verifier = WeComURLVerifier(
-            token=self.token,
-            encoding_aes_key=self.encoding_aes_key,
-            corp_id=self.corp_id,
-        )
+        # URL 验证器基于 wechatpy，仅在后台配置回调地址时用到，首次使用时再创建
+        self._url_verifier = None
         self.message_crypto = WeComMessageCrypto(
             token=self.token,
             encoding_aes_key=self.encoding_aes_key,
             corp_id=self.corp_id,
         )
 
+    @property
+    def url_verifier(self):
+        """URL 验证器（首次访问时导入 wechatpy 并创建）。"""
+        if self._url_verifier is None:
+            from core.wecom.verify import WeComURLVerifier
+
+            self._url_verifier = WeComURLVerifier(
+                token=self.token,
+                encoding_aes_key=self.encoding_aes_key,
+                corp_id=self.corp_id,
+            )
+        return self._url_verifier
+
     def verify_callback_url(self, msg_signature: str, timestamp: str, nonce: str, echostr: str) -> tuple[bool, str]:
         """
         验证企业微信回调URL有效性
@@ -114,6 +146,144 @@ class WeComService:
 
         return True, ""
 
+    def _decrypt_callback(self, msg_signature: str, timestamp: str, nonce: str, encrypt: str) -> dict | None:
+        """解密回调并按 JSON 解析，明文不是 JSON 时返回 None。"""
+        start = time.perf_counter()
+        plain_text = self.message_crypto.decrypt_from_json(
+            msg_signature=msg_signature,
+            timestamp=str(timestamp),
+            nonce=str(nonce),
+            encrypt=encrypt,
+        )
+        parse_start = time.perf_counter()
+        _DECRYPT_SECONDS.observe(parse_start - start)
+
+        # 企业微信新回调在明文中放 JSON
+        logger.debug("wecom_callback_post decrypted plain text: %s", plain_text)
+
+        try:
+            return fast_json.loads(plain_text)
+        except Exception:
+            return None
+        finally:
+            _JSON_PARSE_SECONDS.observe(time.perf_counter() - parse_start)
+
+    @staticmethod
+    def _refresh_stream_id(msg_obj: dict | None) -> str | None:
+        """拉取式刷新：WeCom 会携带 msgtype=stream 且附 stream.id，返回该 id；其他消息返回 None。"""
+        if msg_obj is not None and msg_obj.get("msgtype") == "stream" and isinstance(msg_obj.get("stream"), dict):
+            return msg_obj["stream"].get("id")
+        return None
+
+    def _owns_stream(self, stream_id: str) -> bool:
+        """流是否属于当前机器人：各机器人只能刷新自己创建的流。"""
+        return stream_owner(stream_id) == (self.bot.bot_id if self.bot is not None else None)
+
+    @staticmethod
+    def _build_stream_reply(stream_id: str, state: dict) -> dict[str, Any]:
+        content = state["content"]
+        if state["status"] == StreamStatus.QUEUED and not content:
+            # 并发已满、排队等待生成
+            content = "排队中，请稍候…"
+        return {
+            "msgtype": "stream",
+            "stream": {
+                "id": stream_id,
+                # 当状态为 DONE/ERROR/MISSING 时，认为轮询可以结束
+                "finish": state["status"] in (StreamStatus.DONE, StreamStatus.ERROR, StreamStatus.MISSING),
+                "content": content,
+            },
+        }
+
+    @staticmethod
+    def _image_urls(msg_obj: dict) -> list[str]:
+        """图片 / 图文混排消息中的图片地址。"""
+        msgtype = msg_obj.get("msgtype")
+        if msgtype == "image":
+            images = [msg_obj.get("image")]
+        elif msgtype == "mixed" and isinstance(msg_obj.get("mixed"), dict):
+            items = msg_obj["mixed"].get("msg_item") or []
+            images = [item.get("image") for item in items if isinstance(item, dict) and item.get("msgtype") == "image"]
+        else:
+            return []
+        return [image["url"] for image in images if isinstance(image, dict) and isinstance(image.get("url"), str)]
+
+    def _prefetch_images(self, stream_id: str, msg_obj: dict) -> None:
+        """图片地址 5 分钟内有效：收到消息即在后台下载、解密并写入缓存，不阻塞回调；按 stream_id 取回。"""
+        image_downloader.prefetch(stream_id, self._image_urls(msg_obj), self.message_crypto.codec)
+
+    @staticmethod
+    def _finished_reply(content: str) -> dict[str, Any]:
+        """无需后续轮询、一次性结束的回包。"""
+        return {"msgtype": "stream", "stream": {"id": uuid.uuid4().hex, "finish": True, "content": content}}
+
+    def _build_reply(self, msg_obj: dict | None) -> dict[str, Any] | None:
+        """按消息类型构造明文回复（刷新请求立即返回当前流状态，事件回调同步回复，None 表示回复空包）。"""
+        if msg_obj is None:
+            # 若不是 JSON，回落到一次性结束的简单回包
+            return self._finished_reply("收到")
+
+        sid = self._refresh_stream_id(msg_obj)
+        if sid is not None:
+            state = poll_stream_update(sid) if self._owns_stream(sid) else _MISSING_STATE
+            return self._build_stream_reply(sid, state)
+
+        # 事件回调（进入会话、模板卡片点击等）：按分发表直接回复，不开启 LLM 流
+        handled, reply = dispatch_event(msg_obj)
+        if handled:
+            return reply
+
+        # 首次收到用户消息：创建新的流会话，立即返回首包（finish=false）
+        # 这里以不同消息体类型统一提取一个 prompt（简单起见）
+        msgtype = msg_obj.get("msgtype")
+        prompt = None
+        if msgtype == "text" and isinstance(msg_obj.get("text"), dict):
+            prompt = msg_obj["text"].get("content")
+        elif msgtype == "mixed" and isinstance(msg_obj.get("mixed"), dict):
+            prompt = json.dumps(msg_obj.get("mixed"))
+        elif msgtype == "image" and isinstance(msg_obj.get("image"), dict):
+            prompt = json.dumps(msg_obj.get("image"))
+        if not prompt:
+            # 未能提取到提问内容（不支持的消息类型或空消息），不为空 prompt 开启生成
+            return self._finished_reply("暂不支持该类型的消息")
+
+        # 企业微信未及时收到回复时会以相同 msgid 重投，按 aibotid + msgid 去重，复用原有流
+        msgid = msg_obj.get("msgid")
+        dedup_key = f"{msg_obj.get('aibotid') or ''}:{msgid}" if msgid else None
+        start = time.perf_counter()
+        try:
+            stream_id = start_stream(
+                prompt,
+                dedup_key=dedup_key,
+                chat_id=msg_obj.get("chatid"),
+                user_id=(msg_obj.get("from") or {}).get("userid"),
+                bot=self.bot,
+            )
+        except StreamDrainingError:
+            # 停机排空期间不再开启新流，直接结束并提示用户稍后重试
+            return self._finished_reply("服务正在重启，请稍后重新提问")
+        except StreamCapacityError:
+            # 流状态存储已满，拒绝新流
+            return self._finished_reply("当前请求较多，请稍后重新提问")
+        finally:
+            _START_STREAM_SECONDS.observe(time.perf_counter() - start)
+        self._prefetch_images(stream_id, msg_obj)
+        # 首次响应返回空内容，finish=false，由后续轮询逐步取增量
+        return {
+            "msgtype": "stream",
+            "stream": {"id": stream_id, "finish": False, "content": ""},
+        }
+
+    def _encrypt_reply(self, reply_plain_json: dict[str, Any] | None, nonce: str) -> dict[str, Any] | None:
+        if reply_plain_json is None:
+            # 空包回复：无需加密，控制器直接返回空响应体
+            return None
+        start = time.perf_counter()
+        reply_plain_text = fast_json.dumps(reply_plain_json).decode("utf-8")
+        encrypted = self.message_crypto.encrypt_to_json(plain_text=reply_plain_text, nonce=str(nonce))
+        _ENCRYPT_SECONDS.observe(time.perf_counter() - start)
+        return encrypted
+
     def process_callback_message(
         self, msg_signature: str, timestamp: str, nonce: str, encrypt: str
     ) -> tuple[bool, str, dict[str, Any] | None]:
@@ -127,79 +297,122 @@ class WeComService:
             encrypt: 加密的消息内容
 
         Returns:
-            (处理是否成功, 错误信息或成功标识, 加密的回复消息字典)
+            (处理是否成功, 错误信息或成功标识, 加密的回复消息字典；回复空包时为 None)
         """
         logger.debug("处理企业微信回调消息: msg_signature=%s, timestamp=%s, nonce=%s", msg_signature, timestamp, nonce)
 
         try:
-            # 解密消息
-            plain_text = self.message_crypto.decrypt_from_json(
-                msg_signature=msg_signature,
-                timestamp=str(timestamp),
-                nonce=str(nonce),
-                encrypt=encrypt,
-            )
+            msg_obj = self._decrypt_callback(msg_signature, timestamp, nonce, encrypt)
+            encrypted_resp = self._encrypt_reply(self._build_reply(msg_obj), nonce)
 
-            # 解密出来的消息为明文 XML 字符串，业务上按 JSON 解析（企业微信新回调在明文中放 JSON）
-            logger.debug("wecom_callback_post decrypted plain text: %s", plain_text)
-
-            try:
-                msg_obj = json.loads(plain_text)
-            except Exception:
-                # 若不是 JSON，回落到一次性结束的简单回包
-                stream_id = uuid.uuid4().hex
-                reply_plain_json = {
-                    "msgtype": "stream",
-                    "stream": {"id": stream_id, "finish": True, "content": "收到"},
-                }
-            else:
-                msgtype = msg_obj.get("msgtype")
-                # 处理拉取式刷新：WeCom 会携带 msgtype=stream 且附 stream.id
-                if msgtype == "stream" and isinstance(msg_obj.get("stream"), dict):
-                    sid = msg_obj["stream"].get("id")
-                    state = get_stream_state(sid)
-                    reply_plain_json = {
-                        "msgtype": "stream",
-                        "stream": {
-                            "id": sid,
-                            # 当状态为 DONE/ERROR/MISSING 时，认为轮询可以结束
-                            "finish": state["status"] in (StreamStatus.DONE, StreamStatus.ERROR, StreamStatus.MISSING),
-                            "content": state["content"],
-                        },
-                    }
+            logger.info("企业微信回调消息处理成功")
+            return True, "success", encrypted_resp
+
+        except InvalidSignatureError as e:
+            logger.warning("企业微信回调消息签名验证失败: %s", e)
+            return False, "invalid signature", None
+        except Exception:
+            logger.exception("企业微信回调消息处理异常")
+            return False, "internal error", None
+
+    async def process_callback_message_async(
+        self, msg_signature: str, timestamp: str, nonce: str, encrypt: str, hold_seconds: float = 0.0
+    ) -> tuple[bool, str, dict[str, Any] | None]:
+        """
+        处理企业微信回调消息（POST，异步版本）
+
+        与 `process_callback_message` 一致；当 hold_seconds > 0 时，stream 刷新请求会挂起等待，
+        直到流产生新内容、结束或超过 hold_seconds，避免把客户端已见过的内容再加密回传一次。
+
+        Args:
+            msg_signature: 签名串
+            timestamp: 时间戳
+            nonce: 随机串
+            encrypt: 加密的消息内容
+            hold_seconds: 刷新请求的最长挂起时间（秒），0 表示不挂起
+
+        Returns:
+            (处理是否成功, 错误信息或成功标识, 加密的回复消息字典；回复空包时为 None)
+        """
+        if hold_seconds <= 0:
+            return self.process_callback_message(msg_signature, timestamp, nonce, encrypt)
+
+        logger.debug("处理企业微信回调消息: msg_signature=%s, timestamp=%s, nonce=%s", msg_signature, timestamp, nonce)
+
+        try:
+            msg_obj = self._decrypt_callback(msg_signature, timestamp, nonce, encrypt)
+            sid = self._refresh_stream_id(msg_obj)
+            if sid is not None:
+                if self._owns_stream(sid):
+                    state = await wait_for_stream_update(sid, hold_seconds)
                 else:
-                    # 首次收到用户消息：创建新的流会话，立即返回首包（finish=false）
-                    # 这里以不同消息体类型统一提取一个 prompt（简单起见）
-                    prompt = None
-                    if msgtype == "text" and isinstance(msg_obj.get("text"), dict):
-                        prompt = msg_obj["text"].get("content")
-                    elif msgtype == "mixed" and isinstance(msg_obj.get("mixed"), dict):
-                        prompt = json.dumps(msg_obj.get("mixed"))
-                    elif msgtype == "image" and isinstance(msg_obj.get("image"), dict):
-                        prompt = json.dumps(msg_obj.get("image"))
-                    if not prompt:
-                        prompt = ""
-
-                    stream_id = start_stream(prompt)
-                    # 首次响应返回空内容，finish=false，由后续轮询逐步取增量
-                    reply_plain_json = {
-                        "msgtype": "stream",
-                        "stream": {"id": stream_id, "finish": False, "content": ""},
-                    }
-            reply_plain_text = json.dumps(reply_plain_json, ensure_ascii=False)
-
-            # 加密回复
-            encrypted_resp = self.message_crypto.encrypt_to_json(
-                plain_text=reply_plain_text,
-                nonce=str(nonce),
-            )
+                    state = _MISSING_STATE
+                reply_plain_json = self._build_stream_reply(sid, state)
+            else:
+                reply_plain_json = self._build_reply(msg_obj)
+            encrypted_resp = self._encrypt_reply(reply_plain_json, nonce)
 
             logger.info("企业微信回调消息处理成功")
             return True, "success", encrypted_resp
 
-        except InvalidSignatureException as e:
+        except InvalidSignatureError as e:
             logger.warning("企业微信回调消息签名验证失败: %s", e)
             return False, "invalid signature", None
         except Exception:
             logger.exception("企业微信回调消息处理异常")
             return False, "internal error", None
+
+
+# 进程级 WeComService 注册表：{(token, encoding_aes_key, corp_id): WeComService}
+# WeComService 仅持有只读的加解密上下文，可安全地在并发请求间复用
+_services: dict[tuple[str, str, str], WeComService] = {}
+_services_lock = threading.Lock()
+
+
+def get_wecom_service(token: str, encoding_aes_key: str, corp_id: str | None = None) -> WeComService:
+    """获取进程内共享的 WeComService 实例（按 token/encoding_aes_key/corp_id 缓存）。
+
+    首次调用时构建（解码 EncodingAESKey 并初始化原生 AES 编解码器 `WeComAESCodec`；
+    URL 验证所需的 wechatpy WeChatCrypto 在首次 GET 验证时才创建），之后直接复用，
+    避免每次回调都重新解码 EncodingAESKey 与初始化加解密器。
+
+    Args:
+        token: 企业微信后台设置的Token
+        encoding_aes_key: 企业微信后台设置的EncodingAESKey
+        corp_id: 企业微信CorpID
+
+    Returns:
+        共享的 WeComService 实例
+    """
+    key = (token, encoding_aes_key, corp_id or "")
+    service = _services.get(key)
+    if service is not None:
+        return service
+
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = WeComService(token=token, encoding_aes_key=encoding_aes_key, corp_id=corp_id)
+            _services[key] = service
+        return service
+
+
+# 多机器人注册表对应的 WeComService：{ bot_id: WeComService }
+_bot_services: dict[str, WeComService] = {}
+
+
+def get_bot_service(bot_id: str) -> WeComService | None:
+    """获取指定机器人的共享 WeComService（首次调用时按机器人配置构建），未注册的机器人返回 None。"""
+    bot = get_bot(bot_id)
+    if bot is None:
+        return None
+    service = _bot_services.get(bot_id)
+    if service is not None and service.bot is bot:
+        return service
+
+    with _services_lock:
+        service = _bot_services.get(bot_id)
+        if service is None or service.bot is not bot:
+            service = WeComService(token=bot.token, encoding_aes_key=bot.encoding_aes_key, corp_id=bot.corp_id, bot=bot)
+            _bot_services[bot_id] = service
+        return service
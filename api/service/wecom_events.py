@@ -0,0 +1,83 @@
+"""
+企业微信事件回调分发
+
+`msgtype == "event"` 的回调（进入会话、模板卡片点击、用户反馈等）不是用户提问，不应开启 LLM 流：
+按 (msgtype, eventtype) 查分发表，交给轻量处理函数同步返回预先构造好的回包，不分配流、不排队。
+模板卡片事件只投递一次且超过 5 秒即被丢弃，更需要在回调内直接回复。
+
+处理函数接收解密后的消息对象，返回明文回包（`text` / `template_card` 等），返回 None 表示回复空包。
+部署方可用 `register_event_handler` 注册或替换处理函数，例如按 event_key 更新模板卡片：
+
+    register_event_handler("event", "template_card_event", lambda msg: {
+        "response_type": "update_template_card",
+        "template_card": {...},
+    })
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from core.metrics import Counter, registry
+from utils.config import settings
+from utils.logging import get_logger
+
+logger = get_logger()
+
+EventHandler = Callable[[dict[str, Any]], dict[str, Any] | None]
+
+_EVENT_COUNTER = "wecom_events"
+_EVENT_COUNTER_HELP = "WeCom event callbacks answered without starting a stream"
+
+# { (msgtype, eventtype): (处理函数, 计数器) }；eventtype 为 None 的条目兜底该 msgtype 下未登记的事件
+_handlers: dict[tuple[str, str | None], tuple[EventHandler, Counter]] = {}
+_handlers_lock = threading.Lock()
+
+
+def _event_counter(eventtype: str | None) -> Counter:
+    return registry.counter(_EVENT_COUNTER, _EVENT_COUNTER_HELP, {"eventtype": eventtype or "other"})
+
+
+def register_event_handler(msgtype: str, eventtype: str | None, handler: EventHandler) -> None:
+    """登记（或替换）某类事件的处理函数；eventtype 为 None 时作为该 msgtype 的兜底处理。"""
+    with _handlers_lock:
+        _handlers[(msgtype, eventtype)] = (handler, _event_counter(eventtype))
+
+
+def _eventtype(msg_obj: dict[str, Any]) -> str | None:
+    event = msg_obj.get("event")
+    return event.get("eventtype") if isinstance(event, dict) else None
+
+
+def dispatch_event(msg_obj: dict[str, Any]) -> tuple[bool, dict[str, Any] | None]:
+    """按分发表处理事件回调，返回 (是否已处理, 明文回包或 None)；未登记的消息类型交由流式回复处理。"""
+    msgtype = msg_obj.get("msgtype")
+    if not isinstance(msgtype, str):
+        return False, None
+    eventtype = _eventtype(msg_obj)
+    entry = _handlers.get((msgtype, eventtype)) or _handlers.get((msgtype, None))
+    if entry is None:
+        return False, None
+    handler, counter = entry
+    counter.inc()
+    logger.debug("wecom event dispatched: msgtype=%s, eventtype=%s", msgtype, eventtype)
+    return True, handler(msg_obj)
+
+
+def _text_reply(content: str) -> EventHandler:
+    """回复固定文本的处理函数（回包在登记时构造一次）；content 为空时回复空包。"""
+    reply = {"msgtype": "text", "text": {"content": content}} if content else None
+    return lambda msg_obj: reply
+
+
+def _empty_reply(msg_obj: dict[str, Any]) -> None:
+    return None
+
+
+# 默认分发表：进入会话回复欢迎语；模板卡片点击、用户反馈及其他事件回复空包（卡片保持不变）
+register_event_handler("event", "enter_chat", _text_reply(settings.WECOM_WELCOME_TEXT))
+register_event_handler("event", "template_card_event", _empty_reply)
+register_event_handler("event", "feedback_event", _empty_reply)
+register_event_handler("event", None, _empty_reply)
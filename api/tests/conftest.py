@@ -1,5 +1,9 @@
 import os
+import socketserver
 import sys
+import threading
+
+import pytest
 
 
 def _ensure_api_dir_on_syspath() -> None:
@@ -16,3 +20,130 @@ def _ensure_api_dir_on_syspath() -> None:
 
 
 _ensure_api_dir_on_syspath()
+
+
+class _RedisStandInHandler(socketserver.StreamRequestHandler):
+    """Minimal RESP2 server covering the commands used by the Redis backends."""
+
+    def _read_command(self) -> list[bytes] | None:
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, value) -> None:
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, bytes):
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self._write(item)
+        else:
+            self.wfile.write(value.encode())
+
+    def _execute(self, cmd: str, rest: list[bytes]):
+        data, versions = self.server.data, self.server.versions
+        if cmd in ("SET", "APPEND", "HSET"):
+            versions[rest[0]] = versions.get(rest[0], 0) + 1
+        elif cmd == "DEL":
+            for key in rest:
+                versions[key] = versions.get(key, 0) + 1
+
+        if cmd == "PING":
+            return "+PONG\r\n"
+        if cmd == "SET":
+            # NX is honoured; EX/PX expiry is accepted but not enforced
+            if b"NX" in (opt.upper() for opt in rest[2:]) and rest[0] in data:
+                return None
+            data[rest[0]] = rest[1]
+            return "+OK\r\n"
+        if cmd == "GET":
+            return data.get(rest[0])
+        if cmd == "APPEND":
+            data[rest[0]] = data.get(rest[0], b"") + rest[1]
+            return len(data[rest[0]])
+        if cmd == "DEL":
+            return sum(data.pop(key, None) is not None for key in rest)
+        if cmd == "HSET":
+            fields = data.setdefault(rest[0], {})
+            pairs = list(zip(rest[1::2], rest[2::2], strict=True))
+            added = sum(field not in fields for field, _ in pairs)
+            fields.update(pairs)
+            return added
+        if cmd == "HGET":
+            return data.get(rest[0], {}).get(rest[1])
+        if cmd == "HGETALL":
+            return [item for pair in data.get(rest[0], {}).items() for item in pair]
+        return f"-ERR unknown command '{cmd}'\r\n"
+
+    def handle(self) -> None:
+        # WATCH/MULTI/EXEC: optimistic transactions, aborted when a watched key was written since WATCH
+        watched: dict[bytes, int] = {}
+        queued: list[tuple[str, list[bytes]]] | None = None
+        while (args := self._read_command()) is not None:
+            cmd, rest = args[0].upper().decode(), args[1:]
+            with self.server.lock:
+                versions = self.server.versions
+                if cmd == "WATCH":
+                    watched.update((key, versions.get(key, 0)) for key in rest)
+                    reply = "+OK\r\n"
+                elif cmd == "UNWATCH":
+                    watched.clear()
+                    reply = "+OK\r\n"
+                elif cmd == "MULTI":
+                    queued = []
+                    reply = "+OK\r\n"
+                elif cmd == "DISCARD":
+                    queued = None
+                    watched.clear()
+                    reply = "+OK\r\n"
+                elif cmd == "EXEC":
+                    if any(versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = "*-1\r\n"
+                    else:
+                        reply = [self._execute(*command) for command in queued or ()]
+                    queued = None
+                    watched.clear()
+                elif queued is not None:
+                    queued.append((cmd, rest))
+                    reply = "+QUEUED\r\n"
+                else:
+                    reply = self._execute(cmd, rest)
+            self._write(reply)
+
+
+@pytest.fixture
+def redis_url():
+    """Start a local Redis-protocol stand-in server and yield its URL."""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RedisStandInHandler)
+    server.daemon_threads = True
+    server.data = {}
+    server.versions = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fake_openai_server():
+    """Start a local OpenAI-compatible SSE server."""
+    from benchmarks.fake_openai_server import FakeOpenAIServer
+
+    server = FakeOpenAIServer().start()
+    try:
+        yield server
+    finally:
+        server.stop()
@@ -0,0 +1,61 @@
+from fastapi.testclient import TestClient
+
+from app import app
+from core import stream_manager
+from utils.config import settings
+
+client = TestClient(app)
+
+
+def test_admin_endpoints_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+
+    response = client.post("/api/admin/answer-cache/flush", headers={"X-Admin-Token": ""})
+
+    assert response.status_code == 403
+
+
+def test_admin_flush_answer_cache(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    stream_manager._answer_cache.put("faq", "mock", "answer")
+
+    assert client.get("/api/admin/answer-cache", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    # 非 ASCII 令牌同样按不匹配处理，而不是比较时抛错
+    assert client.get("/api/admin/answer-cache", headers={"X-Admin-Token": "sécret".encode()}).status_code == 403
+    assert client.get("/api/admin/answer-cache").status_code == 403
+    stats = client.get("/api/admin/answer-cache", headers={"X-Admin-Token": "secret"}).json()
+    assert stats["entries"] >= 1
+
+    response = client.post("/api/admin/answer-cache/flush", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["flushed"] >= 1
+    assert response.json()["entries"] == 0
+    assert response.json()["bytes"] == 0
+
+
+def test_admin_admission_stats(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+
+    response = client.get("/api/admin/admission", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert {"active", "queue_depth", "wait_seconds_avg", "wait_seconds_max"} <= response.json().keys()
+
+
+def test_admin_dedup_stats(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+
+    response = client.get("/api/admin/dedup", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert {"hits", "misses"} <= response.json().keys()
+
+
+def test_admin_stream_store_stats(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+
+    response = client.get("/api/admin/streams", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert {"streams", "finished", "bytes", "max_bytes", "evicted", "rejected"} <= response.json().keys()
@@ -24,3 +24,14 @@ def test_health_endpoint_integration():
     # Verify direct access without prefix fails (confirms proper API prefix routing)
     response_direct = client.get("/health")
     assert response_direct.status_code == 404
+
+
+def test_metrics_endpoint_integration():
+    """Prometheus metrics are exposed next to the health endpoint."""
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE wecom_callback_stage_seconds histogram" in response.text
+    assert 'wecom_callback_stage_seconds_count{stage="decrypt"}' in response.text
+    assert "# TYPE llm_streams gauge" in response.text
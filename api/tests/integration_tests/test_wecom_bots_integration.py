@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from core.bots import BotConfig, set_bots
+from core.wecom.crypto import WeComMessageCrypto
+
+client = TestClient(app)
+
+BOTS = {
+    "sales": BotConfig(bot_id="sales", token="sales-token", encoding_aes_key="s" * 43),
+    "hr": BotConfig(bot_id="hr", token="hr-token", encoding_aes_key="h" * 43),
+}
+
+
+@pytest.fixture(autouse=True)
+def bots():
+    set_bots(BOTS)
+    yield BOTS
+    set_bots(None)
+
+
+def _post(bot_id: str, payload: dict, bot: BotConfig | None = None):
+    bot = bot or BOTS[bot_id]
+    crypto = WeComMessageCrypto(bot.token, bot.encoding_aes_key, bot.corp_id)
+    enc = crypto.encrypt_to_json(plain_text=json.dumps(payload), nonce="nonce123")
+    params = {"msg_signature": enc["msgsignature"], "timestamp": str(enc["timestamp"]), "nonce": enc["nonce"]}
+    response = client.post(
+        f"/api/wecom/callback/{bot_id}", params=params, content=json.dumps({"encrypt": enc["encrypt"]})
+    )
+    if response.status_code != 200:
+        return response, None
+    reply = response.json()
+    plain = crypto.decrypt_from_json(reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"])
+    return response, json.loads(plain)["stream"]
+
+
+def test_each_bot_uses_its_own_crypto_and_stream_namespace():
+    _, sales_stream = _post("sales", {"msgid": "m-sales", "msgtype": "text", "text": {"content": "hi"}})
+    _, hr_stream = _post("hr", {"msgid": "m-hr", "msgtype": "text", "text": {"content": "hi"}})
+
+    assert sales_stream["id"].startswith("sales.")
+    assert hr_stream["id"].startswith("hr.")
+
+    # 机器人只能刷新自己的流
+    _, own = _post("sales", {"msgtype": "stream", "stream": {"id": sales_stream["id"]}})
+    _, foreign = _post("hr", {"msgtype": "stream", "stream": {"id": sales_stream["id"]}})
+    assert own["finish"] is False
+    assert foreign["finish"] is True
+    assert foreign["content"] == ""
+
+
+def test_bot_rejects_callbacks_signed_with_another_bots_token():
+    response, _ = _post("hr", {"msgtype": "text", "text": {"content": "hi"}}, bot=BOTS["sales"])
+
+    assert response.status_code == 400
+
+
+def test_unknown_bot_returns_404():
+    response = client.post(
+        "/api/wecom/callback/unknown", params={"msg_signature": "s", "timestamp": "1", "nonce": "n"}, content=b"{}"
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,96 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app import app
+from core import stream_manager
+from core.stream_state import MemoryStreamStateBackend
+from core.wecom.crypto import WeComMessageCrypto
+from utils.config import settings
+
+client = TestClient(app)
+crypto = WeComMessageCrypto(settings.WECOM_TOKEN, settings.WECOM_ENCODING_AES_KEY, settings.WECOM_CORP_ID)
+
+
+def _post(payload: dict):
+    enc = crypto.encrypt_to_json(plain_text=json.dumps(payload), nonce="nonce123")
+    params = {"msg_signature": enc["msgsignature"], "timestamp": str(enc["timestamp"]), "nonce": enc["nonce"]}
+    return client.post("/api/wecom/callback", params=params, content=json.dumps({"encrypt": enc["encrypt"]}))
+
+
+def test_callback_post_returns_encrypted_stream_reply():
+    response = _post({"msgid": "integration-1", "msgtype": "text", "text": {"content": "hi"}})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    reply = response.json()
+    plain = crypto.decrypt_from_json(reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"])
+    stream = json.loads(plain)["stream"]
+    assert stream["finish"] is False
+    assert stream["id"]
+
+
+def test_callback_post_rejects_oversized_body(monkeypatch):
+    monkeypatch.setattr(settings, "CALLBACK_MAX_BODY_BYTES", 64)
+
+    response = client.post(
+        "/api/wecom/callback",
+        params={"msg_signature": "s", "timestamp": "1", "nonce": "n"},
+        content=json.dumps({"encrypt": "x" * 100}),
+    )
+
+    assert response.status_code == 413
+
+
+def test_callback_post_rejects_invalid_body():
+    params = {"msg_signature": "s", "timestamp": "1", "nonce": "n"}
+
+    assert client.post("/api/wecom/callback", params=params, content=b"not json").status_code == 400
+    assert client.post("/api/wecom/callback", params=params, content=b"[1, 2]").status_code == 400
+    assert client.post("/api/wecom/callback", params=params, content=b'{"encrypt": ""}').status_code == 400
+
+
+def test_callback_post_rejects_invalid_signature():
+    enc = crypto.encrypt_to_json(plain_text="{}", nonce="nonce123")
+    params = {"msg_signature": "0" * 40, "timestamp": str(enc["timestamp"]), "nonce": enc["nonce"]}
+
+    response = client.post("/api/wecom/callback", params=params, content=json.dumps({"encrypt": enc["encrypt"]}))
+
+    assert response.status_code == 400
+    assert response.text == "invalid signature"
+
+
+def test_callback_post_while_draining_finishes_immediately(monkeypatch):
+    monkeypatch.setattr("core.stream_manager._accepting", False)
+
+    response = _post({"msgid": "integration-drain", "msgtype": "text", "text": {"content": "hi"}})
+
+    assert response.status_code == 200
+    reply = response.json()
+    plain = crypto.decrypt_from_json(reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"])
+    stream = json.loads(plain)["stream"]
+    assert stream["finish"] is True
+    assert "重启" in stream["content"]
+
+
+def test_callback_post_when_stream_store_full_finishes_immediately():
+    full = MemoryStreamStateBackend(max_streams=1)
+    full.create("live")
+    previous = stream_manager.set_stream_state_backend(full)
+    try:
+        response = _post({"msgid": "integration-full", "msgtype": "text", "text": {"content": "hi"}})
+    finally:
+        stream_manager.set_stream_state_backend(previous)
+
+    reply = response.json()
+    plain = crypto.decrypt_from_json(reply["msgsignature"], str(reply["timestamp"]), reply["nonce"], reply["encrypt"])
+    stream = json.loads(plain)["stream"]
+    assert stream["finish"] is True
+    assert "请求较多" in stream["content"]
+
+
+def test_callback_post_event_returns_empty_body():
+    response = _post({"msgid": "integration-card", "msgtype": "event", "event": {"eventtype": "template_card_event"}})
+
+    assert response.status_code == 200
+    assert response.content == b""
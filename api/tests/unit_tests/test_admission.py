@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from core import stream_manager
+from core.admission import AdmissionTimeoutError, ConcurrencyGovernor
+from core.stream_manager import StreamStatus, get_stream_state, start_stream
+
+
+def test_try_acquire_respects_global_and_per_key_caps():
+    governor = ConcurrencyGovernor(max_concurrency=3, max_per_chat=1, max_per_user=2)
+
+    assert governor.try_acquire("chat-a", "u1")
+    assert not governor.try_acquire("chat-a", "u2")  # 会话已满
+    assert governor.try_acquire("chat-b", "u1")
+    assert not governor.try_acquire("chat-c", "u1")  # 用户已满
+    assert governor.try_acquire("chat-c", "u2")
+    assert not governor.try_acquire("chat-d", "u3")  # 全局已满
+
+    governor.release("chat-a", "u1")
+    assert governor.try_acquire("chat-d", "u3")
+    assert governor.stats()["active"] == 3
+
+
+def test_queued_waiters_are_admitted_in_fifo_order():
+    governor = ConcurrencyGovernor(max_concurrency=1)
+    order = []
+
+    async def worker(name: str) -> None:
+        await governor.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        governor.release()
+
+    async def main():
+        assert governor.try_acquire()
+        tasks = [asyncio.create_task(worker(f"w{i}")) for i in range(5)]
+        await asyncio.sleep(0.01)
+        assert governor.stats()["queue_depth"] == 5
+        governor.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+    assert order == ["w0", "w1", "w2", "w3", "w4"]
+    stats = governor.stats()
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["queued"] == 5
+    assert stats["wait_seconds_max"] > 0
+
+
+def test_full_chat_does_not_block_other_chats_in_queue():
+    governor = ConcurrencyGovernor(max_concurrency=2, max_per_chat=1)
+
+    async def main():
+        assert governor.try_acquire("chat-a")
+        assert governor.try_acquire("chat-b")
+        blocked = asyncio.create_task(governor.acquire("chat-a"))
+        other = asyncio.create_task(governor.acquire("chat-c"))
+        await asyncio.sleep(0.01)
+        governor.release("chat-b")
+        await asyncio.wait_for(other, timeout=1)
+        assert not blocked.done()
+        governor.release("chat-a")
+        await asyncio.wait_for(blocked, timeout=1)
+
+    asyncio.run(main())
+
+
+def test_acquire_times_out_and_leaves_queue():
+    governor = ConcurrencyGovernor(max_concurrency=1, max_queue_seconds=0.05)
+    assert governor.try_acquire()
+
+    with pytest.raises(AdmissionTimeoutError):
+        asyncio.run(governor.acquire())
+
+    stats = governor.stats()
+    assert stats["timeouts"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["active"] == 1
+
+
+def test_stream_reports_queued_until_admitted(monkeypatch):
+    governor = ConcurrencyGovernor(max_concurrency=1)
+    monkeypatch.setattr(stream_manager, "_governor", governor)
+
+    async def quick_iter(prompt: str):
+        await asyncio.sleep(0.05)
+        yield prompt
+
+    monkeypatch.setattr(stream_manager, "_mock_stream_iter", quick_iter)
+
+    async def main():
+        first = start_stream("first")
+        second = start_stream("second")
+        await asyncio.sleep(0.01)
+        assert get_stream_state(first)["status"] == StreamStatus.RUNNING
+        assert get_stream_state(second)["status"] == StreamStatus.QUEUED
+        assert stream_manager.admission_stats()["queue_depth"] == 1
+
+        deadline = time.monotonic() + 2
+        while get_stream_state(second)["status"] != StreamStatus.DONE and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return get_stream_state(first), get_stream_state(second)
+
+    first_state, second_state = asyncio.run(main())
+
+    assert first_state["status"] == StreamStatus.DONE
+    assert second_state["status"] == StreamStatus.DONE
+    assert second_state["content"] == "second"
+    assert governor.stats()["active"] == 0
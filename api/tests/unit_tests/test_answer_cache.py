@@ -0,0 +1,58 @@
+from core import stream_manager
+from core.answer_cache import AnswerCache, normalize_prompt
+from core.stream_manager import StreamStatus, get_stream_state, start_stream
+from utils.config import settings
+
+
+def test_normalize_prompt_collapses_whitespace_and_case():
+    assert normalize_prompt("  How do I   join\nthe Team? ") == "how do i join the team?"
+
+
+def test_answer_cache_hit_and_miss_counters():
+    cache = AnswerCache(max_bytes=1024, ttl_seconds=60)
+    assert cache.get("hello", "m") is None
+    cache.put("Hello ", "m", "world")
+
+    assert cache.get(" hello", "m") == "world"
+    assert cache.get("hello", "other-model") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len("world") + len("hello")
+    assert stats["hit_ratio"] == 1 / 3
+
+
+def test_answer_cache_evicts_lru_by_bytes():
+    cache = AnswerCache(max_bytes=25, ttl_seconds=60)
+    cache.put("a", "m", "x" * 9)
+    cache.put("b", "m", "y" * 9)
+    cache.get("a", "m")  # a 变为最近使用
+    cache.put("c", "m", "z" * 9)  # 超出 25 字节，淘汰 b
+
+    assert cache.get("b", "m") is None
+    assert cache.get("a", "m") == "x" * 9
+    assert cache.stats()["bytes"] <= 25
+    assert cache.stats()["evictions"] == 1
+
+
+def test_answer_cache_skips_oversized_and_expires(mocker):
+    clock = mocker.patch("core.answer_cache.time.monotonic", return_value=0.0)
+    cache = AnswerCache(max_bytes=10, ttl_seconds=5)
+    cache.put("big", "m", "x" * 100)
+    cache.put("a", "m", "ok")
+    assert cache.stats()["entries"] == 1
+
+    clock.return_value = 6.0
+    assert cache.get("a", "m") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_start_stream_replays_cached_answer_as_done(monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    stream_manager._answer_cache.put("常见问题", stream_manager._model_name(), "缓存的回答")
+
+    stream_id = start_stream("  常见问题 ")
+
+    assert get_stream_state(stream_id) == {"status": StreamStatus.DONE, "content": "缓存的回答"}
+    stream_manager.flush_answer_cache()
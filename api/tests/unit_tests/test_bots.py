@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from core import stream_manager
+from core.bots import BotConfig, load_bots
+from utils.config import ConfigValidationError
+
+AES_KEY = "b" * 43
+
+
+def test_load_bots_from_file(tmp_path):
+    path = tmp_path / "bots.json"
+    path.write_text(
+        json.dumps(
+            {
+                "bots": [
+                    {"id": "sales", "token": "t1", "encoding_aes_key": AES_KEY, "max_concurrency": 4},
+                    {"id": "hr", "token": "t2", "encoding_aes_key": AES_KEY, "llm_provider": "synthetic"},
+                ]
+            }
+        )
+    )
+
+    bots = load_bots(path)
+
+    assert list(bots) == ["sales", "hr"]
+    assert bots["sales"].max_concurrency == 4
+    assert bots["hr"].provider == "synthetic"
+
+
+def test_load_bots_from_directory_uses_file_name_as_id(tmp_path):
+    (tmp_path / "support.json").write_text(json.dumps({"token": "t", "encoding_aes_key": AES_KEY}))
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    bots = load_bots(tmp_path)
+
+    assert list(bots) == ["support"]
+    assert bots["support"].token == "t"
+
+
+@pytest.mark.parametrize(
+    ("entries", "message"),
+    [
+        ([{"id": "a.b", "token": "t", "encoding_aes_key": AES_KEY}], "invalid bot id"),
+        ([{"id": "a", "token": "t"}], "missing token"),
+        ([{"id": "a", "token": "t", "encoding_aes_key": "short"}], "43 characters"),
+        ([{"id": "a", "token": "t", "encoding_aes_key": AES_KEY}] * 2, "duplicate bot id"),
+    ],
+)
+def test_load_bots_rejects_invalid_entries(tmp_path, entries, message):
+    path = tmp_path / "bots.json"
+    path.write_text(json.dumps(entries))
+
+    with pytest.raises(ConfigValidationError, match=message):
+        load_bots(path)
+
+
+def test_bot_streams_are_namespaced_and_use_own_governor():
+    bot = BotConfig(bot_id="sales", token="t", encoding_aes_key=AES_KEY, max_concurrency=3)
+
+    governor = stream_manager._governor_for(bot)
+
+    assert governor is stream_manager._governor_for(bot)
+    assert governor is not stream_manager._governor
+    assert governor.max_concurrency == 3
+    assert stream_manager.stream_owner("sales.abc") == "sales"
+    assert stream_manager.stream_owner("abc") is None
+    assert stream_manager._model_name(bot) == "sales/mock"
@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+
+from core import stream_manager
+from core.cold_store import ColdStreamStore
+from core.stream_manager import StreamStatus, get_stream_state
+
+
+def test_put_and_get_round_trip_compresses_content():
+    store = ColdStreamStore()
+    answer = "企业微信流式回答。" * 500
+
+    store.put("s1", StreamStatus.DONE, answer)
+    store.put("s2", StreamStatus.ERROR, "partial", error="RuntimeError('boom')")
+
+    assert store.get("s1") == {"status": StreamStatus.DONE, "content": answer}
+    assert store.get("s2") == {"status": StreamStatus.ERROR, "content": "partial", "error": "RuntimeError('boom')"}
+    stats = store.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] < len(answer.encode("utf-8")) // 10
+    assert stats["compression_ratio"] > 10
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("core.cold_store.time.monotonic", lambda: now[0])
+    store = ColdStreamStore(ttl_seconds=360)
+    store.put("s1", StreamStatus.DONE, "answer")
+
+    now[0] += 359
+    assert store.get("s1") is not None
+    now[0] += 2
+    assert store.get("s1") is None
+    assert store.stats()["bytes"] == 0
+
+
+def test_oldest_entries_are_evicted_when_over_capacity():
+    store = ColdStreamStore(max_bytes=100)
+    for i in range(10):
+        store.put(f"s{i}", StreamStatus.DONE, uuid.uuid4().hex)
+
+    stats = store.stats()
+    assert stats["bytes"] <= 100
+    assert stats["evictions"] > 0
+    assert store.get("s0") is None
+    assert store.get("s9") is not None
+
+
+def test_expired_stream_is_served_from_cold_store():
+    stream_id = uuid.uuid4().hex
+    stream_manager._backend.create(stream_id)
+    stream_manager._backend.append(stream_id, "完整回答")
+    stream_manager._backend.set_status(stream_id, StreamStatus.DONE)
+
+    # 模拟热层保留期到期
+    stream_manager._expire_streams([stream_id])
+
+    assert stream_manager._backend.get(stream_id) is None
+    assert get_stream_state(stream_id) == {"status": StreamStatus.DONE, "content": "完整回答"}
+
+
+@pytest.mark.parametrize("status", [StreamStatus.STOPPING, StreamStatus.ERROR])
+def test_only_done_streams_are_demoted(status):
+    stream_id = uuid.uuid4().hex
+    stream_manager._backend.create(stream_id)
+    stream_manager._backend.append(stream_id, "partial")
+    stream_manager._backend.set_status(stream_id, status)
+
+    stream_manager._expire_streams([stream_id])
+
+    # 未降级：迟到的刷新拿到 MISSING（finish=true），不会在冷存储有效期内一直以 finish=false 刷新
+    assert stream_manager._cold_store.get(stream_id) is None
+    assert get_stream_state(stream_id)["status"] == StreamStatus.MISSING
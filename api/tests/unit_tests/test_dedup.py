@@ -0,0 +1,110 @@
+import pytest
+
+from core import stream_manager
+from core.dedup import MessageDedupCache, SharedMessageDedup
+from core.metrics import registry
+from core.stream_state import (
+    MemoryStreamStateBackend,
+    RedisStreamStateBackend,
+    SQLiteStreamStateBackend,
+    StreamCapacityError,
+    StreamStatus,
+)
+
+
+def test_dedup_cache_maps_retry_to_first_stream():
+    cache = MessageDedupCache(max_entries=10, ttl_seconds=60)
+
+    assert cache.claim("bot:msg1", "s1") == "s1"
+    assert cache.claim("bot:msg1", "s2") == "s1"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+
+
+def test_dedup_cache_evicts_least_recently_used():
+    cache = MessageDedupCache(max_entries=2, ttl_seconds=60)
+    cache.claim("a", "s1")
+    cache.claim("b", "s2")
+    cache.claim("a", "x")  # 命中后 a 变为最近使用
+    cache.claim("c", "s3")  # 淘汰 b
+
+    assert cache.claim("a", "y") == "s1"
+    assert cache.claim("b", "s4") == "s4"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_dedup_cache_entries_expire_after_ttl(mocker):
+    clock = mocker.patch("core.dedup.time.monotonic", return_value=100.0)
+    cache = MessageDedupCache(max_entries=10, ttl_seconds=5)
+    cache.claim("a", "s1")
+
+    clock.return_value = 106.0
+    assert cache.claim("a", "s2") == "s2"
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared_backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStreamStateBackend(str(tmp_path / "streams.db"))
+    return RedisStreamStateBackend(request.getfixturevalue("redis_url"))
+
+
+def test_shared_dedup_claims_across_backend_instances(shared_backend):
+    worker_a = SharedMessageDedup(shared_backend, ttl_seconds=60)
+    worker_b = SharedMessageDedup(shared_backend, ttl_seconds=60)
+
+    assert worker_a.claim("bot:msg1", "s1") == "s1"
+    assert worker_b.claim("bot:msg1", "s2") == "s1"
+    assert worker_a.stats() == {"hits": 0, "misses": 1}
+    assert worker_b.stats() == {"hits": 1, "misses": 0}
+
+    # 只撤销仍指向自己的登记
+    worker_b.release("bot:msg1", "s2")
+    assert worker_b.claim("bot:msg1", "s3") == "s1"
+    worker_a.release("bot:msg1", "s1")
+    assert worker_b.claim("bot:msg1", "s3") == "s3"
+
+
+def test_sqlite_dedup_entry_expires(tmp_path):
+    backend = SQLiteStreamStateBackend(str(tmp_path / "streams.db"))
+    assert backend.claim_message("k", "s1", ttl_seconds=-1) == "s1"
+    assert backend.claim_message("k", "s2", ttl_seconds=60) == "s2"
+
+
+def test_memory_backend_has_no_shared_dedup():
+    with pytest.raises(NotImplementedError):
+        MemoryStreamStateBackend().claim_message("k", "s1", 60)
+
+
+def test_start_stream_reuses_stream_for_same_dedup_key():
+    before = stream_manager.dedup_stats()
+    first = stream_manager.start_stream("hello", dedup_key="bot:retry-msg")
+    second = stream_manager.start_stream("hello", dedup_key="bot:retry-msg")
+    other = stream_manager.start_stream("hello", dedup_key="bot:another-msg")
+
+    assert first == second
+    assert other != first
+    stats = stream_manager.dedup_stats()
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["misses"] == before["misses"] + 2
+    text = registry.render()
+    assert f'msg_dedup_claims{{result="hit"}} {float(stats["hits"])}' in text
+    assert f'msg_dedup_claims{{result="miss"}} {float(stats["misses"])}' in text
+    stream_manager.stop_stream(first)
+    stream_manager.stop_stream(other)
+
+
+def test_rejected_stream_releases_dedup_claim():
+    backend = MemoryStreamStateBackend(max_streams=1)
+    backend.create("live")
+    previous = stream_manager.set_stream_state_backend(backend)
+    try:
+        with pytest.raises(StreamCapacityError):
+            stream_manager.start_stream("hello", dedup_key="bot:full-msg")
+
+        # 容量恢复后，重投的同一消息重新创建流，而不是拿到从未创建的 stream_id
+        backend.set_status("live", StreamStatus.DONE)
+        stream_id = stream_manager.start_stream("hello", dedup_key="bot:full-msg")
+        assert stream_manager.get_stream_state(stream_id)["status"] != StreamStatus.MISSING
+        stream_manager.stop_stream(stream_id)
+    finally:
+        stream_manager.set_stream_state_backend(previous)
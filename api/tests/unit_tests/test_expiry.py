@@ -0,0 +1,87 @@
+import threading
+import time
+
+from core.expiry import ExpiryScheduler
+
+
+class _Collector:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.event = threading.Event()
+
+    def __call__(self, keys: list[str]) -> None:
+        self.batches.append(keys)
+        self.event.set()
+
+
+def test_expiry_scheduler_evicts_due_keys_in_one_batch():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector)
+    for i in range(50):
+        scheduler.schedule(f"k{i}", 0.1)
+    assert scheduler.pending_count == 50
+
+    deadline = time.time() + 3
+    while sum(map(len, collector.batches)) < 50 and time.time() < deadline:
+        time.sleep(0.05)
+    assert sorted(key for batch in collector.batches for key in batch) == sorted(f"k{i}" for i in range(50))
+    assert len(collector.batches) <= 2
+    assert scheduler.pending_count == 0
+
+
+def test_expiry_scheduler_keeps_single_entry_per_key():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector)
+    scheduler.schedule("k", 10)
+    scheduler.schedule("k", 10)
+    scheduler.schedule("k", 5)
+
+    assert scheduler.pending_count == 1
+    assert len(scheduler._heap) == 1
+
+
+def test_expiry_scheduler_earlier_key_wakes_sleeping_thread():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector)
+    scheduler.schedule("late", 10)
+    scheduler.schedule("early", 0.05)
+
+    assert collector.event.wait(2)
+    assert collector.batches == [["early"]]
+    assert scheduler.pending_count == 1
+
+
+def test_expiry_scheduler_cancel():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector)
+    scheduler.schedule("k", 0.05)
+    scheduler.cancel("k")
+
+    assert scheduler.pending_count == 0
+    assert not collector.event.wait(0.2)
+
+
+def test_expiry_scheduler_postponed_key_expires_at_new_deadline():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector, resolution=0.05)
+    scheduler.schedule("k", 0.05)
+    scheduler.schedule("k", 0.5)
+
+    # 旧的截止时间作废（惰性删除），不会提前过期
+    assert not collector.event.wait(0.25)
+    assert collector.event.wait(2)
+    assert collector.batches == [["k"]]
+    assert scheduler.pending_count == 0
+
+
+def test_expiry_scheduler_repeated_postpones_keep_heap_bounded():
+    collector = _Collector()
+    scheduler = ExpiryScheduler(collector, resolution=0.001)
+    for i in range(10):
+        scheduler.schedule(f"k{i}", 60)
+    for step in range(1, 1001):
+        scheduler.schedule(f"k{step % 10}", 60 + step)
+
+    assert scheduler.pending_count == 10
+    # 失效记录被周期性压缩，堆大小与 key 数量同阶，而不是与调度次数同阶
+    assert len(scheduler._heap) <= 2 * 10 + 64 + 1
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from core.llm import openai_client
+from core.llm.providers import LLMEndpoint, _ttft, _wins, hedged_stream_iter, llm_hedged_requests, parse_endpoints
+from utils.config import ConfigValidationError, settings
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    openai_client._clients.clear()
+    slow = FakeOpenAIServer(tokens=["slow"], first_token_delay=5).start()
+    fast = FakeOpenAIServer(tokens=["fast", "!"]).start()
+    try:
+        yield slow, fast
+    finally:
+        slow.stop()
+        fast.stop()
+        openai_client._clients.clear()
+
+
+def _endpoints(*servers: FakeOpenAIServer) -> list[LLMEndpoint]:
+    return [LLMEndpoint(f"ep{i}", server.base_url) for i, server in enumerate(servers)]
+
+
+async def _collect(endpoints, hedge_delay: float, **kwargs) -> str:
+    return "".join([chunk async for chunk in hedged_stream_iter("hi", endpoints, hedge_delay, **kwargs)])
+
+
+def test_slow_primary_is_hedged_and_cancelled(servers):
+    slow, fast = servers
+    wins, hedged = _wins("ep1").value, llm_hedged_requests.value
+    ttft_count = _ttft("ep1").count
+
+    started = time.perf_counter()
+    text = asyncio.run(_collect(_endpoints(slow, fast), hedge_delay=0.2))
+
+    assert text == "fast!"
+    assert time.perf_counter() - started < 2
+    # 落败的主端点请求被关闭，不会继续生成
+    assert slow.aborted.wait(2)
+    assert _wins("ep1").value == wins + 1
+    assert llm_hedged_requests.value == hedged + 1
+    assert _ttft("ep1").count == ttft_count + 1
+
+
+def test_fast_primary_does_not_start_hedged_request(servers):
+    slow, fast = servers
+
+    assert asyncio.run(_collect(_endpoints(fast, slow), hedge_delay=1)) == "fast!"
+    assert slow.connections == 0
+
+
+def test_primary_error_fails_over_without_waiting_for_hedge_delay(servers):
+    _, fast = servers
+
+    async def broken_or_real(prompt, base_url=None, **kwargs):
+        if base_url is None:
+            raise ConnectionError("gateway unavailable")
+        async for chunk in openai_client.openai_stream_iter(prompt, base_url=base_url, **kwargs):
+            yield chunk
+
+    endpoints = [LLMEndpoint("primary"), *_endpoints(fast)]
+    started = time.perf_counter()
+
+    assert asyncio.run(_collect(endpoints, hedge_delay=5, stream_fn=broken_or_real)) == "fast!"
+    assert time.perf_counter() - started < 2
+
+
+def test_all_endpoints_failing_raises_last_error():
+    async def broken(prompt, base_url=None, **kwargs):
+        raise ConnectionError(f"{base_url} unavailable")
+        yield  # pragma: no cover
+
+    endpoints = [LLMEndpoint("a", "http://a"), LLMEndpoint("b", "http://b")]
+
+    with pytest.raises(ConnectionError, match="http://b unavailable"):
+        asyncio.run(_collect(endpoints, hedge_delay=5, stream_fn=broken))
+
+
+def test_parse_endpoints():
+    raw = (
+        '[{"name": "backup", "base_url": "http://b/v1", "api_key": "sk-b", "model": "m"},'
+        ' {"base_url": "http://c/v1", "api_key": "sk-c"}]'
+    )
+
+    assert parse_endpoints(raw) == (
+        LLMEndpoint("backup", "http://b/v1", "sk-b", "m"),
+        LLMEndpoint("fallback2", "http://c/v1", "sk-c"),
+    )
+    assert parse_endpoints("") == ()
+    with pytest.raises(ConfigValidationError, match="missing base_url"):
+        parse_endpoints('[{"name": "x"}]')
+    # 备用端点不会沿用主端点的 OPENAI_API_KEY
+    with pytest.raises(ConfigValidationError, match="missing api_key"):
+        parse_endpoints('[{"base_url": "http://b/v1"}]')
+    with pytest.raises(ConfigValidationError, match="JSON list"):
+        parse_endpoints('{"base_url": "http://b"}')
+
+
+def test_stream_worker_hedges_to_fallback_endpoint(servers, monkeypatch):
+    from core.stream_manager import StreamStatus, get_stream_state, start_stream
+
+    slow, fast = servers
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", slow.base_url)
+    monkeypatch.setattr(
+        settings,
+        "LLM_FALLBACK_ENDPOINTS",
+        f'[{{"name": "backup", "base_url": "{fast.base_url}", "api_key": "sk-backup"}}]',
+    )
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_SECONDS", 0.2)
+
+    stream_id = start_stream(f"hedged {time.time()}")
+    deadline = time.monotonic() + 5
+    while get_stream_state(stream_id)["status"] != StreamStatus.DONE and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert get_stream_state(stream_id)["content"] == "fast!"
+    assert slow.aborted.wait(2)
@@ -0,0 +1,30 @@
+import asyncio
+
+from benchmarks.loadgen import percentile, run_load
+from core import stream_manager
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_run_load_drives_conversations_until_finish(monkeypatch):
+    async def quick_iter(prompt: str):
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    monkeypatch.setattr(stream_manager, "_mock_stream_iter", quick_iter)
+
+    result = asyncio.run(run_load(conversations=4, concurrency=2, poll_interval=0.02)).to_dict()
+
+    assert result["errors"] == 0
+    assert result["conversations_completed"] == 4
+    assert result["endpoints"]["message"]["count"] == 4
+    assert result["endpoints"]["refresh"]["count"] >= 4
+    assert result["requests_per_second"] > 0
@@ -0,0 +1,43 @@
+from core.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative_in_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", {"stage": "decrypt"}, buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{stage="decrypt",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="decrypt",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{stage="decrypt",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{stage="decrypt"} 4' in text
+    assert 'latency_seconds_sum{stage="decrypt"} 3.65' in text
+
+
+def test_registry_reuses_metrics_and_renders_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.counter("streams", "Streams", {"status": "done"}).inc()
+    registry.counter("streams", "Streams", {"status": "done"}).inc()
+    registry.gauge_callback("queue", "Queue depth", lambda: [({}, 3)])
+
+    text = registry.render()
+
+    assert "# TYPE streams_total counter" in text
+    assert 'streams_total{status="done"} 2.0' in text
+    assert "# TYPE queue gauge" in text
+    assert "queue 3.0" in text
+
+
+def test_label_values_are_escaped_in_render():
+    registry = MetricsRegistry()
+    registry.counter("requests", "Requests", {"bot": 'a"b\\c\nd'}).inc()
+    registry.gauge_callback("bots", "Bots", lambda: [({"bot": 'x"y'}, 1)])
+
+    text = registry.render()
+
+    assert 'requests_total{bot="a\\"b\\\\c\\nd"} 1.0' in text
+    assert 'bots{bot="x\\"y"} 1.0' in text
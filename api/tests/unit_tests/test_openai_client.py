@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from core.llm import openai_client
+from core.llm.openai_client import get_openai_client, openai_stream_iter
+from utils.config import settings
+
+
+@pytest.fixture
+def openai_settings(monkeypatch, fake_openai_server):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", fake_openai_server.base_url)
+    openai_client._clients.clear()
+    yield fake_openai_server
+    openai_client._clients.clear()
+
+
+async def _collect(prompt: str) -> str:
+    return "".join([chunk async for chunk in openai_stream_iter(prompt)])
+
+
+def test_openai_stream_iter_yields_tokens(openai_settings):
+    assert asyncio.run(_collect("hi")) == "Hello from fake LLM."
+
+
+def test_openai_client_is_shared_and_reuses_connection(openai_settings):
+    async def main() -> list[str]:
+        client = get_openai_client()
+        texts = [await _collect("a"), await _collect("b")]
+        assert get_openai_client() is client
+        texts += await asyncio.gather(_collect("c"), _collect("d"))
+        return texts
+
+    texts = asyncio.run(main())
+
+    assert texts == ["Hello from fake LLM."] * 4
+    # 两个串行流复用同一条 keep-alive 连接，并发的第二个流才会新建连接
+    assert openai_settings.connections == 2
+
+
+def test_aclose_openai_clients_closes_pools_of_current_loop(openai_settings):
+    async def main() -> tuple[int, object]:
+        client = get_openai_client()
+        await _collect("hi")
+        closed = await openai_client.aclose_openai_clients()
+        assert asyncio.get_running_loop() not in openai_client._clients
+        return closed, client
+
+    closed, client = asyncio.run(main())
+
+    assert closed == 1
+    assert client.is_closed()
+
+
+def test_openai_client_requires_api_key(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    openai_client._clients.clear()
+
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        asyncio.run(_collect("hi"))
+
+
+def test_stop_stream_closes_upstream_connection(openai_settings, monkeypatch):
+    from core.stream_manager import StreamStatus, get_stream_state, start_stream, stop_stream
+
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "openai")
+    # token 间隔远大于断言时限：仅靠“下一个分片到达时检查 STOPPING”无法及时结束
+    openai_settings.tokens = ["tok "] * 5
+    openai_settings.token_interval = 5
+
+    stream_id = start_stream(f"stop upstream {time.time()}")
+    deadline = time.monotonic() + 5
+    while not get_stream_state(stream_id)["content"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert get_stream_state(stream_id)["content"]
+
+    stopped_at = time.monotonic()
+    stop_stream(stream_id)
+
+    # worker 被取消后上游 HTTP 流随即关闭，服务端在等待下一个 token 期间即感知断开
+    assert openai_settings.aborted.wait(timeout=2)
+    assert time.monotonic() - stopped_at < 1
+    assert openai_settings.completed_streams == 0
+    assert get_stream_state(stream_id)["status"] == StreamStatus.STOPPING
@@ -0,0 +1,116 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from core import stream_manager
+from core.cold_store import ColdStreamStore
+from core.snapshot import SnapshotRecord, decode_snapshot, encode_snapshot, read_snapshot, write_snapshot
+from core.stream_manager import (
+    StreamDrainingError,
+    StreamStatus,
+    drain_streams,
+    get_stream_state,
+    restore_streams,
+    resume_streams,
+    snapshot_streams,
+    start_stream,
+)
+from core.stream_state import MemoryStreamStateBackend
+
+
+def test_snapshot_round_trip_preserves_records():
+    records = [
+        SnapshotRecord("a", StreamStatus.DONE, "完整回答", None),
+        SnapshotRecord("bot.b", StreamStatus.RUNNING, "部分" * 1000, None),
+        SnapshotRecord("c", StreamStatus.ERROR, "", "RuntimeError('boom')"),
+    ]
+
+    saved_at, decoded = decode_snapshot(encode_snapshot(records, saved_at=123.5))
+
+    assert saved_at == 123.5
+    assert decoded == records
+
+
+def test_snapshot_is_compressed():
+    records = [SnapshotRecord(uuid.uuid4().hex, StreamStatus.DONE, "token " * 2000, None) for _ in range(10)]
+
+    assert len(encode_snapshot(records)) < sum(len(r.content) for r in records) // 10
+
+
+def test_decode_rejects_foreign_or_corrupted_data():
+    with pytest.raises(ValueError, match="not a stream snapshot"):
+        decode_snapshot(b"hello")
+    data = encode_snapshot([SnapshotRecord("a", StreamStatus.DONE, "x", None)])
+    with pytest.raises(ValueError, match="corrupted"):
+        decode_snapshot(data[:-3])
+
+
+def test_read_snapshot_skips_missing_and_stale_files(tmp_path):
+    path = tmp_path / "streams.snapshot"
+    assert read_snapshot(path, max_age_seconds=60) == []
+
+    path.write_bytes(encode_snapshot([SnapshotRecord("a", StreamStatus.DONE, "x", None)], saved_at=time.time() - 120))
+    assert read_snapshot(path, max_age_seconds=60) == []
+
+    write_snapshot(path, [SnapshotRecord("a", StreamStatus.DONE, "x", None)])
+    assert [r.stream_id for r in read_snapshot(path, max_age_seconds=60)] == ["a"]
+
+
+@pytest.fixture
+def fresh_backend(monkeypatch):
+    monkeypatch.setattr(stream_manager, "_cold_store", ColdStreamStore())
+    previous = stream_manager.set_stream_state_backend(MemoryStreamStateBackend())
+    yield stream_manager._backend
+    stream_manager.set_stream_state_backend(previous)
+    resume_streams()
+
+
+def test_snapshot_and_restore_streams_across_restart(fresh_backend, tmp_path):
+    # 快照目录（数据卷挂载点）不存在时自动创建
+    path = str(tmp_path / "data" / "streams.snapshot")
+    fresh_backend.create("done")
+    fresh_backend.append("done", "完整回答")
+    fresh_backend.set_status("done", StreamStatus.DONE)
+    fresh_backend.create("running")
+    fresh_backend.append("running", "生成到一半")
+    stream_manager._cold_store.put("cold", StreamStatus.DONE, "已降级的回答")
+
+    assert snapshot_streams(path) == 3
+
+    # 模拟重启：换成空的内存后端与冷存储再加载快照
+    stream_manager.set_stream_state_backend(MemoryStreamStateBackend())
+    stream_manager._cold_store = ColdStreamStore()
+    assert restore_streams(path, max_age_seconds=60) == 3
+
+    assert get_stream_state("done") == {"status": StreamStatus.DONE, "content": "完整回答"}
+    assert get_stream_state("cold") == {"status": StreamStatus.DONE, "content": "已降级的回答"}
+    interrupted = get_stream_state("running")
+    assert interrupted["status"] == StreamStatus.ERROR
+    assert interrupted["content"].startswith("生成到一半")
+    assert "服务重启" in interrupted["content"]
+    # 快照加载后即删除，再次重启不会重复恢复
+    assert restore_streams(path, max_age_seconds=60) == 0
+
+
+def test_drain_waits_for_workers_and_rejects_new_streams(fresh_backend):
+    async def main():
+        stream_id = start_stream("drain me")
+        remaining = await drain_streams(timeout=10)
+        return stream_id, remaining
+
+    stream_id, remaining = asyncio.run(main())
+
+    assert remaining == 0
+    assert get_stream_state(stream_id)["status"] == StreamStatus.DONE
+    with pytest.raises(StreamDrainingError):
+        start_stream("too late")
+
+
+def test_drain_returns_workers_still_running_after_timeout(fresh_backend):
+    async def main():
+        start_stream("slow")
+        return await drain_streams(timeout=0.1)
+
+    assert asyncio.run(main()) == 1
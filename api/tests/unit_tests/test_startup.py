@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+# 在全新进程中导入 app 并请求一次 /api/health，输出此时已加载的重型 SDK
+_PROBE = """
+import json, sys
+import app
+from fastapi.testclient import TestClient
+assert TestClient(app.app).get("/api/health").status_code == 200
+print(json.dumps([m for m in ("openai", "wechatpy") if m in sys.modules]))
+"""
+
+
+def test_cold_start_skips_heavy_sdks():
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=API_DIR,
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # openai / wechatpy 仅在首次使用时导入；冷启动耗时预算见 benchmarks/bench_startup
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,94 @@
+import asyncio
+import concurrent.futures
+import gc
+import threading
+
+import pytest
+
+from core.stream_executor import StreamExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = StreamExecutor(name="test-executor")
+    yield executor
+    executor.close()
+
+
+async def _record_thread(threads: set[int], delay: float = 0.01) -> str:
+    await asyncio.sleep(delay)
+    threads.add(threading.get_ident())
+    return "ok"
+
+
+def test_sync_submissions_share_one_background_loop_thread(executor):
+    threads: set[int] = set()
+
+    futures = [executor.submit(f"s{i}", _record_thread(threads)) for i in range(50)]
+
+    assert [future.result(timeout=5) for future in futures] == ["ok"] * 50
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+    assert executor.active_count == 0
+    assert executor.submitted == 50
+
+
+def test_tasks_survive_garbage_collection_and_can_be_awaited(executor):
+    threads: set[int] = set()
+
+    async def main():
+        for i in range(20):
+            executor.submit(f"s{i}", _record_thread(threads, delay=0.5))
+        gc.collect()
+        assert executor.active_count == 20
+        return await executor.wait(timeout=5)
+
+    assert asyncio.run(main()) == 0
+    assert len(threads) == 1
+
+
+def test_cancel_single_task_and_all_tasks(executor):
+    started = threading.Event()
+
+    async def forever():
+        started.set()
+        await asyncio.sleep(3600)
+
+    first = executor.submit("first", forever())
+    started.wait(timeout=5)
+    others = [executor.submit(f"other{i}", forever()) for i in range(3)]
+
+    assert executor.cancel("first") is True
+    with pytest.raises(concurrent.futures.CancelledError):
+        first.result(timeout=5)
+    assert executor.cancel("missing") is False
+
+    assert executor.cancel_all() == 3
+    for future in others:
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(timeout=5)
+    assert executor.active_count == 0
+
+
+def test_attached_loop_runs_tasks_in_place(executor):
+    threads: set[int] = set()
+
+    async def main():
+        executor.attach(asyncio.get_running_loop())
+        try:
+            future = executor.submit("s", _record_thread(threads))
+            await asyncio.wrap_future(future)
+        finally:
+            executor.detach()
+
+    asyncio.run(main())
+
+    assert threads == {threading.get_ident()}
+
+
+def test_worker_exception_is_propagated_to_future(executor):
+    async def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        executor.submit("s", boom()).result(timeout=5)
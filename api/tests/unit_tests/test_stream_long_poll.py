@@ -0,0 +1,122 @@
+import asyncio
+import time
+import uuid
+
+from core import stream_manager
+from core.metrics import registry
+from core.stream_manager import StreamStatus, poll_stream_update, refresh_stats, wait_for_stream_update
+
+
+def _new_stream() -> str:
+    # 直接在后端创建流，由测试手动推进，避免依赖 worker 的节奏
+    stream_id = uuid.uuid4().hex
+    stream_manager._backend.create(stream_id)
+    return stream_id
+
+
+def _push(stream_id: str, chunk: str) -> None:
+    stream_manager._backend.append(stream_id, chunk)
+    stream_manager._notify_stream_update(stream_id)
+
+
+def test_wait_returns_as_soon_as_new_content_arrives():
+    stream_id = _new_stream()
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.1, _push, stream_id, "Hello")
+        start = time.monotonic()
+        state = await wait_for_stream_update(stream_id, timeout=3)
+        return state, time.monotonic() - start
+
+    state, elapsed = asyncio.run(main())
+
+    assert state["content"] == "Hello"
+    assert elapsed < 1
+
+
+def test_wait_holds_until_deadline_without_new_content():
+    stream_id = _new_stream()
+    _push(stream_id, "Hello")
+    assert poll_stream_update(stream_id)["content"] == "Hello"
+    before = refresh_stats()
+
+    start = time.monotonic()
+    state = asyncio.run(wait_for_stream_update(stream_id, timeout=0.2))
+
+    assert time.monotonic() - start >= 0.2
+    assert state["content"] == "Hello"
+    after = refresh_stats()
+    assert after["hold_timeouts"] == before["hold_timeouts"] + 1
+    assert after["unchanged"] == before["unchanged"] + 1
+
+
+def test_wait_is_woken_by_notification_from_another_thread():
+    stream_id = _new_stream()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, lambda: loop.run_in_executor(None, _finish, stream_id))
+        return await wait_for_stream_update(stream_id, timeout=3)
+
+    def _finish(sid: str) -> None:
+        stream_manager._backend.set_status(sid, StreamStatus.DONE)
+        stream_manager._notify_stream_update(sid)
+
+    state = asyncio.run(main())
+
+    assert state["status"] == StreamStatus.DONE
+    assert stream_id not in stream_manager._update_waiters
+
+
+def test_poll_counts_unchanged_refreshes():
+    stream_id = _new_stream()
+    before = refresh_stats()
+
+    poll_stream_update(stream_id)
+    poll_stream_update(stream_id)
+    _push(stream_id, "x")
+    poll_stream_update(stream_id)
+
+    after = refresh_stats()
+    assert after["refreshes"] == before["refreshes"] + 3
+    assert after["unchanged"] == before["unchanged"] + 2
+
+
+def test_refresh_stats_are_exported_as_metrics():
+    stream_id = _new_stream()
+    poll_stream_update(stream_id)
+    asyncio.run(wait_for_stream_update(stream_id, timeout=0.05))
+
+    text = registry.render()
+    stats = refresh_stats()
+
+    assert f"stream_refreshes_total {float(stats['refreshes'])}" in text
+    assert f"stream_refreshes_unchanged_total {float(stats['unchanged'])}" in text
+    assert f"stream_refreshes_held_total {float(stats['held'])}" in text
+    assert f"stream_refresh_hold_timeouts_total {float(stats['hold_timeouts'])}" in text
+    assert stats["held"] >= 1
+    assert stats["hold_timeouts"] >= 1
+
+
+def test_polls_of_finished_or_unknown_streams_leave_no_entries(monkeypatch):
+    monkeypatch.setattr(stream_manager, "_MAX_DELIVERED_ENTRIES", 5)
+    stream_id = _new_stream()
+    _push(stream_id, "Hello")
+    poll_stream_update(stream_id)
+    assert stream_id in stream_manager._delivered_lengths
+
+    stream_manager._backend.set_status(stream_id, StreamStatus.DONE)
+    poll_stream_update(stream_id)
+    unknown = [uuid.uuid4().hex for _ in range(20)]
+    for sid in unknown:
+        poll_stream_update(sid)
+
+    assert stream_id not in stream_manager._delivered_lengths
+    assert not set(unknown) & stream_manager._delivered_lengths.keys()
+
+    # 进行中的流条目数有上限，超出时淘汰最久未刷新的流
+    live = [_new_stream() for _ in range(10)]
+    for sid in live:
+        poll_stream_update(sid)
+    assert len(stream_manager._delivered_lengths) <= 5
+    assert live[-1] in stream_manager._delivered_lengths
@@ -2,6 +2,8 @@ import time
 
 import pytest
 
+from core import stream_manager
+from core.metrics import registry
 from core.stream_manager import StreamStatus, get_stream_state, start_stream, stop_stream
 
 
@@ -66,3 +68,20 @@ def test_stream_can_be_stopped():
     state_after = get_stream_state(stream_id)
     assert state_after["status"] in (StreamStatus.STOPPING, StreamStatus.DONE)
     assert isinstance(state_after["content"], str)
+
+
+def _gauge_value(text: str, sample: str) -> float:
+    line = next(line for line in text.splitlines() if line.startswith(f"{sample} "))
+    return float(line.rsplit(" ", 1)[1])
+
+
+def test_pending_expirations_gauge_reads_reaper():
+    stream_id = f"pending-{time.time()}"
+    before = _gauge_value(registry.render(), "stream_pending_expirations")
+
+    stream_manager._schedule_cleanup(stream_id, delay_seconds=3600)
+    try:
+        assert _gauge_value(registry.render(), "stream_pending_expirations") == before + 1
+    finally:
+        stream_manager._reaper.cancel(stream_id)
+    assert _gauge_value(registry.render(), "stream_pending_expirations") == before
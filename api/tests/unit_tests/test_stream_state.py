@@ -0,0 +1,212 @@
+import multiprocessing
+
+import pytest
+
+from core.stream_state import (
+    MemoryStreamStateBackend,
+    RedisStreamStateBackend,
+    SQLiteStreamStateBackend,
+    StreamCapacityError,
+    StreamSession,
+    StreamStatus,
+    create_stream_state_backend,
+)
+
+
+def _status_and_content(state):
+    return {"status": state["status"], "content": state["content"]}
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStreamStateBackend()
+    if request.param == "sqlite":
+        return SQLiteStreamStateBackend(str(tmp_path / "streams.db"))
+    return RedisStreamStateBackend(request.getfixturevalue("redis_url"))
+
+
+def test_backend_create_append_and_finish(backend):
+    backend.create("s1")
+    assert _status_and_content(backend.get("s1")) == {"status": StreamStatus.RUNNING, "content": ""}
+
+    assert backend.append("s1", "Hello") == StreamStatus.RUNNING
+    assert backend.append("s1", " 世界") == StreamStatus.RUNNING
+    assert backend.set_status("s1", StreamStatus.DONE, expected=StreamStatus.RUNNING) is True
+
+    assert _status_and_content(backend.get("s1")) == {"status": StreamStatus.DONE, "content": "Hello 世界"}
+
+
+def test_backend_append_ignored_after_stop(backend):
+    backend.create("s1")
+    backend.append("s1", "a")
+    backend.set_status("s1", StreamStatus.STOPPING)
+
+    assert backend.append("s1", "b") == StreamStatus.STOPPING
+    # 已停止的流不会被覆盖为 DONE
+    assert backend.set_status("s1", StreamStatus.DONE, expected=StreamStatus.RUNNING) is False
+    assert _status_and_content(backend.get("s1")) == {"status": StreamStatus.STOPPING, "content": "a"}
+
+
+@pytest.mark.parametrize("operation", ["append", "finish"])
+def test_redis_backend_stop_between_check_and_write_wins(redis_url, monkeypatch, operation):
+    import redis
+
+    backend = RedisStreamStateBackend(redis_url)
+    stopper = RedisStreamStateBackend(redis_url)
+    backend.create("s1")
+    backend.append("s1", "a")
+    multi = redis.client.Pipeline.multi
+    stopped = []
+
+    def stop_after_status_check(pipe):
+        # 在状态检查与写入之间，由另一个连接（另一个进程）请求停止
+        if not stopped:
+            stopped.append(True)
+            stopper.set_status("s1", StreamStatus.STOPPING)
+        return multi(pipe)
+
+    monkeypatch.setattr(redis.client.Pipeline, "multi", stop_after_status_check)
+
+    if operation == "append":
+        assert backend.append("s1", "b") == StreamStatus.STOPPING
+    else:
+        assert backend.set_status("s1", StreamStatus.DONE, expected=StreamStatus.RUNNING) is False
+    assert stopped
+    assert _status_and_content(backend.get("s1")) == {"status": StreamStatus.STOPPING, "content": "a"}
+
+
+def test_backend_error_and_delete(backend):
+    backend.create("s1")
+    backend.set_status("s1", StreamStatus.ERROR, error="RuntimeError('boom')")
+    assert backend.get("s1")["error"] == "RuntimeError('boom')"
+
+    backend.delete("s1")
+    assert backend.get("s1") is None
+    assert backend.append("s1", "x") is None
+    assert backend.set_status("s1", StreamStatus.DONE) is False
+
+
+def test_stream_session_caches_joined_content_until_version_moves():
+    session = StreamSession()
+    for token in ("Hello", " ", "world"):
+        session.append(token)
+
+    first = session.content
+    assert first == "Hello world"
+    assert session.content is first  # 版本未变化，直接复用缓存
+
+    version = session.version
+    session.append("!")
+    assert session.version == version + 1
+    assert session.content == "Hello world!"
+    # 合并后分片列表被压缩为单个字符串
+    assert session._chunks == ["Hello world!"]
+
+    session.set_status(StreamStatus.DONE)
+    assert session.version == version + 2
+    assert session.to_state() == {"status": StreamStatus.DONE, "content": "Hello world!", "version": version + 2}
+
+
+def test_stream_session_uses_slots():
+    assert not hasattr(StreamSession(), "__dict__")
+
+
+def _append_from_child(path: str) -> None:
+    SQLiteStreamStateBackend(path).append("shared", "from-child")
+
+
+def test_sqlite_backend_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "streams.db")
+    backend = SQLiteStreamStateBackend(path)
+    backend.create("shared")
+
+    proc = multiprocessing.get_context("spawn").Process(target=_append_from_child, args=(path,))
+    proc.start()
+    proc.join(timeout=30)
+
+    assert proc.exitcode == 0
+    assert backend.get("shared")["content"] == "from-child"
+
+
+def test_create_stream_state_backend_rejects_unknown_name():
+    with pytest.raises(ValueError, match="unknown"):
+        create_stream_state_backend("nope")
+
+
+def _finished(backend, stream_id, content):
+    backend.create(stream_id)
+    backend.append(stream_id, content)
+    backend.set_status(stream_id, StreamStatus.DONE)
+
+
+def test_memory_backend_evicts_least_recently_used_finished_streams():
+    backend = MemoryStreamStateBackend(max_streams=3)
+    _finished(backend, "old", "a")
+    _finished(backend, "recent", "b")
+    backend.get("old")  # 访问后变为最近使用
+    backend.create("running")
+
+    backend.create("new")
+
+    assert backend.get("recent") is None
+    assert backend.get("old") is not None
+    assert backend.stats()["evicted"] == 1
+
+
+def test_memory_backend_rejects_new_streams_when_only_live_streams_remain():
+    backend = MemoryStreamStateBackend(max_streams=2)
+    backend.create("s1")
+    backend.create("s2")
+
+    with pytest.raises(StreamCapacityError):
+        backend.create("s3")
+    assert backend.stats()["rejected"] == 1
+
+    backend.set_status("s1", StreamStatus.DONE)
+    backend.create("s3")
+    assert backend.get("s1") is None
+
+
+def test_memory_backend_byte_cap_counts_utf8_and_evicts_on_append():
+    backend = MemoryStreamStateBackend(max_bytes=10)
+    _finished(backend, "done", "世界")  # 6 字节
+    backend.create("live")
+    backend.append("live", "hello")
+
+    assert backend.get("done") is None
+    assert backend.stats()["bytes"] == 5
+
+    backend.append("live", "world!")  # 进行中的流可短暂超出上限
+    assert backend.stats()["bytes"] == 11
+    with pytest.raises(StreamCapacityError):
+        backend.create("next")
+
+    backend.delete("live")
+    assert backend.stats() | {"evicted": 0} == {
+        "streams": 0,
+        "finished": 0,
+        "bytes": 0,
+        "max_streams": 0,
+        "max_bytes": 10,
+        "evicted": 0,
+        "rejected": 1,
+    }
+
+
+def test_sqlite_backend_appends_chunks_as_rows(tmp_path):
+    backend = SQLiteStreamStateBackend(str(tmp_path / "streams.db"))
+    backend.create("s1")
+    for i in range(100):
+        backend.append("s1", f"{i},")
+
+    assert backend.get("s1")["content"] == "".join(f"{i}," for i in range(100))
+    conn = backend._conn()
+    assert conn.execute("SELECT COUNT(*) FROM stream_chunks WHERE stream_id = 's1'").fetchone()[0] == 100
+
+    # 重新创建同名流时清空旧分片，删除时连同分片一起删除
+    backend.create("s1")
+    assert backend.get("s1")["content"] == ""
+    backend.append("s1", "x")
+    backend.delete("s1")
+    assert conn.execute("SELECT COUNT(*) FROM stream_chunks").fetchone()[0] == 0
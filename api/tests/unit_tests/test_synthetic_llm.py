@@ -0,0 +1,87 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from core import stream_manager
+from core.llm.synthetic import SyntheticLLM, SyntheticLLMError
+from core.stream_manager import StreamStatus, get_stream_state, start_stream
+from utils.config import settings
+
+
+async def _collect(llm: SyntheticLLM, prompt: str = "q") -> list[str]:
+    return [token async for token in llm.stream(prompt)]
+
+
+def _fast(**kwargs) -> SyntheticLLM:
+    return SyntheticLLM(first_token_delay=0, token_interval=0, **kwargs)
+
+
+def test_same_seed_repeats_token_sequence():
+    first = asyncio.run(_collect(_fast(seed=7, answer_tokens_mean=30, answer_tokens_stddev=10)))
+    second = asyncio.run(_collect(_fast(seed=7, answer_tokens_mean=30, answer_tokens_stddev=10)))
+    other = asyncio.run(_collect(_fast(seed=8, answer_tokens_mean=30, answer_tokens_stddev=10)))
+
+    assert first == second
+    assert first != other
+
+
+def test_answer_length_follows_configuration():
+    llm = _fast(answer_tokens_mean=20, answer_tokens_stddev=0)
+
+    assert len(asyncio.run(_collect(llm))) == 20
+
+
+def test_error_rate_raises_mid_stream():
+    llm = _fast(answer_tokens_mean=50, answer_tokens_stddev=0, error_rate=1.0)
+    received = []
+
+    async def main():
+        async for token in llm.stream("q"):
+            received.append(token)
+
+    with pytest.raises(SyntheticLLMError):
+        asyncio.run(main())
+    assert len(received) < 50
+
+
+def test_stall_pauses_stream():
+    llm = _fast(answer_tokens_mean=5, answer_tokens_stddev=0, stall_rate=1.0, stall_seconds=0.2)
+
+    start = time.monotonic()
+    asyncio.run(_collect(llm))
+
+    assert time.monotonic() - start >= 0.2
+
+
+def test_delay_distributions_have_configured_mean():
+    rng = random.Random(1)  # noqa: S311 - 仅用于模拟负载
+    for distribution in ("constant", "exponential", "lognormal"):
+        llm = SyntheticLLM(distribution=distribution)
+        samples = [llm._delay(rng, 0.05) for _ in range(20000)]
+        assert sum(samples) / len(samples) == pytest.approx(0.05, rel=0.05)
+
+
+def test_unknown_distribution_is_rejected():
+    with pytest.raises(ValueError, match="unsupported distribution"):
+        SyntheticLLM(distribution="pareto")
+
+
+def test_stream_manager_uses_synthetic_provider(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "synthetic")
+    llm = _fast(answer_tokens_mean=10, answer_tokens_stddev=0)
+    monkeypatch.setattr("core.llm.synthetic._synthetic", llm)
+
+    async def main():
+        stream_id = start_stream("capacity test")
+        deadline = time.monotonic() + 2
+        while get_stream_state(stream_id)["status"] != StreamStatus.DONE and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return get_stream_state(stream_id)
+
+    state = asyncio.run(main())
+
+    assert state["status"] == StreamStatus.DONE
+    assert len(state["content"].split()) == 10
+    assert stream_manager._model_name() == "synthetic"
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from core.metrics import stream_producer_wait
+from core.token_batcher import TokenBatch, batch_tokens
+
+
+async def _source(tokens: list[str], produced: list[str] | None = None):
+    for token in tokens:
+        if produced is not None:
+            produced.append(token)
+        yield token
+        await asyncio.sleep(0)
+
+
+async def _collect(source, **kwargs) -> list[TokenBatch]:
+    return [batch async for batch in batch_tokens(source, **kwargs)]
+
+
+def test_fast_tokens_are_coalesced_after_the_first_batch():
+    tokens = [f"t{i} " for i in range(1000)]
+
+    batches = asyncio.run(_collect(_source(tokens), max_chars=10_000, window_seconds=0.05))
+
+    assert "".join(batch.text for batch in batches) == "".join(tokens)
+    assert sum(batch.tokens for batch in batches) == 1000
+    # 首个分片立即写入，不等待窗口
+    assert batches[0].tokens == 1
+    assert len(batches) < 20
+
+
+def test_batch_is_flushed_when_max_chars_is_reached():
+    batches = asyncio.run(_collect(_source(["abcd"] * 100), max_chars=40, window_seconds=1))
+
+    assert all(len(batch.text) <= 40 for batch in batches)
+    assert "".join(batch.text for batch in batches) == "abcd" * 100
+
+
+def test_buffer_bounds_how_far_the_reader_runs_ahead():
+    produced: list[str] = []
+    before = stream_producer_wait.count
+
+    async def main():
+        consumed = 0
+        async for batch in batch_tokens(
+            _source([str(i) for i in range(200)], produced), max_chars=1, window_seconds=0, buffer_size=8
+        ):
+            consumed += batch.tokens
+            await asyncio.sleep(0.001)
+            # 读取任务最多领先缓冲容量（加上正在 put 的一个与刚取出的一个）
+            assert len(produced) - consumed <= 10
+        return consumed
+
+    assert asyncio.run(main()) == 200
+    assert stream_producer_wait.count > before
+
+
+def test_source_error_is_raised_after_pending_tokens():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+    texts: list[str] = []
+
+    async def main():
+        async for batch in batch_tokens(failing(), window_seconds=0.05):
+            texts.append(batch.text)
+
+    with pytest.raises(RuntimeError, match="upstream failed"):
+        asyncio.run(main())
+    assert texts == ["partial"]
+
+
+def test_closing_or_cancelling_the_consumer_closes_the_source():
+    closed: list[bool] = []
+
+    async def endless():
+        try:
+            while True:
+                yield "x"
+                await asyncio.sleep(0.001)
+        finally:
+            closed.append(True)
+
+    async def stop_early():
+        batches = batch_tokens(endless(), window_seconds=0.01)
+        async with contextlib.aclosing(batches):
+            async for _ in batches:
+                break
+
+    asyncio.run(stop_early())
+    assert closed == [True]
+
+    async def cancel():
+        async def consume():
+            async for _ in batch_tokens(endless(), window_seconds=0.01):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert closed == [True, True]
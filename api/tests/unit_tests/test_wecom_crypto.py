@@ -1,47 +1,69 @@
+import xml.etree.ElementTree as ET
+
 import pytest
-from wechatpy.exceptions import InvalidSignatureException
+from wechatpy.enterprise.crypto import WeChatCrypto
+
+from core.wecom.crypto import InvalidCorpIdError, InvalidSignatureError, WeComMessageCrypto
+
+TOKEN = "t"
+# encoding_aes_key 需要满足 43 位长度要求
+AES_KEY = "a" * 43
+CORP_ID = "cid"
+RANDOM_PREFIX = "0123456789abcdef"
 
-from core.wecom.crypto import WeComMessageCrypto
 
+def create_crypto(corp_id: str = CORP_ID) -> WeComMessageCrypto:
+    return WeComMessageCrypto(token=TOKEN, encoding_aes_key=AES_KEY, corp_id=corp_id)
 
-def create_crypto() -> WeComMessageCrypto:
-    # token / encoding_aes_key / corp_id 的值在单测中不重要，因为 decrypt_message 将被打桩
-    # encoding_aes_key 需要满足 43 位长度要求
-    return WeComMessageCrypto(token="t", encoding_aes_key="a" * 43, corp_id="cid")
 
+def wechatpy_encrypt(plain_text: str, nonce: str, timestamp: str) -> dict[str, str]:
+    """使用 wechatpy 生成参考密文，并从 XML 中取出四个字段。"""
+    root = ET.fromstring(WeChatCrypto(TOKEN, AES_KEY, CORP_ID).encrypt_message(plain_text, nonce, timestamp))
+    return {
+        "encrypt": root.findtext("Encrypt"),
+        "msgsignature": root.findtext("MsgSignature"),
+        "timestamp": root.findtext("TimeStamp"),
+        "nonce": root.findtext("Nonce"),
+    }
 
-def test_decrypt_from_json_success(mocker):
-    mock_crypto_cls = mocker.patch("core.wecom.crypto.WeChatCrypto")
-    mock_crypto_cls.return_value.decrypt_message.return_value = "<xml>plain</xml>"
+
+def test_decrypt_from_json_success():
+    ref = wechatpy_encrypt('{"msgtype": "text", "text": {"content": "你好"}}', nonce="n", timestamp="123")
 
     crypto = create_crypto()
     plain = crypto.decrypt_from_json(
-        msg_signature="sig",
-        timestamp="123",
-        nonce="n",
-        encrypt="ENC",
+        msg_signature=ref["msgsignature"],
+        timestamp=ref["timestamp"],
+        nonce=ref["nonce"],
+        encrypt=ref["encrypt"],
     )
 
-    assert plain == "<xml>plain</xml>"
-    # 验证 wechatpy.decrypt_message 被以包装后的 XML 调用
-    args, kwargs = mock_crypto_cls.return_value.decrypt_message.call_args
-    assert "<xml><Encrypt><![CDATA[ENC]]></Encrypt></xml>" in kwargs.get("msg")
-    assert kwargs.get("signature") == "sig"
-    assert kwargs.get("timestamp") == "123"
-    assert kwargs.get("nonce") == "n"
+    assert plain == '{"msgtype": "text", "text": {"content": "你好"}}'
 
 
-def test_decrypt_from_json_invalid_signature(mocker):
-    mock_crypto_cls = mocker.patch("core.wecom.crypto.WeChatCrypto")
-    mock_crypto_cls.return_value.decrypt_message.side_effect = InvalidSignatureException("bad sig")
+def test_decrypt_from_json_invalid_signature():
+    ref = wechatpy_encrypt("<xml>plain</xml>", nonce="n", timestamp="123")
 
     crypto = create_crypto()
-    with pytest.raises(InvalidSignatureException):
+    with pytest.raises(InvalidSignatureError):
         crypto.decrypt_from_json(
             msg_signature="sig",
             timestamp="123",
             nonce="n",
-            encrypt="ENC",
+            encrypt=ref["encrypt"],
+        )
+
+
+def test_decrypt_from_json_invalid_receive_id():
+    ref = wechatpy_encrypt("<xml>plain</xml>", nonce="n", timestamp="123")
+
+    crypto = create_crypto(corp_id="other")
+    with pytest.raises(InvalidCorpIdError):
+        crypto.decrypt_from_json(
+            msg_signature=ref["msgsignature"],
+            timestamp="123",
+            nonce="n",
+            encrypt=ref["encrypt"],
         )
 
 
@@ -56,26 +78,37 @@ def test_decrypt_from_json_missing_encrypt():
         )
 
 
-def test_encrypt_to_json_success(mocker):
-    mock_crypto_cls = mocker.patch("core.wecom.crypto.WeChatCrypto")
-    # wechatpy.encrypt_message 返回的 XML，包含四个关键字段
-    mock_crypto_cls.return_value.encrypt_message.return_value = (
-        "<xml>"
-        "<Encrypt><![CDATA[cipher_text]]></Encrypt>"
-        "<MsgSignature><![CDATA[msg_sig]]></MsgSignature>"
-        "<TimeStamp>1754796900</TimeStamp>"
-        "<Nonce><![CDATA[noncev]]></Nonce>"
-        "</xml>"
-    )
+@pytest.mark.parametrize("plain_text", ["", "<xml>plain</xml>", "x" * 12, "流式消息" * 100])
+def test_encrypt_to_json_matches_wechatpy_byte_for_byte(mocker, plain_text):
+    # 固定随机前缀，使原生实现与 wechatpy 的输出可逐字节比较
+    mocker.patch("core.wecom.crypto._random_prefix", return_value=RANDOM_PREFIX.encode())
+    mocker.patch("wechatpy.crypto.base.BasePrpCrypto.get_random_string", return_value=RANDOM_PREFIX)
 
     crypto = create_crypto()
-    result = crypto.encrypt_to_json(
-        plain_text="<xml>plain</xml>",
-        nonce="noncev",
-    )
+    result = crypto.encrypt_to_json(plain_text=plain_text, nonce="noncev", timestamp="1754796900")
+    ref = wechatpy_encrypt(plain_text, nonce="noncev", timestamp="1754796900")
 
-    assert result["encrypt"] == "cipher_text"
-    assert result["msgsignature"] == "msg_sig"
-    # timestamp 字段应为固定值（来自打桩返回）
+    assert result["encrypt"] == ref["encrypt"]
+    assert result["msgsignature"] == ref["msgsignature"]
     assert result["timestamp"] == 1754796900
     assert result["nonce"] == "noncev"
+
+
+def test_encrypt_to_json_round_trip_with_wechatpy():
+    crypto = create_crypto()
+    result = crypto.encrypt_to_json(plain_text="<xml>plain</xml>", nonce="noncev")
+
+    assert isinstance(result["timestamp"], int)
+    plain = WeChatCrypto(TOKEN, AES_KEY, CORP_ID).decrypt_message(
+        msg={"Encrypt": result["encrypt"]},
+        signature=result["msgsignature"],
+        timestamp=str(result["timestamp"]),
+        nonce=result["nonce"],
+    )
+    assert plain == "<xml>plain</xml>"
+
+
+def test_encrypt_to_json_rejects_non_string():
+    crypto = create_crypto()
+    with pytest.raises(ValueError, match="字符串"):
+        crypto.encrypt_to_json(plain_text=b"bytes", nonce="n")
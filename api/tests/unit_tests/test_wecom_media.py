@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from core.wecom.crypto import WeComAESCodec
+from core.wecom.media import ImageCache, ImageDownloader, ImageTooLargeError
+from service.wecom_callback_service import WeComService
+
+AES_KEY = "a" * 43
+codec = WeComAESCodec("t", AES_KEY)
+
+
+class _MediaServer(ThreadingHTTPServer):
+    """本地图片服务：按路径返回预先加密好的文件，并统计请求次数。"""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _MediaHandler)
+        self.files: dict[str, bytes] = {}
+        self.requests = 0
+
+    def url(self, name: str) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{name}"
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    server: _MediaServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        # 分多次写出，模拟流式下载
+        for i in range(0, len(data), 1000):
+            self.wfile.write(data[i : i + 1000])
+
+
+@pytest.fixture
+def media_server():
+    server = _MediaServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("length", [0, 1, 31, 32, 33, 100_000])
+def test_media_decryptor_handles_arbitrary_chunking(length):
+    plain = os.urandom(length)
+    encrypted = codec.encrypt_media(plain)
+    assert len(encrypted) % 32 == 0
+
+    decryptor = codec.media_decryptor()
+    out = b"".join(decryptor.update(encrypted[i : i + 7]) for i in range(0, len(encrypted), 7))
+
+    assert out + decryptor.finalize() == plain
+
+
+def test_media_decryptor_rejects_wrong_key():
+    encrypted = WeComAESCodec("t", "b" * 43).encrypt_media(b"image bytes")
+    decryptor = codec.media_decryptor()
+    decryptor.update(encrypted)
+
+    with pytest.raises(ValueError, match="invalid media padding"):
+        decryptor.finalize()
+
+
+def test_download_decrypts_into_content_addressed_cache(media_server, tmp_path):
+    image = os.urandom(50_000)
+    media_server.files["a.jpg"] = codec.encrypt_media(image)
+    media_server.files["b.jpg"] = codec.encrypt_media(image)
+    downloader = ImageDownloader(ImageCache(tmp_path))
+
+    async def main():
+        first = await downloader.fetch(media_server.url("a.jpg"), codec)
+        again = await downloader.fetch(media_server.url("a.jpg"), codec)
+        other = await downloader.fetch(media_server.url("b.jpg"), codec)
+        await downloader.aclose()
+        return first, again, other
+
+    first, again, other = asyncio.run(main())
+
+    assert first.digest == hashlib.sha256(image).hexdigest()
+    assert first.path.read_bytes() == image
+    assert first.size == len(image)
+    # 同一 URL 在有效期内不再下载；不同 URL 的相同内容只保存一份
+    assert again == first
+    assert other == first
+    assert media_server.requests == 2
+    assert downloader.cache.stats()["entries"] == 1
+    assert [p.name for p in tmp_path.iterdir()] == [first.digest]
+
+
+def test_download_failures_leave_no_files(media_server, tmp_path):
+    media_server.files["big.jpg"] = codec.encrypt_media(os.urandom(10_000))
+    downloader = ImageDownloader(ImageCache(tmp_path), max_bytes=4096)
+
+    async def main():
+        with pytest.raises(ImageTooLargeError):
+            await downloader.fetch(media_server.url("big.jpg"), codec)
+        with pytest.raises(httpx.HTTPStatusError):
+            await downloader.fetch(media_server.url("missing.jpg"), codec)
+        await downloader.aclose()
+
+    asyncio.run(main())
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_evicts_least_recently_used_and_reloads_from_disk(tmp_path):
+    cache = ImageCache(tmp_path, max_bytes=250)
+    digests = []
+    for i in range(3):
+        data = bytes([i]) * 100
+        digest = hashlib.sha256(data).hexdigest()
+        temp = cache.temp_file()
+        with temp:
+            temp.write(data)
+        cache.commit(temp.name, digest, len(data))
+        digests.append(digest)
+        time.sleep(0.01)
+
+    assert cache.get(digests[0]) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+
+    reloaded = ImageCache(tmp_path, max_bytes=250)
+    assert reloaded.get(digests[2]).path.read_bytes() == bytes([2]) * 100
+    assert reloaded.stats()["entries"] == 2
+
+
+def test_image_message_is_prefetched_in_background(media_server, tmp_path, monkeypatch):
+    from core.stream_manager import stop_stream, stream_executor
+    from service import wecom_callback_service
+
+    image = os.urandom(20_000)
+    media_server.files["photo.jpg"] = codec.encrypt_media(image)
+    downloader = ImageDownloader(ImageCache(tmp_path))
+    monkeypatch.setattr(wecom_callback_service, "image_downloader", downloader)
+    service = WeComService(token="t", encoding_aes_key=AES_KEY)
+    payload = {"msgid": "img-1", "msgtype": "image", "image": {"url": media_server.url("photo.jpg")}}
+    enc = service.message_crypto.encrypt_to_json(plain_text=json.dumps(payload), nonce="n")
+    active = stream_executor.active_count
+
+    ok, _, reply = service.process_callback_message(enc["msgsignature"], str(enc["timestamp"]), "n", enc["encrypt"])
+
+    assert ok is True
+    plain = service.message_crypto.decrypt_from_json(
+        reply["msgsignature"], str(reply["timestamp"]), "n", reply["encrypt"]
+    )
+    stream_id = json.loads(plain)["stream"]["id"]
+    # 下载在下载器自己的执行器上运行，流执行器只多了这条消息的 worker，停机排空不会等待下载
+    assert stream_executor.active_count <= active + 1
+    deadline = time.monotonic() + 5
+    while not downloader.stream_images(stream_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    [cached] = downloader.stream_images(stream_id)
+    assert cached.digest == hashlib.sha256(image).hexdigest()
+    assert cached.path.read_bytes() == image
+    stop_stream(stream_id)
+    downloader.executor.close()
+
+
+def test_prefetch_keeps_message_order_and_skips_failed_images(media_server, tmp_path):
+    images = [os.urandom(5_000), os.urandom(7_000)]
+    media_server.files["1.jpg"] = codec.encrypt_media(images[0])
+    media_server.files["2.jpg"] = codec.encrypt_media(images[1])
+    downloader = ImageDownloader(ImageCache(tmp_path))
+    urls = [media_server.url("2.jpg"), media_server.url("missing.jpg"), media_server.url("1.jpg")]
+
+    async def main():
+        await downloader._prefetch("s1", urls, codec)
+        await downloader.aclose()
+
+    asyncio.run(main())
+
+    assert [image.path.read_bytes() for image in downloader.stream_images("s1")] == [images[1], images[0]]
+    assert downloader.stream_images("unknown") == []
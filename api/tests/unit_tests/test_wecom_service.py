@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from core.metrics import registry
+from core.stream_manager import stop_stream
+from service import wecom_callback_service, wecom_events
+from service.wecom_callback_service import WeComService, get_wecom_service
+
+AES_KEY = "a" * 43
+
+
+def test_get_wecom_service_reuses_instance_for_same_key():
+    first = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+    second = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id=None)
+
+    assert isinstance(first, WeComService)
+    assert first is second
+
+
+def test_get_wecom_service_separates_different_keys():
+    first = get_wecom_service(token="t1", encoding_aes_key=AES_KEY, corp_id="")
+    second = get_wecom_service(token="t2", encoding_aes_key=AES_KEY, corp_id="")
+
+    assert first is not second
+    assert second.token == "t2"
+
+
+def _encrypted_callback(service: WeComService, payload: dict) -> dict:
+    enc = service.message_crypto.encrypt_to_json(plain_text=json.dumps(payload), nonce="n")
+    return {
+        "msg_signature": enc["msgsignature"],
+        "timestamp": str(enc["timestamp"]),
+        "nonce": enc["nonce"],
+        "encrypt": enc["encrypt"],
+    }
+
+
+def _reply(service: WeComService, encrypted: dict) -> dict:
+    plain = service.message_crypto.decrypt_from_json(
+        msg_signature=encrypted["msgsignature"],
+        timestamp=str(encrypted["timestamp"]),
+        nonce=encrypted["nonce"],
+        encrypt=encrypted["encrypt"],
+    )
+    return json.loads(plain)
+
+
+def _reply_stream(service: WeComService, encrypted: dict) -> dict:
+    return _reply(service, encrypted)["stream"]
+
+
+def test_redelivered_message_reuses_existing_stream():
+    service = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+    payload = {"msgid": "retry-1", "aibotid": "bot", "msgtype": "text", "text": {"content": "hi"}}
+
+    ok1, _, first = service.process_callback_message(**_encrypted_callback(service, payload))
+    ok2, _, second = service.process_callback_message(**_encrypted_callback(service, payload))
+
+    assert ok1 is True
+    assert ok2 is True
+    first_id = _reply_stream(service, first)["id"]
+    assert _reply_stream(service, second)["id"] == first_id
+    stop_stream(first_id)
+
+
+@pytest.fixture
+def no_streams(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("event callbacks must not start a stream")
+
+    monkeypatch.setattr(wecom_callback_service, "start_stream", fail)
+
+
+def _event(eventtype: str, **extra) -> dict:
+    return {"msgid": f"event-{eventtype}", "msgtype": "event", "event": {"eventtype": eventtype, **extra}}
+
+
+def test_enter_chat_event_replies_welcome_text_without_stream(no_streams):
+    service = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+    counter = registry.counter("wecom_events", "", {"eventtype": "enter_chat"})
+    before = counter.value
+
+    ok, _, reply = service.process_callback_message(**_encrypted_callback(service, _event("enter_chat")))
+
+    assert ok is True
+    assert _reply(service, reply) == {"msgtype": "text", "text": {"content": "你好，有什么可以帮你？"}}
+    assert counter.value == before + 1
+
+
+def test_template_card_and_unknown_events_reply_empty_without_stream(no_streams):
+    service = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+    card = _event("template_card_event", template_card_event={"card_type": "button_interaction", "event_key": "ok"})
+
+    assert service.process_callback_message(**_encrypted_callback(service, card)) == (True, "success", None)
+    assert service.process_callback_message(**_encrypted_callback(service, _event("brand_new"))) == (
+        True,
+        "success",
+        None,
+    )
+
+
+def test_registered_handler_updates_template_card(no_streams, monkeypatch):
+    monkeypatch.setattr(wecom_events, "_handlers", dict(wecom_events._handlers))
+    update = {"response_type": "update_template_card", "template_card": {"card_type": "text_notice"}}
+    wecom_events.register_event_handler("event", "template_card_event", lambda msg: update)
+    service = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+
+    _, _, reply = service.process_callback_message(**_encrypted_callback(service, _event("template_card_event")))
+
+    assert _reply(service, reply) == update
+
+
+def test_message_without_prompt_finishes_without_stream(no_streams):
+    service = get_wecom_service(token="t", encoding_aes_key=AES_KEY, corp_id="")
+
+    _, _, reply = service.process_callback_message(
+        **_encrypted_callback(service, {"msgid": "voice-1", "msgtype": "voice", "voice": {"content": ""}})
+    )
+
+    assert _reply_stream(service, reply)["finish"] is True
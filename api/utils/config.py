@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -25,15 +26,100 @@ class Settings:
         self.WECOM_TOKEN: str | None = os.getenv("WECOM_TOKEN")
         self.WECOM_ENCODING_AES_KEY: str | None = os.getenv("WECOM_ENCODING_AES_KEY")
         self.WECOM_CORP_ID: str = os.getenv("WECOM_CORP_ID", "")
+        # 多机器人注册表：JSON 文件或目录（每个 *.json 一个机器人），回调地址 /api/wecom/callback/{bot_id}
+        self.WECOM_BOTS_PATH: str = os.getenv("WECOM_BOTS_PATH", "")
+        # 用户进入会话（enter_chat 事件）时回复的欢迎语，留空则回复空包
+        self.WECOM_WELCOME_TEXT: str = os.getenv("WECOM_WELCOME_TEXT", "你好，有什么可以帮你？")
         self.LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
         # OpenAI（可选）
         self.OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
         self.OPENAI_BASE_URL: str | None = os.getenv("OPENAI_BASE_URL")
         self.OPENAI_MODEL: str | None = os.getenv("OPENAI_MODEL")
-
-        # LLM provider 开关：mock | openai（默认 mock，便于单元测试稳定）
+        # OpenAI 共享客户端连接池与超时（秒）
+        self.OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS") or 100)
+        self.OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS") or 20)
+        self.OPENAI_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY") or 30)
+        self.OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT") or 60)
+        self.OPENAI_CONNECT_TIMEOUT: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT") or 5)
+
+        # LLM provider 开关：mock | openai | synthetic（默认 mock，便于单元测试稳定）
         self.LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "mock").lower()
+        # openai 备用端点（JSON 列表，按顺序对冲）与对冲延迟（秒）：主端点在该时间内未产出首个分片时向下一个端点发起请求
+        self.LLM_FALLBACK_ENDPOINTS: str = os.getenv("LLM_FALLBACK_ENDPOINTS", "")
+        self.LLM_HEDGE_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_DELAY_SECONDS") or 2)
+
+        # 合成 LLM（LLM_PROVIDER=synthetic，容量测试用）：延迟均值（秒）与分布、回答长度分布、故障注入
+        self.SYNTHETIC_SEED: int = int(os.getenv("SYNTHETIC_SEED") or 0)
+        self.SYNTHETIC_FIRST_TOKEN_DELAY: float = float(os.getenv("SYNTHETIC_FIRST_TOKEN_DELAY") or 0.5)
+        self.SYNTHETIC_TOKEN_INTERVAL: float = float(os.getenv("SYNTHETIC_TOKEN_INTERVAL") or 0.05)
+        self.SYNTHETIC_DELAY_DISTRIBUTION: str = (os.getenv("SYNTHETIC_DELAY_DISTRIBUTION") or "lognormal").lower()
+        self.SYNTHETIC_DELAY_SIGMA: float = float(os.getenv("SYNTHETIC_DELAY_SIGMA") or 0.5)
+        self.SYNTHETIC_ANSWER_TOKENS_MEAN: float = float(os.getenv("SYNTHETIC_ANSWER_TOKENS_MEAN") or 200)
+        self.SYNTHETIC_ANSWER_TOKENS_STDDEV: float = float(os.getenv("SYNTHETIC_ANSWER_TOKENS_STDDEV") or 80)
+        self.SYNTHETIC_ERROR_RATE: float = float(os.getenv("SYNTHETIC_ERROR_RATE") or 0)
+        self.SYNTHETIC_STALL_RATE: float = float(os.getenv("SYNTHETIC_STALL_RATE") or 0)
+        self.SYNTHETIC_STALL_SECONDS: float = float(os.getenv("SYNTHETIC_STALL_SECONDS") or 10)
+
+        # 流状态存储后端：memory | sqlite | redis（默认 memory，仅支持单 worker）
+        # 多 worker 部署需选用 sqlite（同机共享）或 redis（跨机共享）
+        self.STREAM_STATE_BACKEND: str = os.getenv("STREAM_STATE_BACKEND", "memory").lower()
+        self.STREAM_STATE_SQLITE_PATH: str = os.getenv("STREAM_STATE_SQLITE_PATH") or os.path.join(
+            tempfile.gettempdir(), "wecom_streams.db"
+        )
+        self.STREAM_STATE_REDIS_URL: str = os.getenv("STREAM_STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+        # 已结束流的保留：热层以原文保留的秒数；之后降级到 zlib 压缩的冷存储（仅 memory 后端），
+        # 冷存储保留秒数（企业微信最多刷新约 6 分钟）与压缩后总字节数上限
+        self.STREAM_RETENTION_SECONDS: float = float(os.getenv("STREAM_RETENTION_SECONDS") or 30)
+        self.STREAM_COLD_TTL_SECONDS: float = float(os.getenv("STREAM_COLD_TTL_SECONDS") or 360)
+        self.STREAM_COLD_MAX_BYTES: int = int(os.getenv("STREAM_COLD_MAX_BYTES") or 64 * 1024 * 1024)
+        # memory 后端容量上限（0 表示不限制）：流数量与内容总字节数；超出时先淘汰已结束的流，仍不足时拒绝新流
+        self.STREAM_MAX_STREAMS: int = int(os.getenv("STREAM_MAX_STREAMS") or 10000)
+        self.STREAM_MAX_BYTES: int = int(os.getenv("STREAM_MAX_BYTES") or 256 * 1024 * 1024)
+        # 分片批量写入：合并时间窗口（秒，0 表示只合并已到达的分片）、单批字符数上限，
+        # 以及上游读取与写入之间的有界缓冲（分片数，写满后上游读取等待）
+        self.STREAM_BATCH_WINDOW_SECONDS: float = float(os.getenv("STREAM_BATCH_WINDOW_SECONDS") or 0.05)
+        self.STREAM_BATCH_MAX_CHARS: int = int(os.getenv("STREAM_BATCH_MAX_CHARS") or 512)
+        self.STREAM_BUFFER_TOKENS: int = int(os.getenv("STREAM_BUFFER_TOKENS") or 256)
+
+        # LLM 并发准入（0 表示不限制）：全局 / 单会话 / 单用户上限，以及最长排队秒数
+        self.LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY") or 64)
+        self.LLM_MAX_CONCURRENCY_PER_CHAT: int = int(os.getenv("LLM_MAX_CONCURRENCY_PER_CHAT") or 4)
+        self.LLM_MAX_CONCURRENCY_PER_USER: int = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER") or 2)
+        self.LLM_MAX_QUEUE_SECONDS: float = float(os.getenv("LLM_MAX_QUEUE_SECONDS") or 60)
+
+        # 平滑重启：停机时等待进行中的流结束的最长秒数；内存后端的流状态快照文件与可加载的最长时效（秒）
+        self.STREAM_DRAIN_SECONDS: float = float(os.getenv("STREAM_DRAIN_SECONDS") or 8)
+        # 默认写入 api 目录下的 data/（容器内 /api/data，docker-compose 将其挂载为数据卷，重建容器后仍保留）
+        self.STREAM_SNAPSHOT_PATH: str = os.getenv("STREAM_SNAPSHOT_PATH") or str(
+            Path(__file__).with_name("..").resolve().joinpath("data", "wecom_streams.snapshot")
+        )
+        self.STREAM_SNAPSHOT_MAX_AGE_SECONDS: float = float(os.getenv("STREAM_SNAPSHOT_MAX_AGE_SECONDS") or 360)
+
+        # 图片消息下载：解密后文件的磁盘缓存目录与总字节数上限，单张图片大小上限、连接池大小与超时（秒）
+        self.IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "wecom_images")
+        self.IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES") or 256 * 1024 * 1024)
+        self.IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES") or 20 * 1024 * 1024)
+        self.IMAGE_DOWNLOAD_MAX_CONNECTIONS: int = int(os.getenv("IMAGE_DOWNLOAD_MAX_CONNECTIONS") or 8)
+        self.IMAGE_DOWNLOAD_TIMEOUT_SECONDS: float = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT_SECONDS") or 30)
+
+        # 回调请求体大小上限（字节），超出时直接返回 413
+        self.CALLBACK_MAX_BODY_BYTES: int = int(os.getenv("CALLBACK_MAX_BODY_BYTES") or 256 * 1024)
+
+        # 刷新请求挂起（long-poll）最长秒数：0 关闭；需远小于企业微信回调超时（约 5 秒）
+        self.STREAM_HOLD_SECONDS: float = float(os.getenv("STREAM_HOLD_SECONDS") or 0)
+
+        # 重复提问回答缓存（默认关闭）：容量上限（字节）与过期时间（秒）
+        self.ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.ANSWER_CACHE_MAX_BYTES: int = int(os.getenv("ANSWER_CACHE_MAX_BYTES") or 16 * 1024 * 1024)
+        self.ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS") or 3600)
+
+        # 管理接口令牌（请求头 X-Admin-Token），留空则禁用管理接口
+        self.ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+        # 回调重投去重：同一 msgid 在 TTL 内复用首次创建的 stream；内存模式下按 LRU 限制条目数
+        self.MSG_DEDUP_TTL_SECONDS: float = float(os.getenv("MSG_DEDUP_TTL_SECONDS") or 300)
+        self.MSG_DEDUP_MAX_ENTRIES: int = int(os.getenv("MSG_DEDUP_MAX_ENTRIES") or 10000)
 
         # 配置完整性校验
         self._validate_config()
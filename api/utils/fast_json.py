@@ -0,0 +1,28 @@
+"""
+快速 JSON 编解码
+
+安装了 orjson 时使用 orjson（C 实现，直接输入/输出 UTF-8 bytes），否则退回标准库 json。
+两种实现的输出一致：不转义非 ASCII 字符、无多余空白。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于部署环境
+    orjson = None
+
+
+def loads(data: bytes | str) -> Any:
+    """解析 JSON；非法输入抛出 ValueError（json.JSONDecodeError / orjson.JSONDecodeError 均为其子类）。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 编码的 JSON bytes。"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")